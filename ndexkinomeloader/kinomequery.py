@@ -0,0 +1,335 @@
+#! /usr/bin/env python
+
+import argparse
+import sys
+import logging
+from collections import deque
+import ndexkinomeloader
+from ndexkinomeloader.ndexloadkinome import PTM_RELATIONSHIP_PREDICATE
+from ndexkinomeloader.ndexloadkinome import CXJsonBackend
+from ndexkinomeloader.ndexloadkinome import JSON_BACKENDS
+from ndexkinomeloader.ndexloadkinome import DEFAULT_JSON_BACKEND
+from ndexkinomeloader.ndexloadkinome import INCREMENTAL_JSON_BACKEND
+
+# ndex2 is imported only where networks are created, see ndexloadkinome
+
+logger = logging.getLogger(__name__)
+
+SUCCESS = 0
+ERROR = 2
+
+
+class KinomeQueryIndex(object):
+    """
+    Local query index over PTI, PTM or merged network built by
+    ndexloadkinome.py. Holds adjacency index of the network and node name,
+    alias and BioGRID PTM ID lookup tables, all built in one pass over
+    nodes, edges and node attributes
+    """
+    def __init__(self, network):
+        """
+        :param network: network to index
+        :type network: :py:class:`ndex2.nice_cx_network.NiceCXNetwork`
+        """
+        self._network = network
+
+        # node id -> list of (edge id, neighbor node id) for outgoing
+        # and incoming edges
+        self._out_edges = {}
+        self._in_edges = {}
+
+        # lower cased name, alias or PTM ID -> list of node ids
+        self._names = {}
+        self._aliases = {}
+        self._ptm_ids = {}
+
+        self._node_types = {}
+
+        self._build()
+
+
+    def _add_lookup(self, lookup, key, node_id):
+        if key is None or key == '':
+            return
+        node_ids = lookup.setdefault(str(key).strip().lower(), [])
+        if node_id not in node_ids:
+            node_ids.append(node_id)
+
+
+    def _build(self):
+        for node_id, node in self._network.nodes.items():
+            self._out_edges[node_id] = []
+            self._in_edges[node_id] = []
+            self._add_lookup(self._names, node.get('n'), node_id)
+
+        for edge_id, edge in self._network.edges.items():
+            self._out_edges[edge['s']].append((edge_id, edge['t']))
+            self._in_edges[edge['t']].append((edge_id, edge['s']))
+
+        for node_id, attributes in self._network.nodeAttributes.items():
+            for attribute in attributes:
+                name = attribute['n'].strip().lower() if attribute['n'] else ''
+                if name == 'type':
+                    if attribute['v']:
+                        node_type = attribute['v'].strip().lower()
+                        self._node_types[node_id] = node_type
+                    continue
+
+                if name == 'alias':
+                    lookup = self._aliases
+                elif name == 'biogrid ptm id':
+                    lookup = self._ptm_ids
+                else:
+                    continue
+
+                values = attribute['v']
+                if not isinstance(values, list):
+                    values = [values]
+                for value in values:
+                    self._add_lookup(lookup, value, node_id)
+
+
+    def get_network(self):
+        """
+        Gets indexed network
+        :return: network
+        """
+        return self._network
+
+
+    def find_nodes(self, query, node_type=None):
+        """
+        Finds nodes whose name, alias or BioGRID PTM ID is query (case
+        ignored). Matches on name come first, then on alias, then on PTM ID
+        :param query: name, alias or BioGRID PTM ID, i.e., 'CDC28',
+                      'ncbigene:852457' or '70000'
+        :param node_type: if set, only nodes of this type are returned,
+                          i.e., 'protein'
+        :return: list of node ids
+        """
+        key = str(query).strip().lower()
+
+        node_ids = []
+        for lookup in (self._names, self._aliases, self._ptm_ids):
+            for node_id in lookup.get(key, []):
+                if node_id in node_ids:
+                    continue
+                if node_type is not None and \
+                        self._node_types.get(node_id) != node_type:
+                    continue
+                node_ids.append(node_id)
+
+        return node_ids
+
+
+    def get_neighborhood(self, query, hops=1):
+        """
+        Gets nodes within hops edges, in either direction, of nodes
+        matching query
+        :param query: name, alias or BioGRID PTM ID of node,
+                      see :py:meth:`find_nodes`
+        :param hops: number of edges to follow
+        :return: list of node ids in order of distance from matched nodes
+        """
+        start_node_ids = self.find_nodes(query)
+
+        visited = set(start_node_ids)
+        node_ids = list(start_node_ids)
+        queue = deque((node_id, 0) for node_id in start_node_ids)
+
+        while queue:
+            node_id, distance = queue.popleft()
+            if distance >= hops:
+                continue
+
+            for edges in (self._out_edges[node_id], self._in_edges[node_id]):
+                for edge_id, neighbor_id in edges:
+                    if neighbor_id in visited:
+                        continue
+                    visited.add(neighbor_id)
+                    node_ids.append(neighbor_id)
+                    queue.append((neighbor_id, distance + 1))
+
+        return node_ids
+
+
+    def get_ptm_sites(self, query):
+        """
+        Gets PTM site nodes of proteins matching query, i.e., targets of
+        protein -> PTM site edges; sites a protein only has a relationship
+        with (i.e., as a kinase) are not included
+        :param query: name, alias or BioGRID PTM ID of protein,
+                      see :py:meth:`find_nodes`
+        :return: list of node ids
+        """
+        node_ids = []
+
+        edges = self._network.edges
+        for protein_id in self.find_nodes(query, node_type='protein'):
+            for edge_id, neighbor_id in self._out_edges[protein_id]:
+                if self._node_types.get(neighbor_id) != 'ptm':
+                    continue
+                if edges[edge_id].get('i') == PTM_RELATIONSHIP_PREDICATE:
+                    continue
+                if neighbor_id not in node_ids:
+                    node_ids.append(neighbor_id)
+
+        return node_ids
+
+
+    def get_subnetwork(self, node_ids, name=None):
+        """
+        Creates network of nodes, edges between them and their attributes.
+        Node and edge ids of indexed network are kept
+        :param node_ids: ids of nodes to include
+        :param name: name of new network; if not set, name of indexed
+                     network is used
+        :return: network
+        :rtype: :py:class:`ndex2.nice_cx_network.NiceCXNetwork`
+        """
+        from ndex2.nice_cx_network import NiceCXNetwork
+
+        node_ids = set(node_ids)
+        network = self._network
+        subnetwork = NiceCXNetwork()
+
+        for node_id in node_ids:
+            subnetwork.nodes[node_id] = dict(network.nodes[node_id])
+            if node_id in network.nodeAttributes:
+                subnetwork.nodeAttributes[node_id] = \
+                    [dict(a) for a in network.nodeAttributes[node_id]]
+
+            for edge_id, neighbor_id in self._out_edges[node_id]:
+                if neighbor_id not in node_ids:
+                    continue
+                subnetwork.edges[edge_id] = dict(network.edges[edge_id])
+                if edge_id in network.edgeAttributes:
+                    subnetwork.edgeAttributes[edge_id] = \
+                        [dict(a) for a in network.edgeAttributes[edge_id]]
+
+        for network_attribute in network.networkAttributes:
+            subnetwork.networkAttributes.append(dict(network_attribute))
+        if name is not None:
+            subnetwork.set_name(name)
+
+        for aspect_name, aspect in network.opaqueAspects.items():
+            subnetwork.set_opaque_aspect(aspect_name, aspect)
+
+        subnetwork.node_int_id_generator = \
+            max(subnetwork.nodes.keys()) + 1 if subnetwork.nodes else 0
+        subnetwork.edge_int_id_generator = \
+            max(subnetwork.edges.keys()) + 1 if subnetwork.edges else 0
+
+        return subnetwork
+
+
+    def write_subnetwork(self, node_ids, cx_file_path, name=None,
+                         json_backend=None):
+        """
+        Writes subnetwork of nodes to file in CX format,
+        see :py:meth:`get_subnetwork`
+        :param node_ids: ids of nodes to include
+        :param cx_file_path: path to CX file
+        :param name: name of new network
+        :param json_backend: JSON library to write with, see
+            :py:class:`~ndexkinomeloader.ndexloadkinome.CXJsonBackend`
+        :return:
+        """
+        subnetwork = self.get_subnetwork(node_ids, name=name)
+        CXJsonBackend(json_backend).write_nice_cx(subnetwork, cx_file_path)
+
+
+def load_query_index(cx_file_path, json_backend=None):
+    """
+    Reads network from CX file written by ndexloadkinome.py, i.e.,
+    merged_3-3.5.177-ndexkinomeloader.cx, and builds query index over it
+    :param cx_file_path: path to CX file
+    :param json_backend: JSON library to read with, see
+        :py:class:`~ndexkinomeloader.ndexloadkinome.CXJsonBackend`
+    :return: query index
+    :rtype: :py:class:`KinomeQueryIndex`
+    """
+    network = CXJsonBackend(json_backend).read_nice_cx(cx_file_path)
+    return KinomeQueryIndex(network)
+
+
+def _parse_arguments(desc, args):
+    """
+    Parses command line arguments
+    :param desc:
+    :param args:
+    :return:
+    """
+    help_fm = argparse.RawDescriptionHelpFormatter
+    parser = argparse.ArgumentParser(description=desc, formatter_class=help_fm)
+
+    parser.add_argument('cxfile',
+                        help='CX file written by ndexloadkinome.py, i.e., '
+                             '<datadir>/merged_3-<version>-<profile>.cx')
+    parser.add_argument('query', help='Name, alias or BioGRID PTM ID of node')
+    parser.add_argument('--hops', type=int, default=1,
+                        help='Number of edges to follow from matched nodes '
+                             '(default 1)')
+    parser.add_argument('--ptmsites', action='store_true',
+                        help='If set, get PTM sites of matched proteins '
+                             'instead of their neighborhood')
+    parser.add_argument('--output', default=None,
+                        help='If set, write subnetwork of result nodes to '
+                             'this file in CX format')
+    parser.add_argument('--jsonbackend',
+                        choices=JSON_BACKENDS + (INCREMENTAL_JSON_BACKEND,),
+                        default=DEFAULT_JSON_BACKEND,
+                        help='JSON library to read CX file and write '
+                             '--output with, see --jsonbackend of '
+                             'ndexloadkinome.py (default ' +
+                             DEFAULT_JSON_BACKEND + ')')
+    parser.add_argument('--version', action='version',
+                        version=('%(prog)s ' +
+                                 ndexkinomeloader.__version__))
+
+    return parser.parse_args(args)
+
+
+def main(args):
+    """
+    Main entry point for program
+    :param args:
+    :return:
+    """
+    desc = """
+    Version {version}
+
+    Queries network built by ndexloadkinome.py locally: prints
+    nodes in neighborhood of, or PTM sites of, nodes whose name,
+    alias or BioGRID PTM ID is query, and optionally writes their
+    subnetwork in CX format.
+    """.format(version=ndexkinomeloader.__version__)
+    theargs = _parse_arguments(desc, args[1:])
+
+    try:
+        query_index = load_query_index(theargs.cxfile,
+                                       json_backend=theargs.jsonbackend)
+
+        if theargs.ptmsites:
+            node_ids = query_index.get_ptm_sites(theargs.query)
+        else:
+            node_ids = query_index.get_neighborhood(theargs.query,
+                                                    hops=theargs.hops)
+
+        nodes = query_index.get_network().nodes
+        for node_id in node_ids:
+            print(str(node_id) + '\t' + str(nodes[node_id]['n']) + '\t' +
+                  str(nodes[node_id].get('r')))
+
+        if theargs.output is not None:
+            query_index.write_subnetwork(node_ids, theargs.output,
+                                         name=theargs.query + ' subnetwork',
+                                         json_backend=theargs.jsonbackend)
+        return SUCCESS
+    except Exception:
+        logger.exception('Caught exception')
+        return ERROR
+
+
+if __name__ == '__main__':  # pragma: no cover
+    sys.exit(main(sys.argv))
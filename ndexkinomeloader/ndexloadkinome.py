@@ -7,21 +7,29 @@ from logging import config
 from ndexutil.config import NDExUtilConfig
 import ndexkinomeloader
 
-import requests
 import os
-from ndexutil.tsv.streamtsvloader import StreamTSVLoader
 import zipfile
+import gzip
 
 import csv
 import json
-import pandas as pd
-import ndexutil.tsv.tsv2nicecx2 as t2n
-
-import ndex2
-from ndex2.client import Ndex2
 
 import re
 import copy
+import hashlib
+import io
+import queue
+import mmap
+import struct
+import glob
+import threading
+import time
+import socket
+from contextlib import contextmanager
+
+# pandas, numpy, ndex2, ndexutil.tsv.tsv2nicecx2 and requests are slow to
+# import, so they are imported by the stages that use them; this keeps
+# --version, -h and argument parsing fast
 
 
 SUCCESS = 0
@@ -31,6 +39,121 @@ STYLE = 'style.cx'
 PTI_LOAD_PLAN = 'kinome_interactions-plan.json'
 PTM_LOAD_PLAN = 'kinome_ptm-plan.json'
 
+NETWORK_STAGE = 'network'
+CPU_STAGE = 'cpu'
+
+COLLAPSE_INDEX = sys.intern('Collapse Index')
+
+# default data of genes missing from GENES file
+DEFAULT_GENE_DATA = {'INTERACTION COUNT': '',
+                     'PTM COUNT': '',
+                     'CHEMICAL INTERACTION COUNT': '',
+                     'SOURCE': '',
+                     'CATEGORY VALUES': '',
+                     'SUBCATEGORY VALUES': ''}
+
+# number of rows passed between stages of --stream pipeline at a time
+STREAM_BATCH_SIZE = 1000
+
+# number of rows added to network being built before the strings of attributes
+# they added are interned, so copies of repeated strings are freed as it grows
+INTERN_BATCH_SIZE = 1000
+
+# seconds threads of --stream pipeline wait on a queue before checking
+# if pipeline was stopped, and wait for each other to finish when it is
+STREAM_QUEUE_TIMEOUT = 0.1
+STREAM_JOIN_TIMEOUT = 5
+
+# list data type attributes of collapsed edges get for each data type
+LIST_DATA_TYPES = {'boolean': 'list_of_boolean', 'double': 'list_of_double', 'integer': 'list_of_integer',
+                   'long': 'list_of_long', 'string': 'list_of_string'}
+
+# prefix and extension of files in <datadir> with gene lookup built from
+# GENES file, see GeneLookupIndex
+GENE_LOOKUP_CACHE_PREFIX = 'gene_lookup-'
+GENE_LOOKUP_CACHE_EXTENSION = '.index'
+
+# network attribute holding hash of network content, used to skip
+# uploads of networks that have not changed since last upload
+CONTENT_HASH = 'ndexkinomeloader:contentHash'
+
+BIOGRID_PTM_ID = 'biogrid ptm id'
+
+# interaction of edges from proteins in PTM-RELATIONSHIPS file
+# (i.e., kinases or phosphatases) to PTM site nodes
+PTM_RELATIONSHIP_PREDICATE = 'regulates-post-translational-modification-on'
+
+# columns of PTM-RELATIONSHIPS file the loader reads; rows returned by
+# _read_ptm_relationships hold their values in this order, whatever
+# the order of columns in the file
+PTM_RELATIONSHIP_COLUMNS = ('#PTM ID', 'Entrez Gene ID', 'BioGRID ID', 'Systematic Name', 'Official Symbol',
+                            'Synonyms', 'Relationship', 'Identity', 'Author', 'Pubmed ID', 'Organism ID')
+
+# JSON libraries CX files can be read and written with (see --jsonbackend),
+# fastest first; json module of standard library is the default
+JSON_BACKENDS = ('orjson', 'ujson', 'json')
+
+# JSON library used unless --jsonbackend says otherwise, or the one it
+# names is not installed
+DEFAULT_JSON_BACKEND = 'json'
+
+# --jsonbackend value that parses CX files incrementally with ijson, without
+# reading their text at once, and writes them with the default JSON library
+INCREMENTAL_JSON_BACKEND = 'ijson'
+
+# NiceCXBuilder methods adding element of each aspect ndex2 builds network
+# from; elements of other aspects are added as opaque aspects
+CX_ASPECT_ADDERS = {'networkAttributes': '_add_network_attributes_from_fragment',
+                    'nodes': '_add_node_from_fragment',
+                    'edges': '_add_edge_from_fragment',
+                    'nodeAttributes': '_add_node_attribute_from_fragment',
+                    'edgeAttributes': '_add_edge_attribute_from_fragment',
+                    'citations': '_add_citation_from_fragment',
+                    'supports': '_add_supports_from_fragment',
+                    'edgeSupports': '_add_edge_supports_from_fragment',
+                    'nodeCitations': '_add_node_citations_from_fragment',
+                    'edgeCitations': '_add_edge_citations_from_fragment'}
+
+# seconds between stack samples taken by StageSampler
+PROFILE_SAMPLE_INTERVAL = 0.005
+
+# codecs --compression can set: name -> (file extension, default level)
+COMPRESSION_CODECS = {'gzip': ('.gz', 6), 'bz2': ('.bz2', 9), 'lzma': ('.xz', 6)}
+
+# artifacts in <datadir> --compression sets codec and level of: files extracted
+# from Kinome zip file, network TSV files (ppi_network_1-<version>-<profile>.txt,
+# ptm_network_2-<version>-<profile>.txt and their per-organism parts) and CX files
+# (pti_1-<version>-<profile>.cx, ptm_2-<version>-<profile>.cx, merged_3-<version>-<profile>.cx)
+EXTRACTED_ARTIFACT = 'extracted'
+NETWORK_ARTIFACT = 'network'
+CX_ARTIFACT = 'cx'
+COMPRESSION_ARTIFACTS = (EXTRACTED_ARTIFACT, NETWORK_ARTIFACT, CX_ARTIFACT)
+
+# formats --tableformat can write network tables (ppi_network_1, ptm_network_2) in
+TABLE_FORMATS = ('tsv', 'parquet')
+PARQUET_EXTENSION = '.parquet'
+
+# number of rows of a row group of network table in Parquet format, which
+# is how many rows are held while the table is written
+PARQUET_ROW_GROUP_SIZE = 65536
+
+# data types of load plan columns whose values network tables in Parquet
+# format store as numbers: data type -> kind of column
+NUMBER_DATA_TYPES = {'double': 'double', 'float': 'double',
+                     'integer': 'integer', 'long': 'integer', 'short': 'integer'}
+
+# seconds between attempts to take a lock held by another process
+# where fcntl is not available
+LOCK_POLL_INTERVAL = 0.5
+
+# artifacts in <datadir> (i.e., the Kinome zip file) modified up to this many
+# seconds before the loader started are treated as produced during this run by
+# another loader sharing <datadir>; allows for clock skew between hosts
+ARTIFACT_CLOCK_SKEW = 60
+
+# matches names of PTM site nodes, i.e., CDC28-S-19 or CDC28-T-undefined
+PTM_NODE_NAME_PATTERN = re.compile("^([A-Za-z]+[0-9]*)-([A-Z]+)-([0-9]+|[A-Za-z]+)$")
+
 logger = logging.getLogger(__name__)
 
 TSV2NICECXMODULE = 'ndexutil.tsv.tsv2nicecx2'
@@ -65,6 +188,1085 @@ def get_style():
     return os.path.join(get_package_dir(), STYLE)
 
 
+def _intern_attribute_list(attribute_list, intern):
+    """
+    Interns attribute name, data type and string value(s) of every
+    attribute in the list, so that equal strings repeated across
+    nodes/edges (i.e., 'citation', 'Experimental System', 'alias')
+    are stored once
+    :param attribute_list: list of node or edge attributes
+    :param intern: function that interns strings, see :py:meth:`ValueInterner.intern`
+    :return:
+    """
+    for attribute in attribute_list:
+        attribute['n'] = intern(attribute['n'])
+
+        if 'd' in attribute:
+            attribute['d'] = intern(attribute['d'])
+
+        value = attribute['v']
+        if isinstance(value, str):
+            attribute['v'] = intern(value)
+        elif isinstance(value, list):
+            for index, list_value in enumerate(value):
+                value[index] = intern(list_value)
+
+
+def _convert_shard_to_cx(dataframe, plan):
+    """
+    Converts shard (a slice of rows) of network TSV to CX. Runs in worker process.
+    Strings of attributes are interned, so equal strings are pickled once
+    and shared when the shard is unpickled
+    :param dataframe: rows of shard
+    :param plan: load plan
+    :return: tuple of nodes, edges, node attributes and edge attributes dictionaries
+    """
+    import ndexutil.tsv.tsv2nicecx2 as t2n
+
+    network = t2n.convert_pandas_to_nice_cx_with_load_plan(dataframe, plan)
+
+    intern = ValueInterner().intern
+    for aspect in (network.nodeAttributes, network.edgeAttributes):
+        for attribute_list in aspect.values():
+            _intern_attribute_list(attribute_list, intern)
+
+    return network.nodes, network.edges, network.nodeAttributes, network.edgeAttributes
+
+
+def _create_process_pool(max_workers):
+    """
+    Creates pool of worker processes started from a fork server (or spawned where
+    there is none), since a process forked from this one would copy locks held by
+    its other threads, i.e., of network summaries or concurrent --jobs, and hang
+    :param max_workers: maximum number of worker processes
+    :return: :py:class:`concurrent.futures.ProcessPoolExecutor`
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+    else:
+        context = multiprocessing.get_context('spawn')
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=context)
+
+
+def _build_organism_networks(args, organism, style_aspect, ptm_relationships):
+    """
+    Builds PTI, PTM and merged networks of organism from its network files
+    written by --byorganism mode. Runs in worker process
+    :param args: loader arguments
+    :param organism: taxon id
+    :param style_aspect: visual properties aspect to style networks with
+    :param ptm_relationships: rows of PTM-RELATIONSHIPS file of organism
+    :return: tuple of list of (network name, content hash, path to CX file, size
+             of CX file before compression) tuples and SUCCESS or ERROR
+    """
+    loader = NDExNdexkinomeloaderLoader(args)
+    loader._workers = 1
+    loader._style_aspect = style_aspect
+    loader._set_organism(organism)
+    return loader._build_organism_networks(ptm_relationships)
+
+
+def _import_ndex2():
+    """
+    Imports ndex2 package before loader starts threads: ndex2 and ndex2.client
+    import each other, so a thread importing ndex2 while another imports
+    ndex2.client (i.e., through ndexutil.tsv.tsv2nicecx2) gets a partially
+    initialized module
+    :return:
+    """
+    import importlib
+
+    importlib.import_module('ndex2')
+
+
+# path of lock file -> lock serializing threads of this process on it,
+# since fcntl locks are held by process and do not exclude its threads
+_thread_locks = {}
+_thread_locks_lock = threading.Lock()
+
+
+def _parse_compression(value):
+    """
+    Parses --compression value: comma separated [<artifact>=]<codec>[:<level>],
+    where an entry without artifact applies to all artifacts and codec 'none'
+    turns compression off, i.e., 'gzip:1,cx=lzma' or 'gzip,extracted=none'
+    :param value: --compression value or None
+    :raises argparse.ArgumentTypeError: if artifact, codec or level is invalid
+    :return: dictionary of artifact (i.e., CX_ARTIFACT) -> (codec, level)
+    """
+    compression = {}
+    if not value:
+        return compression
+
+    for part in value.split(','):
+        part = part.strip()
+        artifacts = COMPRESSION_ARTIFACTS
+        if '=' in part:
+            artifact, part = [p.strip() for p in part.split('=', 1)]
+            if artifact not in COMPRESSION_ARTIFACTS:
+                raise argparse.ArgumentTypeError('unknown artifact: ' + artifact)
+            artifacts = (artifact,)
+
+        codec, level = part, None
+        if ':' in part:
+            codec, level = part.split(':', 1)
+            try:
+                level = int(level)
+            except ValueError:
+                raise argparse.ArgumentTypeError('invalid level: ' + level)
+
+        if codec == 'none':
+            for artifact in artifacts:
+                compression.pop(artifact, None)
+            continue
+
+        if codec not in COMPRESSION_CODECS:
+            raise argparse.ArgumentTypeError('unknown codec: ' + codec)
+
+        for artifact in artifacts:
+            compression[artifact] = (codec, COMPRESSION_CODECS[codec][1] if level is None else level)
+
+    return compression
+
+
+def _get_compressed_file_name(file_path, compression):
+    """
+    Gets name of file_path compressed with compression, i.e., ppi_network_1.txt.gz
+    :param file_path: path to file
+    :param compression: (codec, level) tuple or None if file is not compressed
+    :return: path to file
+    """
+    if compression is None:
+        return file_path
+    return file_path + COMPRESSION_CODECS[compression[0]][0]
+
+
+def _get_file_compression(file_path):
+    """
+    Gets codec of file from its extension
+    :param file_path: path to file
+    :return: (codec, default level) tuple or None if file is not compressed
+    """
+    for codec, (extension, level) in COMPRESSION_CODECS.items():
+        if file_path.endswith(extension):
+            return codec, level
+    return None
+
+
+def _open_file(file_path, mode='r', compression=None):
+    """
+    Opens file, decompressing or compressing it with codec its extension names
+    (i.e., '.gz'), or with compression if set. Modes 'r' and 'w' are text modes
+    :param file_path: path to file
+    :param mode: 'r', 'rb', 'w' or 'wb'
+    :param compression: (codec, level) tuple
+    :return: file object
+    """
+    if compression is None:
+        compression = _get_file_compression(file_path)
+    if compression is None:
+        return open(file_path, mode)
+
+    codec, level = compression
+    binary_mode = mode.rstrip('b') + 'b'
+
+    if codec == 'gzip':
+        compressed = ReproducibleGzipFile(file_path, binary_mode, level)
+    elif codec == 'bz2':
+        import bz2
+        compressed = bz2.open(file_path, binary_mode, compresslevel=level)
+    else:
+        import lzma
+        compressed = lzma.open(file_path, binary_mode, preset=level if 'w' in mode else None)
+
+    if 'b' in mode:
+        return compressed
+    return io.TextIOWrapper(compressed)
+
+
+class ReproducibleGzipFile(gzip.GzipFile):
+    """
+    Gzip file with no file name or time in its header, so equal content
+    gives equal files. Opens the file itself and closes it when closed
+    """
+    def __init__(self, file_path, mode, compresslevel):
+        """
+        Constructor
+        :param file_path: path to file
+        :param mode: 'rb' or 'wb'
+        :param compresslevel: 0-9
+        """
+        self._raw_file = open(file_path, mode)
+        try:
+            super(ReproducibleGzipFile, self).__init__(filename='', mode=mode, compresslevel=compresslevel,
+                                                       fileobj=self._raw_file, mtime=0)
+        except Exception:
+            self._raw_file.close()
+            raise
+
+    def close(self):
+        try:
+            super(ReproducibleGzipFile, self).close()
+        finally:
+            self._raw_file.close()
+
+
+class DecompressingReader(object):
+    """
+    Reads compressed file as a stream of its decompressed content, i.e., to
+    upload compressed CX file without writing it uncompressed. Its len,
+    number of bytes left to read, is what requests_toolbelt (which ndex2
+    uploads with) takes size of upload from
+    """
+    def __init__(self, file_path, size=None):
+        """
+        Constructor
+        :param file_path: path to compressed file
+        :param size: size of decompressed content, i.e., recorded when file was
+                     written; if None, file is decompressed once to get it
+        """
+        self._size = size
+        if self._size is None:
+            self._size = 0
+            with _open_file(file_path, 'rb') as f:
+                while True:
+                    block = f.read(1024 * 1024)
+                    if not block:
+                        break
+                    self._size += len(block)
+
+        self._file = _open_file(file_path, 'rb')
+        self._position = 0
+
+    @property
+    def len(self):
+        return self._size - self._position
+
+    def read(self, size=-1):
+        block = self._file.read(size)
+        self._position += len(block)
+        return block
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _is_parquet_file(file_path):
+    return file_path.endswith(PARQUET_EXTENSION)
+
+
+def _get_plan_column_uses(plan):
+    """
+    Gets how load plan reads each column of network table
+    :param plan: load plan
+    :return: dictionary of column name -> set of uses, each ('string', None),
+             ('list', delimiter), ('double', None) or ('integer', None)
+    """
+    uses = {}
+
+    def add_use(name, use):
+        uses.setdefault(name.split('::')[0], set()).add(use)
+
+    for part in ('source_plan', 'target_plan', 'edge_plan'):
+        part_plan = plan.get(part, {})
+        for key in ('rep_column', 'node_name_column', 'predicate_id_column', 'citation_id_column'):
+            if part_plan.get(key):
+                add_use(part_plan[key], ('string', None))
+        for column in part_plan.get('property_columns', []):
+            if not isinstance(column, dict):
+                add_use(column, ('string', None))
+            elif not column.get('column_name'):
+                continue
+            elif column.get('delimiter'):
+                add_use(column['column_name'], ('list', column['delimiter']))
+            elif column.get('data_type') in NUMBER_DATA_TYPES:
+                add_use(column['column_name'], (NUMBER_DATA_TYPES[column['data_type']], None))
+            else:
+                add_use(column['column_name'], ('string', None))
+
+    return uses
+
+
+def _get_plan_columns(plan):
+    """
+    Gets names of columns of network table load plan reads
+    :param plan: load plan
+    :return: set of column names
+    """
+    return set(_get_plan_column_uses(plan))
+
+
+def _get_table_column_types(plan):
+    """
+    Gets columns of network table Parquet format stores typed: columns load plan
+    splits by a delimiter become lists of strings, columns it reads as numbers
+    become numbers. A column is typed only if every use of it in the plan reads
+    it so, since values are converted back to text for t2n
+    :param plan: load plan
+    :return: dictionary of column name -> ('list', delimiter), ('double', None)
+             or ('integer', None)
+    """
+    column_types = {}
+    for name, column_uses in _get_plan_column_uses(plan).items():
+        list_uses = [use for use in column_uses if use[0] == 'list']
+        # joining list gives back the original text, so the column can also be read as string
+        if len(list_uses) == 1 and column_uses <= {list_uses[0], ('string', None)}:
+            column_types[name] = list_uses[0]
+        elif len(column_uses) == 1 and list(column_uses)[0][0] in ('double', 'integer'):
+            column_types[name] = list(column_uses)[0]
+    return column_types
+
+
+def _get_parquet_fields(name, column_type):
+    """
+    Gets Arrow fields column of network table can be stored as, from the
+    narrowest to string, which every column converts to
+    :param name: name of column
+    :param column_type: see :py:func:`_get_table_column_types`, or None
+    :return: list of :py:class:`pyarrow.Field`
+    """
+    import pyarrow as pa
+
+    kind, delimiter = column_type if column_type is not None else ('string', None)
+
+    fields = []
+    if kind == 'list':
+        fields.append(pa.field(name, pa.list_(pa.string()), metadata={'delimiter': delimiter}))
+    elif kind in ('double', 'integer'):
+        fields.append(pa.field(name, pa.int64()))
+        if kind == 'double':
+            fields.append(pa.field(name, pa.float64()))
+    fields.append(pa.field(name, pa.string()))
+    return fields
+
+
+def _get_parquet_column(values, field):
+    """
+    Converts values of network table column to Arrow array of type of field.
+    Empty values of number columns become nulls and empty values of list
+    columns empty lists
+    :param values: sequence of strings
+    :param field: one of :py:func:`_get_parquet_fields`
+    :return: array, or None if some value does not convert
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    strings = pa.array(values, type=pa.string())
+
+    if pa.types.is_string(field.type):
+        return strings
+
+    if pa.types.is_list(field.type):
+        return pc.if_else(pc.equal(strings, ''), pa.scalar([], type=field.type),
+                          pc.split_pattern(strings, field.metadata[b'delimiter'].decode('utf-8')))
+
+    numbers = pc.if_else(pc.equal(strings, ''), pa.scalar(None, type=pa.string()), strings)
+    try:
+        return pc.cast(numbers, field.type)
+    except pa.ArrowInvalid:
+        return None
+
+
+class ParquetTableWriter(object):
+    """
+    Writes network table in Parquet format a row group of PARQUET_ROW_GROUP_SIZE
+    rows at a time, so only one row group of rows is held. A column is stored as
+    the narrowest of :py:func:`_get_parquet_fields` its first row group converts
+    to; if a later row group does not convert, the column is widened (integer to
+    double to string) and row groups already written are rewritten
+    """
+    def __init__(self, file_obj, column_types, row_group_size=None):
+        """
+        Constructor
+        :param file_obj: file opened for writing in binary mode
+        :param column_types: see :py:func:`_get_table_column_types`
+        :param row_group_size: number of rows of a row group, if None PARQUET_ROW_GROUP_SIZE
+        """
+        self._file = file_obj
+        self._column_types = column_types
+        self._row_group_size = row_group_size or PARQUET_ROW_GROUP_SIZE
+        self._header = None
+        self._rows = []
+        # column name -> fields it can still be stored as, current one first
+        self._fields = None
+        self._writer = None
+
+    def write_row(self, row):
+        """
+        Writes row, header first
+        :param row: list of strings
+        :return:
+        """
+        if self._header is None:
+            self._header = row
+            self._fields = {name: _get_parquet_fields(name, self._column_types.get(name))
+                            for name in row}
+            return
+
+        self._rows.append(row)
+        if len(self._rows) == self._row_group_size:
+            self._write_row_group()
+
+    def close(self):
+        """
+        Writes rows not written yet and the footer of Parquet file; a file with
+        header only gets the columns and no rows
+        :return:
+        """
+        if self._rows or self._writer is None:
+            self._write_row_group()
+        self._writer.close()
+
+    def _write_row_group(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        header = self._header or []
+        columns = zip(*self._rows) if self._rows else [()] * len(header)
+        self._rows = []
+
+        arrays = []
+        widened = False
+        for name, values in zip(header, columns):
+            fields = self._fields[name]
+            array = _get_parquet_column(values, fields[0])
+            while array is None:
+                fields.pop(0)
+                widened = True
+                array = _get_parquet_column(values, fields[0])
+            arrays.append(array)
+
+        schema = pa.schema([self._fields[name][0] for name in header])
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self._file, schema)
+        elif widened:
+            self._rewrite(schema)
+
+        self._writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+
+    def _rewrite(self, schema):
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+
+        self._writer.close()
+        self._file.flush()
+        written = pq.read_table(self._file.name)
+
+        arrays = []
+        for field in schema:
+            if pa.types.is_string(field.type):
+                arrays.append(_get_text_column(written, field.name))
+            else:
+                arrays.append(pc.cast(written[field.name], field.type))
+
+        self._file.seek(0)
+        self._file.truncate()
+        self._writer = pq.ParquetWriter(self._file, schema)
+        self._writer.write_table(pa.Table.from_arrays(arrays, schema=schema),
+                                 row_group_size=self._row_group_size)
+
+
+def _get_text_column(table, name):
+    """
+    Gets column of network table read from Parquet file as the strings
+    its TSV file would have: lists are joined by their delimiter and
+    numbers formatted so they parse to the same value
+    :param table: :py:class:`pyarrow.Table`
+    :param name: name of column
+    :return: array of strings
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    column = table[name]
+    field = table.schema.field(name)
+
+    if pa.types.is_list(field.type):
+        column = pc.binary_join(column, field.metadata[b'delimiter'].decode('utf-8'))
+    elif not pa.types.is_string(field.type):
+        column = pc.cast(column, pa.string())
+
+    return pc.fill_null(column, '')
+
+
+def _get_text_dataframe(table):
+    """
+    Gets dataframe of strings of table, see :py:func:`_get_text_column`
+    :param table: :py:class:`pyarrow.Table`
+    :return: :py:class:`pandas.DataFrame`
+    """
+    import pyarrow as pa
+
+    return pa.Table.from_arrays([_get_text_column(table, name) for name in table.column_names],
+                                names=table.column_names).to_pandas()
+
+
+def _read_parquet_table(file_path, columns=None, chunksize=None):
+    """
+    Reads network table from Parquet file, memory mapped, as dataframe of strings
+    like one read from its TSV file. Typed columns are converted to text, as
+    t2n.process_row() reads text (i.e., it drops values that are false, like
+    number 0); with chunksize only one batch of rows is converted at a time
+    :param file_path: path to file
+    :param columns: names of columns to read; if None, all are read
+    :param chunksize: if set, iterator of dataframes of this many rows is returned
+    :return: :py:class:`pandas.DataFrame` or iterator of them
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(file_path, memory_map=True)
+    if columns is not None:
+        columns = [name for name in parquet_file.schema_arrow.names if name in columns]
+
+    if chunksize is None:
+        return _get_text_dataframe(parquet_file.read(columns=columns))
+
+    return (_get_text_dataframe(pa.Table.from_batches([batch]))
+            for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns))
+
+
+def _get_temp_file_name(file_path):
+    """
+    Gets name of temporary file to write file_path to before renaming it into
+    place. The name is unique per host, process and thread, so loaders sharing
+    a directory (i.e., on NFS) never write the same temporary file
+    :param file_path: path to file
+    :return: path to temporary file
+    """
+    return '{}.{}.{}.{}.tmp'.format(file_path, socket.gethostname(), os.getpid(), threading.get_ident())
+
+
+@contextmanager
+def _atomic_write(file_path, mode='w', compression=None):
+    """
+    Context manager that opens temporary file for writing and, if the block
+    succeeds, renames it to file_path, so readers of file_path never see a
+    partially written file
+    :param file_path: path to file
+    :param mode: 'w' or 'wb'
+    :param compression: (codec, level) tuple; if None, file is compressed
+                        with codec its extension names, if any
+    :return: file object
+    """
+    if compression is None:
+        compression = _get_file_compression(file_path)
+
+    temp_file = _get_temp_file_name(file_path)
+    try:
+        with _open_file(temp_file, mode, compression) as f:
+            yield f
+        os.replace(temp_file, file_path)
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
+
+@contextmanager
+def _file_lock(file_path):
+    """
+    Context manager holding exclusive lock on <file_path>.lock, which excludes
+    other threads of this process and other processes, on this or other hosts
+    sharing the directory. Uses fcntl.lockf (POSIX locks, supported on NFS);
+    where fcntl is not available, the lock file is created exclusively
+    and removed when the lock is released
+    :param file_path: path to file the lock protects
+    :return:
+    """
+    lock_file = os.path.abspath(file_path) + '.lock'
+
+    with _thread_locks_lock:
+        thread_lock = _thread_locks.setdefault(lock_file, threading.Lock())
+
+    with thread_lock:
+        try:
+            import fcntl
+        except ImportError:
+            fcntl = None
+
+        if fcntl is not None:
+            with open(lock_file, 'a') as f:
+                fcntl.lockf(f, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.lockf(f, fcntl.LOCK_UN)
+            return
+
+        while True:
+            try:
+                fd = os.open(lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                break
+            except FileExistsError:
+                time.sleep(LOCK_POLL_INTERVAL)
+        try:
+            yield
+        finally:
+            os.close(fd)
+            os.remove(lock_file)
+
+
+def _get_file_hash(file_path):
+    """
+    Gets SHA-256 hash of file contents
+    :param file_path: path to file
+    :return: hex digest
+    :rtype: string
+    """
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+class ValueInterner(object):
+    """
+    Table of distinct string names and values of node and edge attributes.
+    Equal strings passed through intern() are replaced with one shared object,
+    so each distinct string is stored once and lists of values can be
+    deduplicated by identity of their strings
+    """
+    def __init__(self):
+        """
+        Constructor
+        """
+        self._values = {}
+
+    def intern(self, value):
+        """
+        Gets shared object equal to value if value is a string
+        :param value: value of attribute
+        :return: shared string or value if it is not a string
+        """
+        if not isinstance(value, str):
+            return value
+        return self._values.setdefault(value, value)
+
+    def __len__(self):
+        return len(self._values)
+
+
+class GeneLookupIndex(object):
+    """
+    Gene lookup (Entrez gene id -> dictionary of gene data) saved to a file
+    that is memory mapped, so it opens in constant time however many genes
+    it has. The file has a header, offsets of records sorted by Entrez gene
+    id and the records, each the id and its gene data in JSON. Records are
+    found by binary search and decoded on first lookup only
+    """
+    MAGIC = b'NDXGENE1'
+
+    def __init__(self, file_path):
+        """
+        Constructor
+        :param file_path: path to file written by :py:meth:`write`
+        :raises ValueError: if file is not a gene lookup index
+        """
+        with open(file_path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._map[:len(self.MAGIC)] != self.MAGIC:
+            raise ValueError(file_path + ' is not a gene lookup index')
+        self._count, = struct.unpack_from('<Q', self._map, len(self.MAGIC))
+        self._offsets = len(self.MAGIC) + 8
+        # Entrez gene id -> gene data, or None if there is no such gene
+        self._decoded = {}
+
+    @classmethod
+    def write(cls, f, gene_lookup):
+        """
+        Writes gene lookup in format read by constructor
+        :param f: file opened for writing in binary mode
+        :param gene_lookup: dictionary of Entrez gene id -> dictionary of gene data
+        :return:
+        """
+        records = []
+        for entrez_gene_id in sorted(gene_lookup, key=lambda k: k.encode('utf-8')):
+            gene_data = {column: value.item() if hasattr(value, 'item') else value
+                         for column, value in gene_lookup[entrez_gene_id].items()}
+            records.append(entrez_gene_id.encode('utf-8') + b'\t' + json.dumps(gene_data).encode('utf-8'))
+
+        offset = len(cls.MAGIC) + 8 + 8 * (len(records) + 1)
+        offsets = []
+        for record in records:
+            offsets.append(offset)
+            offset += len(record)
+        offsets.append(offset)
+
+        f.write(cls.MAGIC)
+        f.write(struct.pack('<Q', len(records)))
+        f.write(struct.pack('<{}Q'.format(len(offsets)), *offsets))
+        for record in records:
+            f.write(record)
+
+    def _get_record(self, index):
+        start, end = struct.unpack_from('<QQ', self._map, self._offsets + 8 * index)
+        return self._map[start:end]
+
+    def _find(self, entrez_gene_id):
+        key = entrez_gene_id.encode('utf-8')
+        low = 0
+        high = self._count
+        while low < high:
+            middle = (low + high) // 2
+            record_key, _, gene_data = self._get_record(middle).partition(b'\t')
+            if record_key == key:
+                return json.loads(gene_data)
+            if record_key < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def get(self, entrez_gene_id, default=None):
+        try:
+            gene_data = self._decoded[entrez_gene_id]
+        except KeyError:
+            gene_data = self._decoded.setdefault(entrez_gene_id, self._find(entrez_gene_id))
+        return default if gene_data is None else gene_data
+
+    def __getitem__(self, entrez_gene_id):
+        gene_data = self.get(entrez_gene_id)
+        if gene_data is None:
+            raise KeyError(entrez_gene_id)
+        return gene_data
+
+    def __contains__(self, entrez_gene_id):
+        return self.get(entrez_gene_id) is not None
+
+    def __len__(self):
+        return self._count
+
+
+class StageSampler(threading.Thread):
+    """
+    Sampling profiler of one thread: every interval seconds records the call
+    stack of that thread and counts how many times each stack was seen.
+    Stacks are written in collapsed format (frames from root to leaf separated
+    by ';', followed by the count), which flame graph tools read
+    """
+    def __init__(self, thread_id, interval=PROFILE_SAMPLE_INTERVAL):
+        """
+        Constructor
+        :param thread_id: id of thread to sample, i.e., threading.get_ident()
+        :param interval: seconds between samples
+        """
+        super(StageSampler, self).__init__(daemon=True)
+        self._thread_id = thread_id
+        self._interval = interval
+        self._stop_event = threading.Event()
+        self._stacks = {}
+
+    def _get_stack(self, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append('{} ({}:{})'.format(code.co_name, os.path.basename(code.co_filename),
+                                             code.co_firstlineno).replace(';', ':'))
+            frame = frame.f_back
+        stack.reverse()
+        return ';'.join(stack)
+
+    def run(self):
+        while not self._stop_event.wait(self._interval):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+            stack = self._get_stack(frame)
+            self._stacks[stack] = self._stacks.get(stack, 0) + 1
+
+    def stop(self):
+        """
+        Stops sampling and waits for sampling thread to finish
+        :return:
+        """
+        self._stop_event.set()
+        self.join()
+
+    def write_collapsed_stacks(self, file_path):
+        """
+        Writes sampled stacks in collapsed format, most frequent first
+        :param file_path: path to file
+        :return:
+        """
+        with open(file_path, 'w') as f:
+            for stack, count in sorted(self._stacks.items(), key=lambda item: -item[1]):
+                f.write(stack + ' ' + str(count) + '\n')
+
+
+class CXJsonBackend(object):
+    """
+    Reads and writes CX files with a JSON library: the json module of the
+    standard library unless orjson or ujson is asked for. Backend 'ijson'
+    parses CX files incrementally, one aspect element at a time, and
+    :py:meth:`read_nice_cx` adds each element to network as it is parsed,
+    so neither the raw text of the file nor a list of its aspect fragments
+    is ever held in memory as a whole
+    """
+    def __init__(self, name=None):
+        """
+        Constructor
+        :param name: one of JSON_BACKENDS or INCREMENTAL_JSON_BACKEND; if None or
+                     the library is not installed, DEFAULT_JSON_BACKEND is used
+        """
+        import importlib
+
+        self._incremental = None
+        if name == INCREMENTAL_JSON_BACKEND:
+            try:
+                self._incremental = importlib.import_module(INCREMENTAL_JSON_BACKEND)
+            except ImportError:
+                logger.warning(INCREMENTAL_JSON_BACKEND + ' is not installed, CX files are read at once')
+            name = None
+
+        self._name = DEFAULT_JSON_BACKEND
+        if name is not None and name != DEFAULT_JSON_BACKEND:
+            try:
+                importlib.import_module(name)
+                self._name = name
+            except ImportError:
+                logger.warning(name + ' is not installed, using ' + DEFAULT_JSON_BACKEND)
+        self._module = importlib.import_module(self._name)
+
+    def get_name(self):
+        """
+        Gets name of JSON library used for writing, and reading unless reading is incremental
+        :return: name, i.e., 'orjson'
+        """
+        return self._name
+
+    def read_cx(self, cx_file_path):
+        """
+        Reads CX file
+        :param cx_file_path: path to CX file
+        :return: list of aspect fragments
+        """
+        if self._incremental is not None:
+            # fragments are parsed from file as it is read, but all are returned;
+            # read_nice_cx() does not go through here
+            with _open_file(cx_file_path, 'rb') as f:
+                return list(self._incremental.items(f, 'item', use_float=True))
+
+        if self._name == 'orjson':
+            with _open_file(cx_file_path, 'rb') as f:
+                return self._module.loads(f.read())
+
+        with _open_file(cx_file_path, 'r') as f:
+            return self._module.load(f)
+
+    def write_cx(self, cx, cx_file_path, compression=None):
+        """
+        Writes CX to file; the json module writes it indented, the faster libraries
+        compact. orjson writes NaN values as null
+        :param cx: list of aspect fragments
+        :param cx_file_path: path to CX file
+        :param compression: (codec, level) tuple; if None, file is compressed
+                            with codec its extension names, if any
+        :return: number of bytes of CX written, before compression
+        """
+        if self._name == 'orjson':
+            with _open_file(cx_file_path, 'wb', compression) as f:
+                f.write(self._module.dumps(cx))
+                return f.tell()
+
+        with _open_file(cx_file_path, 'w', compression) as f:
+            if self._name == 'ujson':
+                self._module.dump(cx, f, escape_forward_slashes=False)
+            else:
+                self._module.dump(cx, f, indent=4)
+            f.flush()
+            # position of binary (and compressing) file under text one is in uncompressed bytes
+            return f.buffer.tell()
+
+    def read_nice_cx(self, cx_file_path):
+        """
+        Reads network from CX file, same as ndex2.create_nice_cx_from_file()
+        :param cx_file_path: path to CX file
+        :return: network
+        :rtype: :py:class:`ndex2.nice_cx_network.NiceCXNetwork`
+        """
+        import ndex2
+
+        if not os.path.isfile(cx_file_path):
+            raise Exception('The file ' + cx_file_path + '  does not exist.')
+
+        if self._incremental is None:
+            return ndex2.create_nice_cx_from_raw_cx(self.read_cx(cx_file_path))
+
+        with _open_file(cx_file_path, 'rb') as f:
+            events = self._incremental.parse(f, use_float=True)
+            return _create_nice_cx_from_cx_elements(_get_cx_elements(events))
+
+    def write_nice_cx(self, network, cx_file_path, compression=None):
+        """
+        Writes network to CX file
+        :param network:
+        :param cx_file_path: path to CX file
+        :param compression: see :py:meth:`write_cx`
+        :return: number of bytes of CX written, before compression
+        """
+        return self.write_cx(network.to_cx(), cx_file_path, compression)
+
+
+def _get_cx_elements(events):
+    """
+    Gets aspect elements of CX from ijson parse events, building one element
+    at a time so no aspect fragment is ever held whole. Value of aspect that
+    is not a list, i.e., @context as a dictionary, is one element
+    :param events: iterator of (prefix, event, value) tuples of ijson.parse()
+    :return: iterator of (aspect name, element) tuples, in order of file
+    """
+    from ijson.common import ObjectBuilder
+
+    # containers open around current position: CX list, aspect fragment, list of elements
+    depth = 0
+    aspect_name = None
+    builder = None
+    builder_depth = 0
+    for prefix, event, value in events:
+        if builder is not None:
+            builder.event(event, value)
+            if event in ('start_map', 'start_array'):
+                builder_depth += 1
+            elif event in ('end_map', 'end_array'):
+                builder_depth -= 1
+                if builder_depth == 0:
+                    yield aspect_name, builder.value
+                    builder = None
+            continue
+
+        if event in ('end_map', 'end_array'):
+            depth -= 1
+        elif depth == 2 and event == 'map_key':
+            aspect_name = value
+        elif depth == 2 and event == 'start_array':
+            depth = 3
+        elif depth >= 2 and event in ('start_map', 'start_array'):
+            builder = ObjectBuilder()
+            builder.event(event, value)
+            builder_depth = 1
+        elif depth >= 2:
+            yield aspect_name, value
+        elif event in ('start_map', 'start_array'):
+            depth += 1
+
+
+def _create_nice_cx_from_cx_elements(elements):
+    """
+    Creates network from aspect elements of CX the way
+    ndex2.create_nice_cx_from_raw_cx() creates it from list of aspect fragments,
+    adding each element as it comes. Like ndex2, only aspects named in metaData
+    are loaded, so elements that come before metaData names their aspect are
+    held until it does
+    :param elements: iterator of (aspect name, element) tuples, see :py:func:`_get_cx_elements`
+    :return: network
+    :rtype: :py:class:`ndex2.nice_cx_network.NiceCXNetwork`
+    """
+    import ndex2
+
+    builder = ndex2.NiceCXBuilder()
+    adders = {name: getattr(builder, adder) for name, adder in CX_ASPECT_ADDERS.items()}
+    available_aspects = set()
+    held_elements = {}
+    opaque_aspects = {}
+
+    def add_element(aspect_name, element):
+        if aspect_name in adders:
+            adders[aspect_name](element)
+        elif aspect_name not in ndex2.known_aspects_min:
+            opaque_aspects.setdefault(aspect_name, []).append(element)
+
+    empty = True
+    for aspect_name, element in elements:
+        empty = False
+        if aspect_name == 'metaData':
+            name = element.get('name')
+            available_aspects.add(name)
+            for held_element in held_elements.pop(name, []):
+                add_element(name, held_element)
+        elif aspect_name in available_aspects:
+            add_element(aspect_name, element)
+        else:
+            held_elements.setdefault(aspect_name, []).append(element)
+
+    if empty:
+        raise Exception('CX is empty')
+
+    for aspect_name, aspect_elements in opaque_aspects.items():
+        if aspect_name == '@context':
+            builder.set_context(aspect_elements)
+        else:
+            builder.add_opaque_aspect(aspect_name, aspect_elements)
+    return builder.get_nice_cx()
+
+
+class LoaderCache(object):
+    """
+    State kept warm across loader jobs run in one process (see --jobs):
+    parsed configuration, style aspects, load plans, gene lookups keyed by
+    hash of GENES file and NDEx connections. Also holds semaphores limiting
+    how many network-bound and CPU-bound stages of the jobs run at once.
+    Safe to share between threads
+    """
+    def __init__(self, stage_limits=None):
+        """
+        Constructor
+        :param stage_limits: dictionary of stage kind (NETWORK_STAGE, CPU_STAGE)
+                             -> maximum number of such stages running concurrently
+        """
+        self._stage_semaphores = {kind: threading.BoundedSemaphore(limit)
+                                  for kind, limit in (stage_limits or {}).items()}
+        self._lock = threading.Lock()
+        self._configs = {}
+        self._styles = {}
+        self._load_plans = {}
+        self._gene_lookups = {}
+        self._connections = {}
+
+    def _get(self, cache, key, create):
+        """
+        Gets value for key from cache calling create() to build it if it is not there
+        """
+        with self._lock:
+            if key in cache:
+                return cache[key]
+
+        value = create()
+
+        with self._lock:
+            return cache.setdefault(key, value)
+
+    def get_config(self, conf_file, profile, create):
+        return self._get(self._configs, (conf_file, profile), create)
+
+    def get_style(self, style_source, create):
+        return self._get(self._styles, style_source, create)
+
+    def get_load_plan(self, load_plan_path, create):
+        return self._get(self._load_plans, load_plan_path, create)
+
+    def get_gene_lookup(self, genes_file_hash, create):
+        return self._get(self._gene_lookups, genes_file_hash, create)
+
+    def get_connection(self, server, user, create):
+        return self._get(self._connections, (server, user), create)
+
+    def get_stage_semaphore(self, kind):
+        return self._stage_semaphores.get(kind)
+
+
 def _parse_arguments(desc, args):
     """
     Parses command line arguments
@@ -77,7 +1279,9 @@ def _parse_arguments(desc, args):
 
     styling_group = parser.add_mutually_exclusive_group()
 
-    parser.add_argument('datadir', help='Directory where BioGRID Kinome data downloaded to and processed from')
+    parser.add_argument('datadir', nargs='?', default=None,
+                        help='Directory where BioGRID Kinome data downloaded to and processed from. '
+                             'Can be omitted if every job in --jobs file sets datadir')
 
     parser.add_argument('--profile', help='Profile in configuration '
                                           'file to use to load '
@@ -115,7 +1319,11 @@ def _parse_arguments(desc, args):
     parser.add_argument('--version', action='version',
                         version=('%(prog)s ' + ndexkinomeloader.__version__))
 
-    parser.add_argument('--biogridversion', help='Version of BioGRID Release', default='3.5.177')
+    parser.add_argument('--biogridversion', default='3.5.177',
+                        help='Version of BioGRID Release. Can also be a comma separated list and/or '
+                             'range of versions, i.e., 3.5.170-3.5.177,3.5.180; in this case each version '
+                             'is loaded into its own <datadir>/<version> directory in one process '
+                             '(default 3.5.177)')
 
     parser.add_argument('--skipdownload', action='store_true',
                         help='If set, skips download of  BioGRID Kinome and assumes data already reside in <datadir>'
@@ -123,8 +1331,99 @@ def _parse_arguments(desc, args):
 
     styling_group.add_argument('--template',
            help='UUID of network to use for styling networks (the same account where networks are located)')
-
-    return parser.parse_args(args)
+    parser.add_argument('--templatettl', type=int, default=86400,
+                        help='Number of seconds network specified by --template is reused from its copy '
+                             'in <datadir> before it is fetched from NDEx again (default 86400)')
+
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='If set, network TSV files are read and converted to CX in batches of this many '
+                             'rows. Only memory used for parsing stays flat as input size grows: the network '
+                             'being built still holds every node, edge and attribute, so peak memory grows '
+                             'with the network (default None, read whole file at once)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of processes to use for converting network TSV files to CX. '
+                             'If greater than 1, rows are split into shards (of --chunksize rows if set) '
+                             'that are converted in parallel and merged (default 1)')
+
+    pipeline_group = parser.add_mutually_exclusive_group()
+
+    pipeline_group.add_argument('--stream', action='store_true',
+                        help='If set, INTERACTIONS and PTM files are read straight from the Kinome zip file '
+                             'and decompressed, transformed and added to networks by concurrent stages '
+                             'connected by bounded queues, instead of extracting them and building each '
+                             'file before the next step starts. --chunksize and --workers are ignored '
+                             'for these files')
+    parser.add_argument('--queuesize', type=int, default=16,
+                        help='Number of batches of ' + str(STREAM_BATCH_SIZE) + ' rows each queue between '
+                             'stages of --stream pipeline holds (default 16)')
+
+    pipeline_group.add_argument('--byorganism', action='store_true',
+                        help='If set, rows of PPI and PTM network files are split by organism taxon id '
+                             'in one pass, and PTI, PTM and merged networks of each organism are built '
+                             'in their own process (--workers processes run at once) and uploaded as '
+                             'separate networks. Can not be used with --stream')
+
+    parser.add_argument('--jobs',
+                        help='Path to JSON file with a list of jobs to run in this process, where each job is '
+                             'an object overriding any of the arguments above, i.e., '
+                             '[{"datadir": "/data/3.5.176", "biogridversion": "3.5.176"}, ...]. A job with a '
+                             'list or range of BioGRID versions runs once per version, as --biogridversion '
+                             'does. Configuration, '
+                             'style template, load plans, gene lookups and NDEx connection are kept across jobs')
+    parser.add_argument('--maxjobs', type=int, default=None,
+                        help='Maximum number of jobs from --jobs file (or BioGRID versions) to run '
+                             'concurrently; how many of their stages run at once is further limited by '
+                             '--maxnetworkstages and --maxcpustages (default number of jobs)')
+    parser.add_argument('--maxnetworkstages', type=int, default=2,
+                        help='Maximum number of network-bound stages (download, NDEx queries and '
+                             'uploads) of jobs running concurrently (default 2)')
+    parser.add_argument('--maxcpustages', type=int, default=1,
+                        help='Maximum number of CPU-bound stages (unzip, network building) of jobs '
+                             'running concurrently (default 1)')
+    parser.add_argument('--profilestages', default=None,
+                        help='If set, stages of the loader are run under cProfile and a sampling profiler '
+                             'and, for each stage, <stage>-<version>-<profile>.pstats and .collapsed (stacks '
+                             'for flame graphs) files are written to subdirectory of this directory named '
+                             'after <datadir>. Only the thread running the stage is profiled, not worker '
+                             'processes of --workers or --byorganism')
+    parser.add_argument('--profileonly', default=None,
+                        help='Comma separated names of stages to profile with --profilestages, i.e., '
+                             '"build PTI network,build merged network" (default all stages)')
+    parser.add_argument('--jsonbackend', choices=JSON_BACKENDS + (INCREMENTAL_JSON_BACKEND,),
+                        default=DEFAULT_JSON_BACKEND,
+                        help='JSON library to read and write CX files with. ' + DEFAULT_JSON_BACKEND +
+                             ' module writes them indented, orjson and ujson are faster and write them '
+                             'compact; orjson writes NaN values as null. ' + INCREMENTAL_JSON_BACKEND +
+                             ' parses CX files one element at a time, adding each to network as it is '
+                             'parsed, and writes them with ' + DEFAULT_JSON_BACKEND + ' module; it cannot '
+                             'read NaN values ' + DEFAULT_JSON_BACKEND + ' module writes. If the '
+                             'library is not installed, ' + DEFAULT_JSON_BACKEND + ' module is used '
+                             '(default ' + DEFAULT_JSON_BACKEND + ')')
+    parser.add_argument('--compression', type=_parse_compression, default={},
+                        help='Codec and level of files written to <datadir>: comma separated '
+                             '[<artifact>=]<codec>[:<level>], where artifact is one of ' +
+                             ', '.join(COMPRESSION_ARTIFACTS) + ' (files extracted from Kinome zip file, '
+                             'network TSV files and CX files) and codec one of ' +
+                             ', '.join(sorted(COMPRESSION_CODECS)) + ' or none; an entry without '
+                             'artifact applies to all, i.e., "gzip:1,cx=lzma". Compressed files '
+                             'are read back transparently. If unset, files are not compressed')
+    parser.add_argument('--tableformat', choices=TABLE_FORMATS, default='tsv',
+                        help='Format of network tables ppi_network_1 and ptm_network_2 written to '
+                             '<datadir>. parquet (requires pyarrow) stores columns the load plans '
+                             'split by a delimiter as lists and counts as numbers, is not compressed '
+                             'by --compression, and is read faster; if pyarrow is not installed, '
+                             'tsv is written (default tsv)')
+    parser.add_argument('--memoryreport',
+                        help='If set, number and size of attribute values of collapsed PTI network, with '
+                             'and without sharing equal strings, are written to this file in JSON format')
+    parser.add_argument('--timingreport',
+                        help='If set, combined per-job, per-stage timings of --jobs or multiple '
+                             'BioGRID versions are also written to this file in JSON format')
+
+    theargs = parser.parse_args(args)
+    if theargs.datadir is None and theargs.jobs is None:
+        parser.error('datadir is required unless --jobs is given')
+    return theargs
 
 
 def _setup_logging(args):
@@ -155,11 +1454,22 @@ class NDExNdexkinomeloaderLoader(object):
     """
     Class to load content
     """
-    def __init__(self, args):
+    def __init__(self, args, cache=None):
         """
 
         :param args:
+        :param cache: LoaderCache shared with other loaders run in this process, if any
         """
+        self._cache = cache
+        self._interner = ValueInterner()
+        self._start_time = time.time()
+        self._json_backend = CXJsonBackend(args.jsonbackend)
+        self._profile_dir = args.profilestages
+        self._profiled_stages = None
+        if args.profileonly is not None:
+            self._profiled_stages = [name.strip() for name in args.profileonly.split(',')]
+        self._memory_report = args.memoryreport
+        self._timings = []
         self._conf_file = args.conf
         self._profile = args.profile
         self._user = None
@@ -169,25 +1479,49 @@ class NDExNdexkinomeloaderLoader(object):
         self._args = args
 
         self._ndex = None
+        # path of CX file written by loader -> its size before compression,
+        # so compressed file is not decompressed just to get size of upload
+        self._cx_sizes = {}
+        # template and network summaries are fetched in background threads,
+        # both of which create connection to NDEx if there is none yet
+        self._ndex_lock = threading.Lock()
         self._template_UUID = args.template
+        self._template_ttl = args.templatettl
+        self._style_aspect = None
 
         self._biogrid_version = args.biogridversion
         self._datadir = os.path.abspath(args.datadir)
         self._skipdownload = args.skipdownload
+        self._chunksize = args.chunksize
+        self._workers = args.workers
+        self._stream = args.stream
+        self._queuesize = args.queuesize
+        self._by_organism = args.byorganism
+        self._organism = None
+
+        self._compression = args.compression
 
         self._kinome_zip = os.path.join(self._datadir, self._get_kinome_zip_file_name())
-        self._interactions = self._get_interactions_file_name()
-        self._ptm = self._get_ptm_file_name()
-        self._genes = self._get_genes_file_name()
-        self._relations = self._get_relations_file_name()
+        self._interactions = self._get_artifact_file_name(self._get_interactions_file_name(), EXTRACTED_ARTIFACT)
+        self._ptm = self._get_artifact_file_name(self._get_ptm_file_name(), EXTRACTED_ARTIFACT)
+        self._genes = self._get_artifact_file_name(self._get_genes_file_name(), EXTRACTED_ARTIFACT)
+        self._relations = self._get_artifact_file_name(self._get_relations_file_name(), EXTRACTED_ARTIFACT)
+
+        import importlib.util
+
+        self._table_format = args.tableformat
+        if self._table_format == 'parquet' and importlib.util.find_spec('pyarrow') is None:
+            logger.warning('pyarrow is not installed, network tables are written in TSV format')
+            self._table_format = 'tsv'
 
-        self._ppi_network_1 = os.path.join(self._datadir, 'ppi_network_1.txt')
-        self._ptm_network_2 = os.path.join(self._datadir, 'ptm_network_2.txt')
+        self._ppi_network_1 = self._get_network_table_file_name('ppi_network_1')
+        self._ptm_network_2 = self._get_network_table_file_name('ptm_network_2')
 
 
         self._interaction_headers = ["#BIOGRID ID", "ENTREZ GENE ID", "INTERACTION COUNT", "PTM COUNT",
                    "CHEMICAL INTERACTION COUNT", "SOURCE", "CATEGORY VALUES", "SUBCATEGORY VALUES"]
         self._gene_lookup = {}
+        self._ptm_relationships = None
 
         self._pti_load_plan = args.loadpti
         self._ptm_load_plan = args.loadptm
@@ -195,9 +1529,43 @@ class NDExNdexkinomeloaderLoader(object):
         self._ppi_attributes = {}
         self._ptm_attributes = {}
 
-        self._cx_pti = os.path.join(self._datadir, 'pti_1.cx')
-        self._cx_ptm = os.path.join(self._datadir, 'ptm_2.cx')
-        self._cx_merged = os.path.join(self._datadir, 'merged_3.cx')
+        self._cx_pti = self._get_artifact_file_name(self._get_run_file_name('pti_1', '.cx'), CX_ARTIFACT)
+        self._cx_ptm = self._get_artifact_file_name(self._get_run_file_name('ptm_2', '.cx'), CX_ARTIFACT)
+        self._cx_merged = self._get_artifact_file_name(self._get_run_file_name('merged_3', '.cx'), CX_ARTIFACT)
+
+
+    def _get_run_file_name(self, name, extension):
+        """
+        Gets path to file in <datadir> that is written and read back during run,
+        named after BioGRID version and --profile, so loaders of other versions or
+        profiles sharing <datadir> do not overwrite it between writing and reading
+        :param name: name of file, i.e., 'pti_1'
+        :param extension: extension of file, i.e., '.cx'
+        :return: path to file, i.e., <datadir>/pti_1-3.5.177-ndexkinomeloader.cx
+        """
+        profile = re.sub('[^A-Za-z0-9_.-]', '_', self._profile)
+        return os.path.join(self._datadir, name + '-' + self._biogrid_version + '-' + profile + extension)
+
+
+    def _get_network_table_file_name(self, name):
+        """
+        Gets path to network table in <datadir> in format set by --tableformat
+        :param name: name of table, i.e., 'ppi_network_1'
+        :return: path to file
+        """
+        if self._table_format == 'parquet':
+            return self._get_run_file_name(name, PARQUET_EXTENSION)
+        return self._get_artifact_file_name(self._get_run_file_name(name, '.txt'), NETWORK_ARTIFACT)
+
+
+    def _get_artifact_file_name(self, file_path, artifact):
+        """
+        Gets name of file of artifact, with extension of codec --compression sets for it
+        :param file_path: path to uncompressed file
+        :param artifact: EXTRACTED_ARTIFACT, NETWORK_ARTIFACT or CX_ARTIFACT
+        :return: path to file
+        """
+        return _get_compressed_file_name(file_path, self._compression.get(artifact))
 
 
     def _get_user_agent(self):
@@ -212,22 +1580,131 @@ class NDExNdexkinomeloaderLoader(object):
         creates connection to ndex
         :return:
         """
-        if self._ndex is None:
+        with self._ndex_lock:
+            if self._ndex is None:
+                from ndex2.client import Ndex2
 
-            try:
-                self._ndex = Ndex2(host=self._server, username=self._user,
-                                   password=self._pass, user_agent=self._get_user_agent())
-            except Exception as e:
-                self._ndex = None
+                def create():
+                    return Ndex2(host=self._server, username=self._user,
+                                 password=self._pass, user_agent=self._get_user_agent())
+
+                try:
+                    if self._cache is None:
+                        self._ndex = create()
+                    else:
+                        self._ndex = self._cache.get_connection(self._server, self._user, create)
+                except Exception as e:
+                    self._ndex = None
+
+            return self._ndex
+
+    def _get_template_cache_file_name(self):
+        return os.path.join(self._datadir, 'template-' + self._template_UUID + '.cx')
+
+
+    def _fetch_template(self):
+        """
+        Gets network specified by --template from NDEx, reusing its copy in
+        self._datadir if the copy is younger than self._template_ttl seconds.
+        If NDEx can not be reached, an older copy is used if there is one
+        :return: path to CX file of template network
+        """
+        template_file = self._get_template_cache_file_name()
+        # runs in background, so it must not decide whether main thread downloads data
+        os.makedirs(self._datadir, mode=0o755, exist_ok=True)
+
+        with _file_lock(template_file):
+            return self._fetch_template_locked(template_file)
+
+
+    def _fetch_template_locked(self, template_file):
+        if os.path.isfile(template_file) and \
+                time.time() - os.path.getmtime(template_file) < self._template_ttl:
+            return template_file
+
+        try:
+            self._create_ndex_connection()
+            response = self._ndex.get_network_as_cx_stream(self._template_UUID)
+            response.raise_for_status()
+
+            with _atomic_write(template_file, 'wb') as f:
+                f.write(response.content)
+        except Exception as e:
+            if not os.path.isfile(template_file):
+                raise
+            logger.warning('Unable to get template ' + self._template_UUID +
+                           ' from NDEx, using ' + template_file + ': ' + str(e))
+
+        return template_file
+
+
+    def _build_style_aspect(self, template_path):
+        """
+        Reads template network and extracts its visual properties aspect without
+        node and edge specific properties, the same way
+        NiceCXNetwork.apply_style_from_network() does
+        :param template_path: path to CX file of template network
+        :raises Exception: if template network has no visual properties
+        :return: visual properties aspect
+        """
+        from ndex2.nice_cx_network import NiceCXNetwork
+
+        template = self._json_backend.read_nice_cx(template_path)
+
+        vis_props_aspect = template.get_opaque_aspect(NiceCXNetwork.CY_VISUAL_PROPERTIES)
+        if vis_props_aspect is None:
+            vis_props_aspect = template.get_opaque_aspect(NiceCXNetwork.VISUAL_PROPERTIES)
+        if vis_props_aspect is None:
+            raise Exception('No visual style found in ' + template_path)
+
+        return [entry for entry in vis_props_aspect
+                if entry.get(NiceCXNetwork.PROPERTIES_OF) not in (NiceCXNetwork.PROPS_OF_NODES,
+                                                                  NiceCXNetwork.PROPS_OF_EDGES)]
 
-        return self._ndex
 
     def _load_style_template(self):
         """
-        Loads the CX network specified by self._args.style into self._template
+        Loads the CX network specified by self._args.style, or by --template UUID
+        if set, and stores its visual properties aspect in self._style_aspect,
+        so styling each network is just setting this aspect
+        :return:
+        """
+        if self._template_UUID is not None:
+            style_source = ('uuid', self._template_UUID)
+
+            def create():
+                return self._build_style_aspect(self._fetch_template())
+        else:
+            style_source = ('file', os.path.abspath(self._args.style))
+
+            def create():
+                return self._build_style_aspect(style_source[1])
+
+        if self._cache is None:
+            self._style_aspect = create()
+        else:
+            self._style_aspect = self._cache.get_style(style_source, create)
+
+
+    def _apply_style(self, network):
+        """
+        Sets visual properties aspect of network to self._style_aspect.
+        Same as network.apply_style_from_network(template) without re-deriving
+        the aspect from template for each network
+        :param network:
         :return:
         """
-        self._template = ndex2.create_nice_cx_from_file(os.path.abspath(self._args.style))
+        from ndex2.nice_cx_network import NiceCXNetwork
+
+        network.set_opaque_aspect(NiceCXNetwork.VISUAL_PROPERTIES, None)
+        network.set_opaque_aspect(NiceCXNetwork.CY_VISUAL_PROPERTIES, self._style_aspect)
+        network.metadata[NiceCXNetwork.CY_VISUAL_PROPERTIES] = {
+            'name': NiceCXNetwork.CY_VISUAL_PROPERTIES,
+            'elementCount': len(self._style_aspect),
+            'version': '1.0',
+            'consistencyGroup': 1,
+            'properties': []
+        }
 
 
     def _parse_config(self):
@@ -235,11 +1712,18 @@ class NDExNdexkinomeloaderLoader(object):
         Parses config
         :return:
         """
-        ncon = NDExUtilConfig(conf_file=self._conf_file)
-        con = ncon.get_config()
-        self._user = con.get(self._profile, NDExUtilConfig.USER)
-        self._pass = con.get(self._profile, NDExUtilConfig.PASSWORD)
-        self._server = con.get(self._profile, NDExUtilConfig.SERVER)
+        def create():
+            ncon = NDExUtilConfig(conf_file=self._conf_file)
+            con = ncon.get_config()
+            return (con.get(self._profile, NDExUtilConfig.USER),
+                    con.get(self._profile, NDExUtilConfig.PASSWORD),
+                    con.get(self._profile, NDExUtilConfig.SERVER))
+
+        if self._cache is None:
+            self._user, self._pass, self._server = create()
+        else:
+            self._user, self._pass, self._server = \
+                self._cache.get_config(self._conf_file, self._profile, create)
 
 
     def _get_kinome_prefix(self):
@@ -271,6 +1755,7 @@ class NDExNdexkinomeloaderLoader(object):
 
 
     def _download_file(self, url):
+        import requests
 
         #if not os.path.exists(self._datadir):
         #    os.makedirs(self._datadir)
@@ -279,7 +1764,7 @@ class NDExNdexkinomeloaderLoader(object):
             response = requests.get(url)
 
             if response.status_code // 100 == 2:
-                with open(self._kinome_zip, "wb") as received_file:
+                with _atomic_write(self._kinome_zip, "wb") as received_file:
                     received_file.write(response.content)
             else:
                 return response.status_code
@@ -293,9 +1778,31 @@ class NDExNdexkinomeloaderLoader(object):
 
 
     def _download_kinome_files(self):
-        url = self._get_kinome_download_url()
-        download_status = self._download_file(url)
-        return download_status
+        """
+        Downloads Kinome zip file holding a lock on it, so loaders sharing <datadir>
+        download it once: a loader that waited for the lock reuses the file if another
+        loader downloaded it after this loader started
+        :return: SUCCESS or status code of failed download
+        """
+        with _file_lock(self._kinome_zip):
+            if self._produced_during_run(self._kinome_zip):
+                print('Reusing ' + self._kinome_zip + ' downloaded by another loader')
+                return SUCCESS
+
+            url = self._get_kinome_download_url()
+            download_status = self._download_file(url)
+            return download_status
+
+
+    def _produced_during_run(self, file_path):
+        """
+        Checks if file exists and was modified after this loader started (allowing
+        ARTIFACT_CLOCK_SKEW), i.e., by another loader sharing <datadir>
+        :param file_path: path to file
+        :return: True or False
+        """
+        return os.path.isfile(file_path) and \
+            os.path.getmtime(file_path) >= self._start_time - ARTIFACT_CLOCK_SKEW
 
 
     def _check_if_data_dir_exists(self):
@@ -303,44 +1810,199 @@ class NDExNdexkinomeloaderLoader(object):
 
         if not os.path.exists(self._datadir):
             data_dir_existed = False
-            os.makedirs(self._datadir, mode=0o755)
+            # another loader sharing <datadir> may create it at the same time
+            os.makedirs(self._datadir, mode=0o755, exist_ok=True)
 
         return data_dir_existed
 
 
+    def _get_streamed_members(self):
+        """
+        Gets names of files in Kinome zip file that --stream reads without extracting them
+        :return: list of names
+        """
+        return [os.path.basename(self._get_interactions_file_name()),
+                os.path.basename(self._get_ptm_file_name())]
+
+
+    def _use_stream(self):
+        return self._stream and os.path.isfile(self._kinome_zip)
+
+
     def _unzip_kinome(self):
+        """
+        Extracts files of Kinome zip file (except those --stream reads from it) into
+        <datadir>, holding a lock so loaders sharing <datadir> extract them once.
+        Each file is written to a temporary file and renamed into place; files
+        newer than the zip file are reused
+        :return: SUCCESS or ERROR
+        """
         try:
-            with zipfile.ZipFile(self._kinome_zip, "r") as zip_ref:
-                zip_ref.extractall(self._datadir)
+            with _file_lock(self._kinome_zip + '.unzip'):
+                with zipfile.ZipFile(self._kinome_zip, "r") as zip_ref:
+                    streamed_members = self._get_streamed_members() if self._stream else []
+                    zip_mtime = os.path.getmtime(self._kinome_zip)
+
+                    for member in zip_ref.infolist():
+                        if member.filename in streamed_members or member.is_dir():
+                            continue
+
+                        target = self._get_artifact_file_name(
+                            os.path.abspath(os.path.join(self._datadir, member.filename)), EXTRACTED_ARTIFACT)
+                        if not target.startswith(self._datadir + os.sep):
+                            raise Exception('Member ' + member.filename + ' is outside ' + self._datadir)
+
+                        if os.path.isfile(target) and os.path.getmtime(target) >= zip_mtime:
+                            continue
+
+                        os.makedirs(os.path.dirname(target), exist_ok=True)
+                        with zip_ref.open(member) as source, \
+                                _atomic_write(target, 'wb', self._compression.get(EXTRACTED_ARTIFACT)) as f:
+                            while True:
+                                block = source.read(1024 * 1024)
+                                if not block:
+                                    break
+                                f.write(block)
         except Exception as e:
             print('\n\n\tException: {}\n'.format(e))
             return ERROR
 
-        return SUCCESS
+        return SUCCESS
+
+
+    def _find_extracted_files(self):
+        """
+        Finds files of Kinome zip file in <datadir> when they are not extracted
+        again (--skipdownload). They may have been extracted with another
+        --compression, so a file missing under the name --compression gives it
+        is looked for uncompressed and with extension of every codec, and the
+        one found is read instead; files --stream reads from zip file are not needed
+        :return: SUCCESS or ERROR if a file is not in <datadir>
+        """
+        extracted_files = [('_genes', self._get_genes_file_name()),
+                           ('_relations', self._get_relations_file_name())]
+        if not self._use_stream():
+            extracted_files += [('_interactions', self._get_interactions_file_name()),
+                                ('_ptm', self._get_ptm_file_name())]
+
+        for attribute, file_path in extracted_files:
+            if os.path.isfile(getattr(self, attribute)):
+                continue
+
+            candidates = [file_path] + [file_path + extension for extension, level in COMPRESSION_CODECS.values()]
+            found = [candidate for candidate in candidates if os.path.isfile(candidate)]
+            if not found:
+                logger.error(getattr(self, attribute) + ' not found; run without --skipdownload '
+                             'to extract it from Kinome zip file')
+                return ERROR
+
+            logger.info(getattr(self, attribute) + ' not found, reading ' + found[0] + ' instead')
+            setattr(self, attribute, found[0])
+
+        return SUCCESS
+
+
+    def _get_gene_lookup_cache_file_name(self, genes_file_hash):
+        return os.path.join(self._datadir, self._get_gene_lookup_cache_prefix() + genes_file_hash +
+                            GENE_LOOKUP_CACHE_EXTENSION)
+
+
+    def _get_gene_lookup_cache_prefix(self):
+        """
+        Gets prefix of names of files gene lookups of GENES file are saved to,
+        so lookups of other GENES files (other versions) in <datadir> are kept
+        :return: prefix, i.e., gene_lookup-BIOGRID-PROJECT-kinome_project_sc-GENES-3.5.177.projectindex.txt-
+        """
+        return GENE_LOOKUP_CACHE_PREFIX + os.path.basename(self._genes) + '-'
+
+
+    def _build_gene_lookup(self):
+        """
+        Builds self._gene_lookup from GENES file. The lookup is kept in memory
+        (if loader has a cache) and on disk in <datadir>, keyed by hash of GENES
+        file, so it is only rebuilt when GENES file changes
+        :return: SUCCESS or ERROR
+        """
+        try:
+            genes_file_hash = _get_file_hash(self._genes)
+        except Exception as e:
+            logger.error('Unable to hash ' + self._genes + ': ' + str(e))
+            return ERROR
+
+        def create():
+            return self._load_gene_lookup(genes_file_hash)
+
+        try:
+            if self._cache is None:
+                self._gene_lookup = create()
+            else:
+                self._gene_lookup = self._cache.get_gene_lookup(genes_file_hash, create)
+        except Exception as e:
+            logger.error('Unable to build gene lookup from ' + self._genes + ': ' + str(e))
+            return ERROR
+
+        return SUCCESS
+
+
+    def _load_gene_lookup(self, genes_file_hash):
+        """
+        Loads gene lookup saved for GENES file with genes_file_hash or, if there
+        is none, reads it from GENES file and saves it, removing lookups saved
+        for earlier contents of GENES file
+        :param genes_file_hash: hash of GENES file
+        :return: gene lookup, :py:class:`GeneLookupIndex` or dictionary
+        """
+        cache_file = self._get_gene_lookup_cache_file_name(genes_file_hash)
+
+        # lock on GENES file, since all cache files are derived from it
+        with _file_lock(self._genes):
+            return self._load_gene_lookup_locked(cache_file)
+
+
+    def _load_gene_lookup_locked(self, cache_file):
+        try:
+            return GeneLookupIndex(cache_file)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning('Unable to load ' + cache_file + ', rebuilding it: ' + str(e))
+
+        gene_lookup = self._read_gene_lookup()
+
+        try:
+            # lookups saved for earlier contents of GENES file, including pickles of older loaders
+            old_cache_files = os.path.join(self._datadir, glob.escape(self._get_gene_lookup_cache_prefix()) + '*')
+            for old_cache_file in glob.glob(old_cache_files):
+                os.remove(old_cache_file)
+
+            with _atomic_write(cache_file, 'wb') as f:
+                GeneLookupIndex.write(f, gene_lookup)
+        except OSError as e:
+            logger.warning('Unable to save ' + cache_file + ': ' + str(e))
 
+        return gene_lookup
 
-    def _build_gene_lookup(self):
 
-        try:
-            _gene_lookup = pd.read_csv(self._genes, sep='\t')
-        except:
-            return ERROR
+    def _read_gene_lookup(self):
+        """
+        Reads gene lookup from GENES file
+        :return: dictionary of Entrez gene id -> gene data
+        """
+        import pandas as pd
 
-        for index, row in _gene_lookup.iterrows():
-            self._gene_lookup[str(row['ENTREZ GENE ID'])] = \
-                {
-                    'INTERACTION COUNT': row['INTERACTION COUNT'],
-                    'PTM COUNT': row['PTM COUNT'],
-                    'CHEMICAL INTERACTION COUNT': row['CHEMICAL INTERACTION COUNT'],
-                    'SOURCE': row['SOURCE'],
-                    'CATEGORY VALUES': row['CATEGORY VALUES'],
-                    'SUBCATEGORY VALUES': row['SUBCATEGORY VALUES']
-                }
+        genes = pd.read_csv(self._genes, sep='\t')
 
-        return SUCCESS
+        gene_lookup = {}
+        columns = ['INTERACTION COUNT', 'PTM COUNT', 'CHEMICAL INTERACTION COUNT',
+                   'SOURCE', 'CATEGORY VALUES', 'SUBCATEGORY VALUES']
+
+        for entrez_gene_id, *values in zip(genes['ENTREZ GENE ID'], *(genes[c] for c in columns)):
+            gene_lookup[str(entrez_gene_id)] = dict(zip(columns, values))
 
+        return gene_lookup
 
-    def _build_gene_tsv(self, entrez_gene_A_data, entrez_gene_B_data):
+
+    def _build_gene_fields(self, entrez_gene_A_data, entrez_gene_B_data):
         ret_array = []
 
         ret_array.append(entrez_gene_A_data['INTERACTION COUNT'])
@@ -356,11 +2018,10 @@ class NDExNdexkinomeloaderLoader(object):
         ret_array.append(entrez_gene_A_data['SUBCATEGORY VALUES'])
         ret_array.append(entrez_gene_B_data['SUBCATEGORY VALUES'])
 
-        ret_str = '\t'.join(str(element)  if element != '-' else '' for element in ret_array)
-        return ret_str
+        return [str(element) if element != '-' else '' for element in ret_array]
 
 
-    def _create_ppi_file(self):
+    def _get_ppi_header(self):
         interactions_header = \
             ['#BioGRID Interaction ID', 'Entrez Gene Interactor A', 'Entrez Gene Interactor B',
              'BioGRID ID Interactor A','BioGRID ID Interactor B', 'Systematic Name Interactor A',
@@ -376,98 +2037,256 @@ class NDExNdexkinomeloaderLoader(object):
                         'Source A', 'Source B', 'Category Values A', 'Category Values B',
                         'SubCategory Values A', 'SubCategory Values B']
 
-        interactions_header_1 = interactions_header + new_headers
+        return interactions_header + new_headers
+
+
+    def _transform_ppi_row(self, row):
+        """
+        Transforms row of INTERACTIONS file into row of PPI network file:
+        adds Entrez gene id and systematic name to synonyms of interactors,
+        replaces '-' with empty value and appends data of both interactors
+        from GENES file
+        :param row: list of values
+        :return: list of values
+        """
+        default_gene_data = DEFAULT_GENE_DATA
+
+        entrez_gene_A_data = self._gene_lookup.get(row[1], default_gene_data)
+        entrez_gene_B_data = self._gene_lookup.get(row[2], default_gene_data)
+
+        row[9] = row[9] + '|ncbigene:' + row[1] + '|' + row[5]
+        row[10] = row[10] + '|ncbigene:' + row[2] + '|' + row[6]
 
-        #ppi_network = os.path.join(self._datadir, 'ppi_network_1.txt')
+        return [element if element != '-' else '' for element in row] + \
+            self._build_gene_fields(entrez_gene_A_data, entrez_gene_B_data)
 
-        default_gene_data = {'INTERACTION COUNT':'',
-                             'PTM COUNT':'',
-                             'CHEMICAL INTERACTION COUNT': '',
-                             'SOURCE': '',
-                             'CATEGORY VALUES': '',
-                             'SUBCATEGORY VALUES': ''}
+
+    def _create_ppi_file(self):
         try:
-            with open(self._interactions, 'r') as tsv:
+            with _open_file(self._interactions, 'r') as tsv:
                 reader = csv.reader(tsv, delimiter='\t')
 
 
-                with open(self._ppi_network_1, 'w') as o_f:
+                with self._open_network_table(self._ppi_network_1, self._pti_load_plan) as write_row:
 
-                    output_header = '\t'.join(h for h in interactions_header_1) + '\n'
-                    o_f.write(output_header)
+                    write_row(self._get_ppi_header())
 
                     for row in reader:
                         # skip header since we already wrote it to output
                         break
 
                     for row in reader:
-                        entrez_gene_interactor_a = row[1]
-                        entrez_gene_interactor_b = row[2]
+                        write_row(self._transform_ppi_row(row))
 
-                        entrez_gene_A_data = self._gene_lookup.get(entrez_gene_interactor_a, default_gene_data)
-                        entrez_gene_B_data = self._gene_lookup.get(entrez_gene_interactor_b, default_gene_data)
-
-                        synonyms_interactor_a = '|ncbigene:' + row[1] + '|' + row[5]
-                        synonyms_interactor_b = '|ncbigene:' + row[2] + '|' + row[6]
+        except:
+            return ERROR
 
-                        row[9] = row[9] + synonyms_interactor_a
-                        row[10] = row[10] + synonyms_interactor_b
+        return SUCCESS
 
-                        gene_tsv = self._build_gene_tsv(entrez_gene_A_data, entrez_gene_B_data)
 
-                        output_tsv = '\t'.join(element if element != '-' else '' for element in row) + '\t' + gene_tsv + '\n'
-                        o_f.write(output_tsv)
+    def _get_ptm_header(self, header_row):
+        return header_row + ['Target Name', 'Target Represents']
 
-        except:
-            return ERROR
 
-        return SUCCESS
+    def _transform_ptm_row(self, row):
+        """
+        Transforms row of PTM file into row of PTM network file: adds
+        Entrez gene id, systematic name and Refseq id to synonyms, replaces
+        '-' with empty value and appends name and represents of PTM site node
+        :param row: list of values
+        :return: list of values
+        """
+        position_column_value = str(row[8]).rstrip()
+        if position_column_value == '-':
+            position_column_value = '?'
+            row[8] = 'undefined'
 
+        target_name = str(row[10]) + position_column_value
+        target_represents = row[4] + '-' + str(row[10]) + '-' + str(row[8])
 
-    def _create_ptm_file(self):
-        ptm_header = \
-            ['#PTM ID', 'Entrez Gene ID', 'BioGRID ID', 'Systematic Name', 'Official Symbol',
-             'Synonymns', 'Sequence', 'Refseq ID', 'Position', 'Post Translational Modification',
-             'Residue', 'Author', 'Pubmed ID', 'Organism ID', 'Organism Name', 'Has Relationships',
-             'Notes', 'Source Database']
+        synonyms = '|ncbigene:' + row[1] + '|' + row[3] + '|' + row[7]
+        row[5] = row[5] + synonyms
 
-        new_header = ['Target Name', 'Target Represents']
+        return [e if e != '-' else '' for e in row] + [target_name, target_represents]
 
-        ptm_header_1 = ptm_header + new_header
 
+    def _create_ptm_file(self):
         try:
-            with open(self._ptm, 'r') as tsv:
+            with _open_file(self._ptm, 'r') as tsv:
                 reader = csv.reader(tsv, delimiter='\t')
 
-                with open(self._ptm_network_2, 'w') as o_f:
+                with self._open_network_table(self._ptm_network_2, self._ptm_load_plan) as write_row:
 
                     for row in reader:
-                        output_tsv = '\t'.join(e for e in row) + '\t' + '\t'.join(e for e in new_header) + '\n'
-                        o_f.write(output_tsv)
+                        write_row(self._get_ptm_header(row))
                         # skip header since we already wrote it to output
                         break
 
                     for row in reader:
-                        position_column_value = str(row[8]).rstrip()
-                        if position_column_value == '-':
-                            position_column_value = '?'
-                            row[8] = 'undefined'
+                        write_row(self._transform_ptm_row(row))
+
+        except:
+            return ERROR
 
-                        target_name = str(row[10]) + position_column_value
-                        target_represents = row[4] + '-' + str(row[10]) + '-' + str(row[8])
+        return SUCCESS
 
-                        synonyms = '|ncbigene:' + row[1] + '|' + row[3] + '|' + row[7]
-                        row[5] = row[5] + synonyms
 
-                        output_tsv = '\t'.join(e if e != '-' else '' for e in row) + '\t' + \
-                                     target_name + '\t' + target_represents + '\n'
+    @contextmanager
+    def _open_network_table(self, network_table, plan_path):
+        """
+        Context manager for writing network table: yields function that writes
+        a row (list of strings), header first. Rows of TSV file are written as
+        they come, rows of Parquet file a row group at a time, see
+        :py:class:`ParquetTableWriter`
+        :param network_table: path to network table
+        :param plan_path: path to load plan that reads the table
+        :return: function
+        """
+        if not _is_parquet_file(network_table):
+            with _atomic_write(network_table, compression=self._compression.get(NETWORK_ARTIFACT)) as o_f:
+                yield lambda row: o_f.write('\t'.join(row) + '\n')
+            return
 
-                        o_f.write(output_tsv)
+        with _atomic_write(network_table, 'wb') as f:
+            writer = ParquetTableWriter(f, _get_table_column_types(self._get_load_plan(plan_path)))
+            yield writer.write_row
+            writer.close()
 
-        except:
-            return ERROR
 
-        return SUCCESS
+    def _read_network_table(self, network_table, plan, chunksize=None):
+        """
+        Reads network table as dataframe of strings; only columns plan reads
+        are read from Parquet file
+        :param network_table: path to network table
+        :param plan: load plan
+        :param chunksize: if set, iterator of dataframes of this many rows is returned
+        :return: :py:class:`pandas.DataFrame` or iterator of them
+        """
+        import pandas as pd
+
+        if not _is_parquet_file(network_table):
+            return pd.read_csv(network_table,
+                               dtype=str,
+                               na_filter=False,
+                               delimiter='\t',
+                               engine='python',
+                               chunksize=chunksize)
+
+        return _read_parquet_table(network_table, _get_plan_columns(plan), chunksize=chunksize)
+
+
+    def _stream_network(self, member_name, get_header, transform_row, plan_path, network_tsv):
+        """
+        Builds network from member of Kinome zip file in a pipeline of three
+        stages connected by bounded queues: a thread decompressing and parsing
+        member, a thread transforming its rows (same as _create_ppi_file or
+        _create_ptm_file) and the calling thread writing transformed rows to
+        network_tsv and adding them to network. Stages overlap and memory used
+        by rows in flight is limited by --queuesize batches of STREAM_BATCH_SIZE rows
+        :param member_name: name of file in Kinome zip file
+        :param get_header: function that takes header row of member and returns
+                           header of network TSV file
+        :param transform_row: function that transforms row of member into row of network TSV file
+        :param plan_path: path to load plan
+        :param network_tsv: path to network TSV file to write
+        :return: network
+        """
+        plan = self._get_load_plan(plan_path)
+        nice_cx_builder = self._create_cx_builder(plan)
+        node_lookup = {}
+
+        parsed_rows = queue.Queue(maxsize=self._queuesize)
+        transformed_rows = queue.Queue(maxsize=self._queuesize)
+        headers = []
+        stop = threading.Event()
+
+        # put and get give up if consumer failed, so threads of
+        # pipeline do not block forever on a queue nobody serves
+        def put(q, item):
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=STREAM_QUEUE_TIMEOUT)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def get(q):
+            while not stop.is_set():
+                try:
+                    return q.get(timeout=STREAM_QUEUE_TIMEOUT)
+                except queue.Empty:
+                    pass
+            return None
+
+        def decompress():
+            try:
+                with zipfile.ZipFile(self._kinome_zip, 'r') as zip_ref:
+                    with zip_ref.open(member_name) as member:
+                        reader = csv.reader(io.TextIOWrapper(member, encoding='utf-8'), delimiter='\t')
+                        headers.append(get_header(next(reader)))
+                        batch = []
+                        for row in reader:
+                            batch.append(row)
+                            if len(batch) == STREAM_BATCH_SIZE:
+                                if not put(parsed_rows, batch):
+                                    return
+                                batch = []
+                        if batch:
+                            put(parsed_rows, batch)
+                put(parsed_rows, None)
+            except Exception as e:
+                put(parsed_rows, e)
+
+        def transform():
+            while True:
+                batch = get(parsed_rows)
+                if batch is None or isinstance(batch, Exception):
+                    put(transformed_rows, batch)
+                    return
+                try:
+                    batch = [transform_row(row) for row in batch]
+                except Exception as e:
+                    put(transformed_rows, e)
+                    return
+                if not put(transformed_rows, batch):
+                    return
+
+        threads = [threading.Thread(target=decompress, daemon=True),
+                   threading.Thread(target=transform, daemon=True)]
+        for thread in threads:
+            thread.start()
+
+        try:
+            with self._open_network_table(network_tsv, plan_path) as write_row:
+                header = None
+                while True:
+                    batch = transformed_rows.get()
+                    if isinstance(batch, Exception):
+                        raise batch
+
+                    # header is parsed before the first batch is passed on, or the
+                    # end of member is if it has no rows, which still gets the header
+                    if header is None:
+                        header = headers[0]
+                        write_row(header)
+
+                    if batch is None:
+                        break
+
+                    for row in batch:
+                        write_row(row)
+                    self._add_rows_to_cx_builder(nice_cx_builder, plan,
+                                                 (dict(zip(header, row)) for row in batch), node_lookup)
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join(STREAM_JOIN_TIMEOUT)
+                if thread.is_alive():
+                    logger.warning('Thread of stream pipeline did not stop in ' +
+                                   str(STREAM_JOIN_TIMEOUT) + ' seconds')
+
+        return self._finish_cx_builder(nice_cx_builder, plan)
 
 
     def _init_network_attributes(self, network, type='pti'):
@@ -478,6 +2297,10 @@ class NDExNdexkinomeloaderLoader(object):
         elif type == 'merged':
             network.set_name('FULLY MERGED - Step 3')
 
+        if self._organism is not None:
+            network.set_name(network.get_name() + ' (Organism ' + self._organism + ')')
+            network.set_network_attribute('Organism Taxon Id', self._organism)
+
         network.set_network_attribute('prov:wasDerivedFrom', self._get_kinome_download_url())
         network.set_network_attribute('prov:wasGeneratedBy',
                 '<a href="https://github.com/vrynkov/ndexkinomeloader" target="_blank">ndexkinomeloader ' \
@@ -485,36 +2308,491 @@ class NDExNdexkinomeloaderLoader(object):
 
         network.set_network_attribute('__iconurl', 'https://home.ndexbio.org/img/biogrid_logo.jpg')
 
-        network.apply_style_from_network(self._template)
+        self._apply_style(network)
 
 
 
-    def _generate_CX_file(self, load_plan, network_tsv):
+    def _intern_attributes(self, network_in_cx):
+        """
+        Interns names and values of node and edge attributes of network in
+        self._interner, so the collapse, rename and merge steps operate on
+        shared string objects. Used for networks merged from shards of
+        --workers; other networks are interned as they are built, see
+        :py:meth:`_add_rows_to_cx_builder`. Only strings are shared: every
+        attribute is still a dictionary of NiceCXNetwork, which collapse,
+        rename, merge and the CX writers read, not a columnar store
+        :param network_in_cx:
+        :return:
+        """
+        intern = self._interner.intern
+
+        for attribute_list in network_in_cx.nodeAttributes.values():
+            _intern_attribute_list(attribute_list, intern)
+
+        for attribute_list in network_in_cx.edgeAttributes.values():
+            _intern_attribute_list(attribute_list, intern)
+
+        for edge in network_in_cx.edges.values():
+            edge['i'] = intern(edge['i'])
+
+
+    def _get_memory_report(self, network_in_cx):
+        """
+        Counts node and edge attribute values of network and their size in bytes
+        as stored, where equal interned strings are one object, and as they would
+        be stored if every string value was a separate object
+        :param network_in_cx:
+        :return: dictionary with the counts
+        """
+        attribute_count = 0
+        list_count = 0
+        list_bytes = 0
+        string_count = 0
+        string_bytes = 0
+        distinct_strings = {}
+
+        for aspect in (network_in_cx.nodeAttributes, network_in_cx.edgeAttributes):
+            for attribute_list in aspect.values():
+                for attribute in attribute_list:
+                    attribute_count += 1
+                    values = attribute['v']
+                    if isinstance(values, list):
+                        list_count += 1
+                        list_bytes += sys.getsizeof(values)
+                    else:
+                        values = [values]
+
+                    for value in values:
+                        if isinstance(value, str):
+                            size = sys.getsizeof(value)
+                            string_count += 1
+                            string_bytes += size
+                            distinct_strings[id(value)] = size
+
+        return {'nodes': len(network_in_cx.nodes),
+                'edges': len(network_in_cx.edges),
+                'attributes': attribute_count,
+                'list values': list_count,
+                'list bytes': list_bytes,
+                'string values': string_count,
+                'string objects': len(distinct_strings),
+                'string bytes': sum(distinct_strings.values()),
+                'string bytes without interning': string_bytes,
+                'interned strings': len(self._interner)}
+
+
+    def _write_memory_report(self, network_in_cx, report_file):
+        """
+        Writes report of :py:meth:`_get_memory_report` to report_file in JSON format
+        :param network_in_cx:
+        :param report_file: path to report file
+        :return:
+        """
+        report = self._get_memory_report(network_in_cx)
+
+        logger.info('{} string values of {} attributes take {} bytes '
+                    '({} bytes without interning)'.format(report['string values'], report['attributes'],
+                                                          report['string bytes'],
+                                                          report['string bytes without interning']))
+        with open(report_file, 'w') as f:
+            json.dump(report, f, indent=4)
+
+
+    def _create_cx_builder(self, plan):
+        """
+        Validates load plan and creates NiceCXBuilder that rows are added to
+        with t2n.process_row()
+        :param plan: load plan
+        :return: NiceCXBuilder
+        """
+        import jsonschema
+        import ndexutil.tsv.tsv2nicecx2 as t2n
+        from ndex2cx.nice_cx_builder import NiceCXBuilder
+
+        with open(os.path.join(os.path.dirname(t2n.__file__), 'loading_plan_schema.json')) as schema_file:
+            plan_schema = json.load(schema_file)
+
+        jsonschema.validate(plan, plan_schema)
+
+        return NiceCXBuilder()
+
+
+    def _finish_cx_builder(self, nice_cx_builder, plan):
+        """
+        Adds network attributes set by t2n.convert_pandas_to_nice_cx_with_load_plan()
+        and gets network from builder
+        :param nice_cx_builder:
+        :param plan: load plan
+        :return: network
+        """
+        context = plan.get('context')
+        if context:
+            nice_cx_builder.add_network_attribute(name='@context', values=json.dumps(context))
+
+        return nice_cx_builder.get_nice_cx()
+
+
+    def _add_rows_to_cx_builder(self, nice_cx_builder, plan, rows, node_lookup):
+        """
+        Adds rows to NiceCXBuilder with t2n.process_row() and interns the strings
+        of attributes and interactions of edges they added in self._interner, as
+        :py:meth:`_intern_attributes` does for a built network. Rows are added in batches of
+        INTERN_BATCH_SIZE, so copies of repeated strings split from cells of a batch
+        are freed before the next batch is added, instead of being held until
+        the whole network is built
+        :param nice_cx_builder: NiceCXBuilder
+        :param plan: load plan
+        :param rows: iterable of rows, :py:class:`pandas.Series` or dictionaries
+                     of column -> value
+        :param node_lookup: dictionary t2n.process_row() deduplicates nodes with
+        :return:
+        """
+        import ndexutil.tsv.tsv2nicecx2 as t2n
+
+        intern = self._interner.intern
+        edges = nice_cx_builder.edge_inventory
+        node_attributes = nice_cx_builder.node_attribute_inventory
+        edge_attributes = nice_cx_builder.edge_attribute_inventory
+
+        rows = iter(rows)
+        while True:
+            edge_id_counter = nice_cx_builder.edge_id_counter
+            node_attribute_count = len(node_attributes)
+            edge_attribute_count = len(edge_attributes)
+
+            row_count = 0
+            for row in rows:
+                t2n.process_row(nice_cx_builder, plan, row, node_lookup)
+                row_count += 1
+                if row_count == INTERN_BATCH_SIZE:
+                    break
+
+            _intern_attribute_list(node_attributes[node_attribute_count:], intern)
+            _intern_attribute_list(edge_attributes[edge_attribute_count:], intern)
+            for edge_id in range(edge_id_counter, nice_cx_builder.edge_id_counter):
+                edges[edge_id]['i'] = intern(edges[edge_id]['i'])
+
+            if row_count < INTERN_BATCH_SIZE:
+                return
+
+
+    def _convert_dataframe_to_cx(self, plan, dataframe):
+        """
+        Converts rows of dataframe to CX, with the same result as
+        t2n.convert_pandas_to_nice_cx_with_load_plan(), interning strings of
+        attributes as rows are added, see :py:meth:`_add_rows_to_cx_builder`
+        :param plan: load plan
+        :param dataframe: :py:class:`pandas.DataFrame` of network table
+        :return: network
+        """
+        nice_cx_builder = self._create_cx_builder(plan)
+
+        self._add_rows_to_cx_builder(nice_cx_builder, plan,
+                                     self._get_dataframe_rows(dataframe), {})
+
+        return self._finish_cx_builder(nice_cx_builder, plan)
+
+
+    def _get_dataframe_rows(self, dataframe):
+        """
+        Gets rows of dataframe as dictionaries of column -> value, which
+        t2n.process_row() reads as it reads rows from
+        :py:meth:`pandas.DataFrame.iterrows`, without a
+        :py:class:`pandas.Series` per row or the array of every cell of
+        dataframe iterrows() builds first
+        :param dataframe: :py:class:`pandas.DataFrame` of network table
+        :return: generator of dictionaries
+        """
+        columns = list(dataframe.columns)
+        for values in dataframe.itertuples(index=False, name=None):
+            yield dict(zip(columns, values))
+
+
+    def _convert_TSV_to_CX_in_chunks(self, plan, network_tsv):
+        """
+        Converts network TSV file to CX reading it in batches of self._chunksize rows.
+        All batches are added to the same NiceCXBuilder, which deduplicates nodes
+        through its node name -> node index, so the result is the same as the one
+        returned by t2n.convert_pandas_to_nice_cx_with_load_plan() for the whole file.
+        Only the rows of one batch are parsed at a time; the builder holds the whole
+        network, which later steps (collapse, merge) need, so peak memory is not flat
+        :param plan: load plan
+        :param network_tsv: path to network TSV file
+        :return: network
+        """
+        nice_cx_builder = self._create_cx_builder(plan)
+        node_lookup = {}
+
+        reader = self._read_network_table(network_tsv, plan, chunksize=self._chunksize)
+
+        row_count = 0
+        for chunk in reader:
+            self._add_rows_to_cx_builder(nice_cx_builder, plan,
+                                         self._get_dataframe_rows(chunk), node_lookup)
+            row_count += len(chunk)
+            logger.info('processed %d rows of %s' % (row_count, network_tsv))
+
+        return self._finish_cx_builder(nice_cx_builder, plan)
+
+
+    def _get_TSV_shards(self, network_tsv, plan):
+        """
+        Splits rows of network TSV into consecutive shards: batches of self._chunksize
+        rows if set, otherwise self._workers shards of about equal size
+        :param network_tsv: path to network TSV file
+        :param plan: load plan
+        :return: list of dataframes
+        """
+        if self._chunksize:
+            return list(self._read_network_table(network_tsv, plan, chunksize=self._chunksize))
+
+        dataframe = self._read_network_table(network_tsv, plan)
+        shard_size = max(1, -(-len(dataframe) // self._workers))
+
+        return [dataframe.iloc[i:i + shard_size] for i in range(0, len(dataframe), shard_size)]
+
+
+    def _merge_CX_shards(self, shards, plan):
+        """
+        Merges networks built from consecutive shards of rows into one network.
+        Nodes are reconciled by name, the same key NiceCXBuilder uses to deduplicate
+        nodes in the serial path, and ids are assigned in order of first appearance;
+        for a node present in several shards, the first value of each attribute wins.
+        The result is thus the same as converting all rows at once
+        :param shards: list of (nodes, edges, node attributes, edge attributes) tuples,
+                       in order of rows
+        :param plan: load plan
+        :return: network
+        """
+        from ndex2.nice_cx_network import NiceCXNetwork
+
+        network = NiceCXNetwork()
+
+        node_name_to_id = {}
+        node_attribute_names = {}
+        edge_id_offset = 0
+
+        for nodes, edges, node_attributes, edge_attributes in shards:
+            shard_to_network_id = {}
+
+            for shard_node_id in sorted(nodes.keys()):
+                node = nodes[shard_node_id]
+                node_id = node_name_to_id.get(node['n'])
+                if node_id is None:
+                    node_id = len(node_name_to_id)
+                    node_name_to_id[node['n']] = node_id
+                    node['@id'] = node_id
+                    network.nodes[node_id] = node
+                    network.nodeAttributes[node_id] = []
+                    node_attribute_names[node_id] = set()
+                shard_to_network_id[shard_node_id] = node_id
+
+            for shard_node_id, attributes in node_attributes.items():
+                node_id = shard_to_network_id[shard_node_id]
+                for attribute in attributes:
+                    if attribute['n'] not in node_attribute_names[node_id]:
+                        node_attribute_names[node_id].add(attribute['n'])
+                        attribute['po'] = node_id
+                        network.nodeAttributes[node_id].append(attribute)
+
+            for shard_edge_id in sorted(edges.keys()):
+                edge = edges[shard_edge_id]
+                edge_id = shard_edge_id + edge_id_offset
+                edge['@id'] = edge_id
+                edge['s'] = shard_to_network_id[edge['s']]
+                edge['t'] = shard_to_network_id[edge['t']]
+                network.edges[edge_id] = edge
+
+                for attribute in edge_attributes.get(shard_edge_id, []):
+                    attribute['po'] = edge_id
+                network.edgeAttributes[edge_id] = edge_attributes.get(shard_edge_id, [])
+
+            if edges:
+                edge_id_offset += max(edges.keys()) + 1
+
+        network.nodeAttributes = {k: v for k, v in network.nodeAttributes.items() if v}
+        network.edgeAttributes = {k: v for k, v in network.edgeAttributes.items() if v}
+
+        context = plan.get('context')
+        if context:
+            network.add_network_attribute(name='@context', values=json.dumps(context))
+
+        network.node_int_id_generator = len(network.nodes)
+        network.edge_int_id_generator = edge_id_offset
+
+        return network
+
+
+    def _convert_TSV_to_CX_in_parallel(self, plan, network_tsv):
+        """
+        Converts network TSV file to CX by converting its shards in self._workers
+        processes and merging the results
+        :param plan: load plan
+        :param network_tsv: path to network TSV file
+        :return: network
+        """
+        shards = self._get_TSV_shards(network_tsv, plan)
+
+        with _create_process_pool(self._workers) as executor:
+            converted_shards = list(executor.map(_convert_shard_to_cx, shards, [plan] * len(shards)))
+
+        return self._merge_CX_shards(converted_shards, plan)
+
+
+    def _get_load_plan(self, load_plan):
+        """
+        Reads load plan; if loader has a cache, the plan is parsed once per process
+        and a copy is returned, since conversion modifies the plan
+        :param load_plan: path to load plan file
+        :return: load plan
+        """
+        def create():
+            with open(load_plan, 'r') as lp:
+                return json.load(lp)
+
+        if self._cache is None:
+            return create()
 
-        with open(load_plan, 'r') as lp:
-            plan = json.load(lp)
+        return copy.deepcopy(self._cache.get_load_plan(os.path.abspath(load_plan), create))
 
-        dataframe = pd.read_csv(network_tsv,
-                                dtype=str,
-                                na_filter=False,
-                                delimiter='\t',
-                                engine='python')
 
-        network = t2n.convert_pandas_to_nice_cx_with_load_plan(dataframe, plan)
+    def _generate_CX_file(self, load_plan, network_tsv):
+        plan = self._get_load_plan(load_plan)
+
+        # strings are interned as rows are added to network, except for network
+        # merged from shards, whose strings are only shared within their shard
+        if self._workers > 1:
+            network = self._convert_TSV_to_CX_in_parallel(plan, network_tsv)
+            self._intern_attributes(network)
+        elif self._chunksize:
+            network = self._convert_TSV_to_CX_in_chunks(plan, network_tsv)
+        else:
+            dataframe = self._read_network_table(network_tsv, plan)
+
+            network = self._convert_dataframe_to_cx(plan, dataframe)
 
         return network, SUCCESS
 
 
     def _write_nice_cx_to_file(self, network_in_cx, cx_file_path):
 
-        with open(cx_file_path, 'w') as f:
-            json.dump(network_in_cx.to_cx(), f, indent=4)
+        temp_file = _get_temp_file_name(cx_file_path)
+        try:
+            self._cx_sizes[cx_file_path] = self._json_backend.write_nice_cx(network_in_cx, temp_file,
+                                                                            self._compression.get(CX_ARTIFACT))
+            os.replace(temp_file, cx_file_path)
+        finally:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
+
+
+    def _set_content_hash(self, network):
+        """
+        Computes canonical hash of network content (nodes, edges, their attributes,
+        network attributes and opaque aspects, in order of ids) and stores it in
+        CONTENT_HASH network attribute
+        :param network:
+        :return: content hash
+        """
+        sha256 = hashlib.sha256()
+
+        def add(element):
+            sha256.update(json.dumps(element, sort_keys=True, separators=(',', ':')).encode('utf-8'))
+            sha256.update(b'\n')
+
+        for attribute in network.networkAttributes:
+            if attribute['n'] != CONTENT_HASH:
+                add(attribute)
+
+        for node_id in sorted(network.nodes.keys()):
+            add(network.nodes[node_id])
+            add(network.nodeAttributes.get(node_id, []))
+
+        for edge_id in sorted(network.edges.keys()):
+            add(network.edges[edge_id])
+            add(network.edgeAttributes.get(edge_id, []))
+
+        for aspect_name in sorted(network.opaqueAspects.keys()):
+            add(aspect_name)
+            add(network.opaqueAspects[aspect_name])
+
+        content_hash = sha256.hexdigest()
+        network.set_network_attribute(CONTENT_HASH, content_hash)
+
+        return content_hash
+
+
+    def _network_unchanged_on_server(self, network_UUID, content_hash, summaries):
+        """
+        Checks if network with network_UUID on server has CONTENT_HASH
+        property equal to content_hash
+        :param network_UUID: UUID of network on server or None
+        :param content_hash: hash of network to upload
+        :param summaries: network summaries from server
+        :return: True if network on server has the same content
+        """
+        if network_UUID is None:
+            return False
+
+        for summary in summaries:
+            if summary.get('externalId') != network_UUID:
+                continue
+
+            for prop in summary.get('properties') or []:
+                if prop.get('predicateString') == CONTENT_HASH:
+                    return prop.get('value') == content_hash
+
+        return False
+
+
+    def _upload_network(self, network, path_to_network_in_CX, summaries):
+        """
+        Uploads network written to path_to_network_in_CX to NDEx, updating network
+        with the same name if there is one, unless content hash of that network
+        on server is the same as content hash of network
+        :param network: network that was written to path_to_network_in_CX
+        :param path_to_network_in_CX:
+        :param summaries: network summaries from server
+        :return: SUCCESS or ERROR
+        """
+        content_hash = network.get_network_attribute(CONTENT_HASH)
+
+        return self._upload_network_file(network.get_name(),
+                                         content_hash['v'] if content_hash is not None else None,
+                                         path_to_network_in_CX, summaries)
+
+
+    def _upload_network_file(self, network_name, content_hash, path_to_network_in_CX, summaries):
+        """
+        Uploads network written to path_to_network_in_CX to NDEx, updating network
+        named network_name if there is one, unless content hash of that network
+        on server is content_hash
+        :param network_name: name of network
+        :param content_hash: content hash of network or None
+        :param path_to_network_in_CX:
+        :param summaries: network summaries from server
+        :return: SUCCESS or ERROR
+        """
+        network_UUID, exists = self._get_network_uuid(network_name, summaries)
 
+        if content_hash is not None and \
+                self._network_unchanged_on_server(network_UUID, content_hash, summaries):
+            print('Network ' + network_name + ' (' + network_UUID + ') is unchanged; skipping upload')
+            return SUCCESS
+
+        return self._upload_CX(path_to_network_in_CX, network_UUID)
 
 
     def _upload_CX(self, path_to_network_in_CX, network_UUID):
 
-        with open(path_to_network_in_CX, 'br') as network_out:
+        if _get_file_compression(path_to_network_in_CX) is None:
+            network_out = open(path_to_network_in_CX, 'br')
+        else:
+            network_out = DecompressingReader(path_to_network_in_CX,
+                                              size=self._cx_sizes.get(path_to_network_in_CX))
+
+        with network_out:
             try:
                 if network_UUID is None:
                     self._ndex.save_cx_stream_as_new_network(network_out)
@@ -529,94 +2807,164 @@ class NDExNdexkinomeloaderLoader(object):
 
 
     def _merge_attributes(self, attribute_list_1, attribute_list_2):
+        """
+        Merges values of attributes in attribute_list_2 into attributes with the same
+        name in attribute_list_1, which become lists of distinct values in order
+        they were first seen
+        :param attribute_list_1: list of attributes of edge other edges are collapsed into
+        :param attribute_list_2: list of attributes of collapsed edge
+        :return:
+        """
+        self._merge_attribute_lists(attribute_list_1, [attribute_list_2])
 
-        for attribute1 in attribute_list_1:
 
-            name1 = attribute1['n']
+    def _merge_attribute_lists(self, attribute_list, attribute_lists):
+        """
+        Merges each list in attribute_lists, in order, into attribute_list, as
+        :py:meth:`_merge_attributes` does for one list. Values merged into each
+        attribute so far are tracked in a set kept across the lists, so merging
+        attributes of n edges takes time linear in number of their values instead of
+        quadratic
+        :param attribute_list: list of attributes of edge other edges are collapsed into
+        :param attribute_lists: lists of attributes of collapsed edges
+        :return:
+        """
+        # id of attribute -> set of keys of its merged values, see _merge_attribute
+        merged_values = {}
 
-            found = False
+        for attribute_list_2 in attribute_lists:
+            attributes_2 = {}
             for attribute2 in attribute_list_2:
-                if attribute2['n'] == name1:
-                    found = True
-                    break
+                attributes_2.setdefault(attribute2['n'], attribute2)
 
-            if not found:
-                continue
+            for attribute1 in attribute_list:
+                attribute2 = attributes_2.get(attribute1['n'])
+                if attribute2 is None:
+                    continue
+
+                merged_values[id(attribute1)] = \
+                    self._merge_attribute(attribute1, attribute2, merged_values.get(id(attribute1)))
+
+
+    def _merge_attribute(self, attribute1, attribute2, seen=None):
+        """
+        Merges values of attribute2 into attribute1, which becomes a list of
+        distinct values in order they were first seen. Duplicate values of
+        boolean attribute2 are kept
+        :param attribute1: attribute of edge other edges are collapsed into
+        :param attribute2: attribute with the same name of collapsed edge
+        :param seen: set returned by previous call merging into attribute1,
+                     or None to compute it from values of attribute1
+        :return: set of keys of values of attribute1 to pass to next call merging
+                 into attribute1, or None if values of attribute1 are not distinct
+        """
+        intern = self._interner.intern
+
+        data_type = attribute1.get('d', 'string')
+        attribute1['d'] = LIST_DATA_TYPES.get(data_type, data_type)
+
+        if not 'd' in attribute2:
+            attribute2['d'] = 'list_of_string'
+        elif attribute2['d'] == 'boolean':
+            attribute2['d'] = 'list_of_boolean'
 
-            #if attribute1['v'] == attribute2['v']:
-                # attribute with the same name and value; do not add
-            #    continue
-
-            if not 'd' in attribute1:
-                attribute1['d'] = 'list_of_string'
-            elif attribute1['d'] == 'boolean':
-                attribute1['d'] = 'list_of_boolean'
-            elif attribute1['d'] == 'double':
-                attribute1['d'] = 'list_of_double'
-            elif attribute1['d'] == 'integer':
-                attribute1['d'] = 'list_of_integer'
-            elif attribute1['d'] == 'long':
-                attribute1['d'] = 'list_of_long'
-            elif attribute1['d'] == 'string':
-                attribute1['d'] = 'list_of_string'
-
-            if not 'd' in attribute2:
-                attribute2['d'] = 'list_of_string'
-            elif attribute2['d'] == 'boolean':
-                attribute2['d'] = 'list_of_boolean'
+        keep_duplicates = attribute2['d'] == 'list_of_boolean'
+        values_2 = attribute2['v'] if isinstance(attribute2['v'], list) else None
+        skip_empty_2 = values_2 is None or not keep_duplicates
+        values_2 = (values_2 if values_2 is not None else [attribute2['v']], skip_empty_2)
 
+        # strings are interned, so they are deduplicated by identity and other
+        # values by value, in constant time while keeping order of values
+        if seen is None or keep_duplicates:
             new_list_of_values = []
+            seen = set()
+            values_1 = attribute1['v'] if isinstance(attribute1['v'], list) else None
+            sources = ((values_1 if values_1 is not None else [attribute1['v']],
+                        values_1 is None), values_2)
+        else:
+            # values of attribute1 are already distinct and their keys in seen
+            new_list_of_values = attribute1['v']
+            sources = (values_2,)
+
+        for values, skip_empty in sources:
+            skip_duplicates = skip_empty or not keep_duplicates
+            for value in values:
+                if skip_empty and not value:
+                    continue
+                if isinstance(value, str):
+                    value = intern(value)
+                    key = id(value)
+                else:
+                    key = (value,)
+                if skip_duplicates and key in seen:
+                    continue
+                seen.add(key)
+                new_list_of_values.append(value)
 
-            if isinstance(attribute1['v'], list):
-                for value in attribute1['v']:
-                    if (attribute2['d'] == 'list_of_boolean') or (value not in new_list_of_values):
-                        new_list_of_values.append(value)
-            else:
-                if attribute1['v'] not in new_list_of_values and attribute1['v']:
-                    new_list_of_values.append(attribute1['v'])
+        if attribute1['d'] == 'list_of_boolean':
+            # if new_list_of_values contains a list of booleans and they all have the same value,
+            # then replace all values with one
+            set_of_booleans = set(attribute1['v'])
+            if len(set_of_booleans) == 1:
+                new_list_of_values = list(set_of_booleans)
 
-            if isinstance(attribute2['v'], list):
-                for value in attribute2['v']:
-                    if (attribute2['d'] == 'list_of_boolean') or (value not in new_list_of_values and value):
-                        new_list_of_values.append(value)
-            else:
-                if attribute2['v'] not in new_list_of_values and attribute2['v']:
-                    new_list_of_values.append(attribute2['v'])
+        attribute1['v'] = new_list_of_values
+
+        if keep_duplicates or attribute1['d'] == 'list_of_boolean':
+            return None
+        return seen
 
-            if attribute1['d'] == 'list_of_boolean':
-                # if new_list_of_values contains a list of booleans and they all have the same value,
-                # then replace all values with one
-                set_of_booleans = set(attribute1['v'])
-                if len(set_of_booleans) == 1:
-                    new_list_of_values = list(set_of_booleans)
 
-            attribute1['v'] = new_list_of_values
+    def _group_edges(self, network_in_cx):
+        """
+        Groups edges that have the same interaction and connect the same pair of nodes
+        in either direction. Source, interaction (coded through a table of distinct
+        interactions) and target of all edges are encoded in integer arrays, direction
+        is canonicalized with min/max of source and target, and groups are found with
+        one stable sort of the keys
+        :param network_in_cx:
+        :return: list of groups in order of their first edge; each group is a list of
+                 edge ids in order of edges in network_in_cx.edges
+        """
+        import numpy as np
 
+        edges = network_in_cx.edges
+        number_of_edges = len(edges)
+        if number_of_edges == 0:
+            return []
 
-    def _collapse_edges(self, network_in_cx):
+        interactions = {}
+        edge_ids = np.fromiter(edges.keys(), dtype=np.int64, count=number_of_edges)
+        sources = np.fromiter((e['s'] for e in edges.values()), dtype=np.int64, count=number_of_edges)
+        targets = np.fromiter((e['t'] for e in edges.values()), dtype=np.int64, count=number_of_edges)
+        codes = np.fromiter((interactions.setdefault(e['i'], len(interactions)) for e in edges.values()),
+                            dtype=np.int64, count=number_of_edges)
 
-        unique_edges = {}
+        low = np.minimum(sources, targets)
+        high = np.maximum(sources, targets)
 
-        # in the loop below, we build a map where key is a tuple (edge_source, interacts, edge_target)
-        # and the value is a list of edge ids
-        for edge_id, edge in network_in_cx.edges.items():
+        # lexsort is stable, so within a group edges stay in their original order
+        order = np.lexsort((high, low, codes))
+        low, high, codes = low[order], high[order], codes[order]
 
-            edge_key = (edge['s'], edge['i'], edge['t'])
-            edge_key_reverse = (edge['t'], edge['i'], edge['s'])
+        new_group = np.empty(number_of_edges, dtype=bool)
+        new_group[0] = True
+        new_group[1:] = (codes[1:] != codes[:-1]) | (low[1:] != low[:-1]) | (high[1:] != high[:-1])
 
+        starts = np.flatnonzero(new_group)
+        ends = np.append(starts[1:], number_of_edges)
 
-            if edge_key in unique_edges:
-                if (edge_id not in unique_edges[edge_key]):
-                    unique_edges[edge_key].append(edge_id)
+        # order groups by position of their first edge
+        group_order = np.argsort(order[starts], kind='stable')
 
-            elif edge_key_reverse in unique_edges:
-                if (edge_id not in unique_edges[edge_key_reverse]):
-                    unique_edges[edge_key_reverse].append(edge_id)
+        sorted_edge_ids = edge_ids[order].tolist()
+        starts = starts.tolist()
+        ends = ends.tolist()
 
-            else:
-                unique_edges[edge_key] = [edge_id]
+        return [sorted_edge_ids[starts[g]:ends[g]] for g in group_order.tolist()]
 
-        #print(len(unique_edges))
+
+    def _collapse_edges(self, network_in_cx):
 
         # build collapsed edges and collapsed edges attributes
         # and then use them to replace network_in_cx.edges and network_in_cx.edgeAttributes
@@ -625,7 +2973,7 @@ class NDExNdexkinomeloaderLoader(object):
 
 
         # create a new edges aspect in collapsed_edges
-        for key, list_of_edge_attribute_ids in unique_edges.items():
+        for list_of_edge_attribute_ids in self._group_edges(network_in_cx):
             number_of_edges = len(list_of_edge_attribute_ids)
             edge_id = list_of_edge_attribute_ids.pop(0)
             collapsed_edges[edge_id] = network_in_cx.edges[edge_id]
@@ -637,24 +2985,23 @@ class NDExNdexkinomeloaderLoader(object):
 
             attribute_list = network_in_cx.edgeAttributes[edge_id]
 
-            # here, the list of collapsed edges is not empty, we need to iterate over it
-            # and add attributes of the edge(s) to already existing list of edge attributes
-            for attribute_id in list_of_edge_attribute_ids:
-
-                attribute_list_for_adding = network_in_cx.edgeAttributes[attribute_id]
+            # here, the list of collapsed edges is not empty, we add attributes
+            # of the edge(s) to already existing list of edge attributes
+            self._merge_attribute_lists(attribute_list,
+                                        [network_in_cx.edgeAttributes[attribute_id]
+                                         for attribute_id in list_of_edge_attribute_ids])
 
-                self._merge_attributes(attribute_list, attribute_list_for_adding)
-
-                if number_of_edges > 1:
-                    collapse_index = {
-                        'po': edge_id,
-                        'n': 'Collapse Index',
-                        'v': number_of_edges,
-                        'd': 'long'
-                    }
-                    attribute_list.append(collapse_index)
+            # one Collapse Index attribute is added for every collapsed edge
+            for attribute_id in list_of_edge_attribute_ids:
+                collapse_index = {
+                    'po': edge_id,
+                    'n': COLLAPSE_INDEX,
+                    'v': number_of_edges,
+                    'd': 'long'
+                }
+                attribute_list.append(collapse_index)
 
-                collapsed_edgeAttributes[edge_id] = attribute_list
+            collapsed_edgeAttributes[edge_id] = attribute_list
 
         del network_in_cx.edges
         network_in_cx.edges = collapsed_edges
@@ -663,118 +3010,315 @@ class NDExNdexkinomeloaderLoader(object):
         network_in_cx.edgeAttributes = collapsed_edgeAttributes
 
 
-    def _get_network_summaries_from_NDEx_server(self):
+    def _get_network_summaries_from_NDEx_server(self):
+
+        try:
+            network_summaries = self._ndex.get_network_summaries_for_user(self._user)
+        except Exception as e:
+            print("\n{}: {}".format(type(e).__name__, e))
+            return None, ERROR
+
+        return network_summaries, SUCCESS
+
+
+    def _get_network_uuid(self, network_name, network_summaries):
+
+        for summary in network_summaries:
+            network_name_1 = summary.get('name')
+
+            if network_name_1 is not None:
+                if network_name_1 == network_name:
+                    return summary.get('externalId'), True
+
+        return None, False
+
+
+    def _network_exists_on_server(self, ptm_CX_network, summaries):
+
+        network_name = ptm_CX_network.get_name()
+
+        for summary in summaries:
+            network_name_1 = summary.get('name')
+
+            if network_name_1 is not None:
+                if network_name_1 == network_name:
+                    return summary.get('externalId')
+
+        return None
+
+
+    def _find_attribute(self, attributes, name_index, with_value=False):
+        """
+        Finds attribute named 'BioGRID PTM ID' (case and surrounding whitespace ignored)
+        in list of attributes
+        :param attributes: list of node or edge attributes
+        :param name_index: dictionary of attribute name -> True if name is 'BioGRID PTM ID';
+                           names not seen before are normalized once and added to it
+        :param with_value: if True, skip attributes with empty value
+        :return: attribute or None if not found
+        """
+        for attribute in attributes:
+            is_ptm_id = name_index.get(attribute['n'])
+            if is_ptm_id is None:
+                is_ptm_id = self._is_ptm_id_name(attribute['n'], name_index)
+
+            if is_ptm_id and (attribute['v'] or not with_value):
+                return attribute
+
+        return None
+
+
+    def _is_ptm_id_name(self, name, name_index):
+        """
+        Tells if attribute name is 'BioGRID PTM ID' (case and surrounding whitespace
+        ignored) and adds the answer to name_index
+        :param name: attribute name
+        :param name_index: dictionary of attribute name -> True if name is 'BioGRID PTM ID'
+        :return: True or False
+        """
+        is_ptm_id = name_index[name] = bool(name) and name.strip().lower() == BIOGRID_PTM_ID
+        return is_ptm_id
+
+
+    def _postprocess_ptm_network(self, ptm_network_in_cx):
+        """
+        Renames PTM site nodes from <protein>-<residue>-<position> to <residue><position>
+        (or <residue>? if position is undefined) and sets 'BioGRID PTM ID' of every
+        PTM site node to 'BioGRID PTM ID' of its (collapsed) incoming edge.
+        Done in one pass over nodes and one pass over edges; attributes are found
+        as :py:meth:`_find_attribute` does, with its lookups inlined, since this
+        runs for millions of PTM sites
+        :param ptm_network_in_cx:
+        :return:
+        """
+        for node in ptm_network_in_cx.nodes.values():
+            match = PTM_NODE_NAME_PATTERN.match(node['n']) if node['n'] else None
+            if match:
+                protein, residue, position = match.groups()
+                if position.lower() == 'undefined':
+                    node['n'] = residue + '?'
+                else:
+                    node['n'] = residue + position
+
+        # attribute name -> True if name is 'BioGRID PTM ID', see _find_attribute
+        name_index = {}
+        edges = ptm_network_in_cx.edges
+        node_attributes = ptm_network_in_cx.nodeAttributes
+
+        for edge_id, edge_attributes in ptm_network_in_cx.edgeAttributes.items():
+            for edge_ptm_ids in edge_attributes:
+                is_ptm_id = name_index.get(edge_ptm_ids['n'])
+                if is_ptm_id is None:
+                    is_ptm_id = self._is_ptm_id_name(edge_ptm_ids['n'], name_index)
+                if is_ptm_id and edge_ptm_ids['v']:
+                    break
+            else:
+                continue
+
+            for node_ptm_ids in node_attributes.get(edges[edge_id]['t'], ()):
+                is_ptm_id = name_index.get(node_ptm_ids['n'])
+                if is_ptm_id is None:
+                    is_ptm_id = self._is_ptm_id_name(node_ptm_ids['n'], name_index)
+                if is_ptm_id:
+                    node_ptm_ids['v'] = edge_ptm_ids['v']
+                    break
+
+
+    def _read_ptm_relationships(self):
+        """
+        Reads rows of PTM-RELATIONSHIPS file replacing '-' with empty value.
+        Columns are found by name in header of file, and each row holds values of
+        PTM_RELATIONSHIP_COLUMNS, in that order. Rows are read once and reused
+        for PTM and merged networks
+        :return: list of rows (lists of values); empty if file does not exist
+                 or lacks some of PTM_RELATIONSHIP_COLUMNS
+        """
+        if self._ptm_relationships is not None:
+            return self._ptm_relationships
+
+        self._ptm_relationships = []
+        if not os.path.isfile(self._relations):
+            logger.info(self._relations + ' not found, PTM relationships are not added')
+            return self._ptm_relationships
+
+        with _open_file(self._relations, 'r') as tsv:
+            reader = csv.reader(tsv, delimiter='\t')
+            header = [column.strip() for column in next(reader, [])]
 
-        try:
-            network_summaries = self._ndex.get_network_summaries_for_user(self._user)
-        except Exception as e:
-            print("\n{}: {}".format(type(e).__name__, e))
-            return None, ERROR
+            missing_columns = [column for column in PTM_RELATIONSHIP_COLUMNS if column not in header]
+            if missing_columns:
+                logger.error(self._relations + ' has no column ' + ', '.join(missing_columns) +
+                             ', PTM relationships are not added')
+                return self._ptm_relationships
 
-        return network_summaries, SUCCESS
+            indexes = [header.index(column) for column in PTM_RELATIONSHIP_COLUMNS]
+            row_length = max(indexes) + 1
+            self._ptm_relationships = [[row[i] if row[i] != '-' else '' for i in indexes]
+                                       for row in reader if len(row) >= row_length]
 
+        return self._ptm_relationships
 
-    def _get_network_uuid(self, network_name, network_summaries):
 
-        for summary in network_summaries:
-            network_name_1 = summary.get('name')
+    def _build_ptm_id_index(self, cx_network):
+        """
+        Builds BioGRID PTM ID -> PTM site node id dictionary in one pass over node attributes aspect
+        :param cx_network:
+        :return: dictionary, i.e., { '70000': 1, '70014': 1, '70001': 3, ...}
+        """
+        name_index = {}
+        ptm_id_index = {}
 
-            if network_name_1 is not None:
-                if network_name_1 == network_name:
-                    return summary.get('externalId'), True
+        for node_id, attributes in cx_network.nodeAttributes.items():
+            node_ptm_ids = self._find_attribute(attributes, name_index, with_value=True)
+            if node_ptm_ids is None:
+                continue
 
-        return None, False
+            ptm_ids = node_ptm_ids['v']
+            if not isinstance(ptm_ids, list):
+                ptm_ids = [ptm_ids]
+            for ptm_id in ptm_ids:
+                ptm_id_index[str(ptm_id)] = node_id
 
+        return ptm_id_index
 
-    def _network_exists_on_server(self, ptm_CX_network, summaries):
 
-        network_name = ptm_CX_network.get_name()
+    def _add_ptm_relationships(self, cx_network, protein_node_name_dict, relationships):
+        """
+        Joins rows of PTM-RELATIONSHIPS file to PTM site nodes of cx_network on '#PTM ID' and
+        adds an edge from the protein of every row (i.e., kinase) to the PTM site node.
+        Rows with the same protein, PTM site node and relationship are collapsed into one edge.
+        Proteins not in protein_node_name_dict are added as new nodes. Rows whose
+        PTM ID is not in the network are skipped, and so are '-' values and edge
+        attributes without any values. Runs in time linear in number of rows and
+        node attributes
+        :param cx_network: network with PTM site nodes
+        :param protein_node_name_dict: protein node name -> node id dictionary of cx_network
+        :param relationships: rows of PTM-RELATIONSHIPS file, see :py:meth:`_read_ptm_relationships`
+        :return: number of edges added
+        """
+        ptm_id_index = self._build_ptm_id_index(cx_network)
+        protein_node_name_dict = dict(protein_node_name_dict)
 
-        for summary in summaries:
-            network_name_1 = summary.get('name')
+        next_node_id = max(cx_network.nodes.keys()) + 1 if cx_network.nodes else 0
+        next_edge_id = max(cx_network.edges.keys()) + 1 if cx_network.edges else 0
 
-            if network_name_1 is not None:
-                if network_name_1 == network_name:
-                    return summary.get('externalId')
+        new_nodes = {}
+        new_node_attributes = {}
+        new_edges = {}
+        new_edge_attributes = {}
+        relationship_edges = {}
 
-        return None
+        column_count = len(PTM_RELATIONSHIP_COLUMNS)
+        for row in relationships:
+            (ptm_id, entrez_gene_id, biogrid_id, systematic_name, protein_name, synonyms, relationship,
+             identity, author, pubmed_id, organism_id) = [v if v != '-' else '' for v in row[:column_count]]
 
+            site_node_id = ptm_id_index.get(ptm_id)
+            if site_node_id is None:
+                continue
 
-    def _rename_ptm_network_nodes(self, ptm_network_in_cx):
+            protein_node_id = protein_node_name_dict.get(protein_name)
+            if protein_node_id is None:
+                protein_node_id = next_node_id
+                next_node_id += 1
+                protein_node_name_dict[protein_name] = protein_node_id
+
+                aliases = [a for a in synonyms.split('|') + ['ncbigene:' + entrez_gene_id, systematic_name]
+                           if a and a != '-']
+                new_nodes[protein_node_id] = {'@id': protein_node_id, 'n': protein_name,
+                                              'r': 'biogrid:' + biogrid_id}
+                new_node_attributes[protein_node_id] = [
+                    {'po': protein_node_id, 'n': 'Organism Taxon Id', 'v': organism_id, 'd': 'string'},
+                    {'po': protein_node_id, 'n': 'alias', 'v': aliases, 'd': 'list_of_string'},
+                    {'po': protein_node_id, 'n': 'type', 'v': 'protein', 'd': 'string'}]
+
+            key = (protein_node_id, site_node_id, relationship)
+            if key in relationship_edges:
+                edge_id, edge_values = relationship_edges[key]
+            else:
+                edge_id = next_edge_id
+                next_edge_id += 1
 
-        pattern = re.compile("^([A-Za-z]+[0-9]*)-([A-Z]+)-([0-9]+|[A-Za-z]+)$")
+                new_edges[edge_id] = {'@id': edge_id, 's': protein_node_id, 't': site_node_id,
+                                      'i': PTM_RELATIONSHIP_PREDICATE}
+                edge_values = {'BioGRID PTM ID': [], 'Relationship': [], 'Identity': [],
+                               'Author': [], 'citation': []}
+                relationship_edges[key] = edge_id, edge_values
 
-        for index, node in ptm_network_in_cx.nodes.items():
-            if node['n'] and pattern.match(node['n']):
-                broken_name = node['n'].split('-')
-                if len(broken_name) == 3:
-                    if broken_name[2].strip().lower() == 'undefined':
-                        node['n'] = broken_name[1] + '?'
-                    else:
-                        node['n'] = broken_name[1] + broken_name[2]
+            for name, value in (('BioGRID PTM ID', ptm_id), ('Relationship', relationship),
+                                ('Identity', identity), ('Author', author),
+                                ('citation', 'pubmed:' + pubmed_id if pubmed_id else '')):
+                if value and value not in edge_values[name]:
+                    edge_values[name].append(value)
 
+        for edge_id, edge_values in relationship_edges.values():
+            new_edge_attributes[edge_id] = [{'po': edge_id, 'n': name, 'v': values, 'd': 'list_of_string'}
+                                            for name, values in edge_values.items() if values]
 
-    def _get_ptm_ids_for_edge(self, edge_attributes):
-        for edge_attribute in edge_attributes:
-            if edge_attribute['n'] and edge_attribute['n'].strip().lower() == 'biogrid ptm id':
-                if edge_attribute['v']:
-                    return edge_attribute['v']
+        cx_network.nodes.update(new_nodes)
+        cx_network.nodeAttributes.update(new_node_attributes)
+        cx_network.edges.update(new_edges)
+        cx_network.edgeAttributes.update(new_edge_attributes)
 
-        return None
+        cx_network.node_int_id_generator = next_node_id
+        cx_network.edge_int_id_generator = next_edge_id
 
+        return len(new_edges)
 
-    def _add_ptm_ids_to_target_node(self, biogrid_ptm_ids, node_attributes):
-        for node_attribute in node_attributes:
-            if node_attribute['n'] and node_attribute['n'].strip().lower() == 'biogrid ptm id':
-                node_attribute['v'] = biogrid_ptm_ids
-                break
 
-    def _add_BioGRID_PTM_IDs_to_ptm_nodes(self, ptm_network_in_cx):
-        for index, edge in ptm_network_in_cx.edges.items():
-            edge_attributes = ptm_network_in_cx.edgeAttributes[edge['@id']]
-            biogrid_ptm_ids = self._get_ptm_ids_for_edge(edge_attributes)
+    def _build_node_type_index(self, cx_network):
+        """
+        Builds node id -> node type dictionary in one pass over node attributes aspect.
+        Type is value of node attribute 'type' stripped and lower cased
+        :param cx_network:
+        :return: dictionary, i.e., { 0: 'protein', 1: 'protein', 3: 'ptm', ...}
+        """
+        node_types = {}
 
-            if biogrid_ptm_ids:
-                target_node_attributes = ptm_network_in_cx.nodeAttributes[edge['t']]
-                self._add_ptm_ids_to_target_node(biogrid_ptm_ids, target_node_attributes)
+        for node_id, attributes in cx_network.nodeAttributes.items():
+            for attribute in attributes:
+                if attribute['n'] == 'type':
+                    if attribute['v']:
+                        node_types[node_id] = attribute['v'].strip().lower()
+                    break
 
+        return node_types
 
 
-    def _build_pti_node_name_to_node_id_dictionary(self, pti_CX_network):
-        pti_nodes = {}
-        for node in pti_CX_network.get_nodes():
-            node_obj = node[1]
-            node_id = node_obj['@id']
-            node_name = node_obj['n']
-            if node_name not in pti_nodes:
-                pti_nodes[node_name] = node_id
-            else:
-                raise Exception('Found duplicate node name in PTI network: ' + node_name + ' ids: ' +
-                                pti_nodes[node_name] + ', ' + node_id)
+    def _build_node_name_to_node_id_dictionary(self, cx_network, network_label, node_type=None):
+        """
+        Builds node name -> node id dictionary for all nodes of cx_network or,
+        if node_type is set, for nodes of this type only
+        :param cx_network:
+        :param network_label: name of network to use in error message, i.e., 'PTI'
+        :param node_type: type of nodes to include, i.e., 'protein'
+        :raises Exception: if two nodes included in dictionary have the same name
+        :return: dictionary, i.e., { 'CHD1': 0, 'CKA1': 1, 'CKA2': 2, ...}
+        """
+        node_types = self._build_node_type_index(cx_network) if node_type is not None else None
 
-        return pti_nodes
+        node_names = {}
+        for node_id, node_obj in cx_network.nodes.items():
+            if node_types is not None and node_types.get(node_id) != node_type:
+                continue
 
+            node_name = node_obj['n']
+            if node_name in node_names:
+                raise Exception('Found duplicate node name in ' + network_label + ' network: ' + node_name +
+                                ' ids: ' + str(node_names[node_name]) + ', ' + str(node_id))
 
+            node_names[node_name] = node_id
 
+        return node_names
 
-    def _build_ptm_node_name_to_node_id_dictionary(self, ptm_CX_network):
-        ptm_nodes = {}
-        for node in ptm_CX_network.get_nodes():
-            node_obj = node[1]
-            node_id = node_obj['@id']
-            node_name = node_obj['n']
 
-            node_type = ptm_CX_network.get_node_attribute(node_obj, 'type')
+    def _build_pti_node_name_to_node_id_dictionary(self, pti_CX_network):
+        return self._build_node_name_to_node_id_dictionary(pti_CX_network, 'PTI')
 
-            if node_type and node_type['v'].strip().lower() == 'protein':
 
-                # for ptm network we only want names of protein/gene nodes
-                if node_name not in ptm_nodes:
-                    ptm_nodes[node_name] = node_id
-                else:
-                    raise Exception('Found duplicate node name in PTM network: ' + node_name + ' ids: ' +
-                                    ptm_nodes[node_name] + ', ' + node_id)
-        return ptm_nodes
+    def _build_ptm_node_name_to_node_id_dictionary(self, ptm_CX_network):
+        # for ptm network we only want names of protein/gene nodes
+        return self._build_node_name_to_node_id_dictionary(ptm_CX_network, 'PTM', node_type='protein')
 
 
     def _get_all_edges_for_node(self, node_id, cx_network):
@@ -791,53 +3335,95 @@ class NDExNdexkinomeloaderLoader(object):
 
 
 
+    def _copy_attributes(self, attributes, property_of):
+        """
+        Copies attributes setting their 'po' to property_of; list values are copied as well
+        :param attributes: list of node or edge attributes
+        :param property_of: id of node or edge copied attributes belong to
+        :return: list of attributes
+        """
+        copied_attributes = []
+        for attribute in attributes:
+            copied_attribute = dict(attribute)
+            copied_attribute['po'] = property_of
+            if isinstance(copied_attribute['v'], list):
+                copied_attribute['v'] = list(copied_attribute['v'])
+            copied_attributes.append(copied_attribute)
+        return copied_attributes
+
+
     def _merge_ptm_onto_pti(self, pti_node_name_dict, ptm_node_name_dict, pti_CX_network,
                             ptm_CX_network, protein_id_to_ptm_ids_dict, src_target_edge_ptm_ids_dict):
-
-        pti_CX_network.node_int_id_generator = max(pti_CX_network.nodes.keys()) + 1
-        pti_CX_network.edge_int_id_generator = max(pti_CX_network.edges.keys()) + 1
+        """
+        Adds PTM site nodes and protein -> PTM site edges, with their attributes, from PTM
+        network to PTI network. New nodes and edges get contiguous ranges of ids following
+        the largest node and edge ids in PTI network and are inserted in bulk.
+        PTM sites of proteins not in PTI network, i.e., in --byorganism mode proteins
+        of an organism without interactions, are skipped
+        :return: pti_CX_network
+        """
+        next_node_id = max(pti_CX_network.nodes.keys()) + 1 if pti_CX_network.nodes else 0
+        next_edge_id = max(pti_CX_network.edges.keys()) + 1 if pti_CX_network.edges else 0
 
         inv_ptm_node_name_dict = {v: k for k, v in ptm_node_name_dict.items()}
 
+        ptm_nodes = ptm_CX_network.nodes
+        ptm_edges = ptm_CX_network.edges
+        ptm_node_attributes = ptm_CX_network.nodeAttributes
+        ptm_edge_attributes = ptm_CX_network.edgeAttributes
+
+        new_nodes = {}
+        new_node_attributes = {}
+        new_edges = {}
+        new_edge_attributes = {}
+        skipped_proteins = []
+
         # iterate over ptm protein nodes
         for protein_id, ptms in protein_id_to_ptm_ids_dict.items():
-            # print(f'protein_id={protein_id}  ptms={ptms}')
 
-            pti_protein_node_id = pti_node_name_dict[inv_ptm_node_name_dict[protein_id]]
+            pti_protein_node_id = pti_node_name_dict.get(inv_ptm_node_name_dict[protein_id])
+            if pti_protein_node_id is None:
+                skipped_proteins.append(inv_ptm_node_name_dict[protein_id])
+                continue
 
             for ptm_id in ptms:
-                # get ptm node and ptm nodes' properties
-                ptm_node = ptm_CX_network.get_node(ptm_id)
-                ptm_node_props = ptm_CX_network.get_node_attributes(ptm_id)
-
-                # add this ptm node to pti network
-                new_node_id = pti_CX_network.create_node(ptm_node['n'], ptm_node['r'])
-
-                # modify nodes properties to correct node id
-                for prop in ptm_node_props:
-                    prop['po'] = new_node_id
-
-                # set the node attributes to the node in pti network
-                pti_CX_network.nodeAttributes[new_node_id] = copy.deepcopy(ptm_node_props)
-
-
                 ptm_edge_id = src_target_edge_ptm_ids_dict.get((protein_id, ptm_id), None)
                 if ptm_edge_id is None:
-                    raise Exception('Unable to find edge with between nodes with Ids ' + protein_id + ' and ' + ptm_id)
-
-                # from ptm network, get edge and edge attributes
-                ptm_edge = ptm_CX_network.edges[ptm_edge_id]
-                ptm_edge_props = ptm_CX_network.get_edge_attributes(ptm_edge_id)
-
-                # add this edge to pti network between protein node and newly added ptm node
-                new_edge_id = pti_CX_network.create_edge(pti_protein_node_id, new_node_id, ptm_edge['i'])
-
-                # modify edge properties to correct edge id
-                for prop in ptm_edge_props:
-                    prop['po'] = new_edge_id
-
-                # set the node attributes to the node in pti network
-                pti_CX_network.edgeAttributes[new_edge_id] = copy.deepcopy(ptm_edge_props)
+                    raise Exception('Unable to find edge with between nodes with Ids ' + str(protein_id) +
+                                    ' and ' + str(ptm_id))
+
+                # add ptm node and its properties to pti network
+                ptm_node = ptm_nodes[ptm_id]
+                new_nodes[next_node_id] = {'@id': next_node_id,
+                                           'n': ptm_node['n'],
+                                           'r': ptm_node.get('r') or ptm_node['n']}
+                if ptm_id in ptm_node_attributes:
+                    new_node_attributes[next_node_id] = \
+                        self._copy_attributes(ptm_node_attributes[ptm_id], next_node_id)
+
+                # add edge between protein node and newly added ptm node, and its properties
+                new_edge = {'@id': next_edge_id, 's': pti_protein_node_id, 't': next_node_id}
+                if ptm_edges[ptm_edge_id].get('i') is not None:
+                    new_edge['i'] = ptm_edges[ptm_edge_id]['i']
+                new_edges[next_edge_id] = new_edge
+                if ptm_edge_id in ptm_edge_attributes:
+                    new_edge_attributes[next_edge_id] = \
+                        self._copy_attributes(ptm_edge_attributes[ptm_edge_id], next_edge_id)
+
+                next_node_id += 1
+                next_edge_id += 1
+
+        if skipped_proteins:
+            logger.warning('Skipped PTM sites of ' + str(len(skipped_proteins)) +
+                           ' proteins not in PTI network: ' + ', '.join(sorted(skipped_proteins)))
+
+        pti_CX_network.nodes.update(new_nodes)
+        pti_CX_network.nodeAttributes.update(new_node_attributes)
+        pti_CX_network.edges.update(new_edges)
+        pti_CX_network.edgeAttributes.update(new_edge_attributes)
+
+        pti_CX_network.node_int_id_generator = next_node_id
+        pti_CX_network.edge_int_id_generator = next_edge_id
 
         return pti_CX_network
 
@@ -853,6 +3439,10 @@ class NDExNdexkinomeloaderLoader(object):
             edge_source_id = edge[1]['s']
             edge_target_id = edge[1]['t']
 
+            # PTM relationship edges are added to merged network separately
+            if edge[1].get('i') == PTM_RELATIONSHIP_PREDICATE:
+                continue
+
             if edge_source_id in inv_protein_name_dict:
                 if edge_source_id not in protein_id_to_ptm_ids_dict:
                     protein_id_to_ptm_ids_dict[edge_source_id] = []
@@ -883,71 +3473,261 @@ class NDExNdexkinomeloaderLoader(object):
         return src_target_edge_ptm_ids_dict
 
 
+    @contextmanager
+    def _stage(self, name, kind=CPU_STAGE):
+        """
+        Context manager that runs a stage of the loader: waits for a free slot
+        for stages of this kind (NETWORK_STAGE or CPU_STAGE) if loader shares
+        a cache with stage limits, and records how long the stage took
+        in self._timings
+        :param name: name of stage, i.e., 'download'
+        :param kind: NETWORK_STAGE or CPU_STAGE
+        :return:
+        """
+        semaphore = self._cache.get_stage_semaphore(kind) if self._cache is not None else None
+        if semaphore is not None:
+            semaphore.acquire()
+        start_time = time.time()
+        try:
+            if self._is_profiled_stage(name):
+                with self._profile_stage(name):
+                    yield
+            else:
+                yield
+        finally:
+            self._timings.append((name, time.time() - start_time))
+            if semaphore is not None:
+                semaphore.release()
+
+
+    def _is_profiled_stage(self, name):
+        if self._profile_dir is None:
+            return False
+        return self._profiled_stages is None or name in self._profiled_stages
+
+
+    def _get_profile_file_name(self, name, extension):
+        """
+        Gets path to file profile of stage is written to, in subdirectory of
+        self._profile_dir named after <datadir> and named after stage, BioGRID
+        version and --profile, so concurrent --jobs do not overwrite each other's
+        :param name: name of stage
+        :param extension: extension of file, i.e., '.pstats'
+        :return: path to file, i.e., <profilestages>/data-kinome/build-PTI-network-3.5.177-ndexkinomeloader.pstats
+        """
+        job_dir = re.sub('[^A-Za-z0-9_.-]+', '-', self._datadir).strip('-')
+        file_name = os.path.basename(self._get_run_file_name(re.sub('[^A-Za-z0-9_.-]+', '-', name), extension))
+        return os.path.join(self._profile_dir, job_dir, file_name)
+
+
+    @contextmanager
+    def _profile_stage(self, name):
+        """
+        Context manager that runs a stage under cProfile and StageSampler and writes
+        their results to .pstats and .collapsed files, see :py:meth:`_get_profile_file_name`.
+        If another profiler is active in the process (i.e., a concurrent stage is
+        profiled on Python 3.12+), only the sampler is run
+        :param name: name of stage
+        :return:
+        """
+        import cProfile
+
+        os.makedirs(os.path.dirname(self._get_profile_file_name(name, '.pstats')), exist_ok=True)
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            logger.warning('Unable to run cProfile for stage ' + name + ': ' + str(e))
+            profiler = None
+
+        sampler = StageSampler(threading.get_ident())
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(self._get_profile_file_name(name, '.pstats'))
+            sampler.write_collapsed_stacks(self._get_profile_file_name(name, '.collapsed'))
+
+
+    def get_timings(self):
+        """
+        Gets time spent in each stage run so far
+        :return: list of (stage name, seconds) tuples
+        """
+        return self._timings
+
+
+    def _get_network_summaries(self):
+        """
+        Creates connection to NDEx and gets summaries of networks of user
+        :return: tuple of summaries and SUCCESS or ERROR
+        """
+        self._create_ndex_connection()
+
+        with self._stage('get network summaries', NETWORK_STAGE):
+            return self._get_network_summaries_from_NDEx_server()
+
+
     def run(self):
         """
         Runs content loading for NDEx KINOME Content Loader
         :param theargs:
         :return:
         """
+        from concurrent.futures import ThreadPoolExecutor
+
+        _import_ndex2()
+
         self._parse_config()
-        self._load_style_template()
+        self._start_time = time.time()
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            return self._run_stages(executor)
 
+
+    def _run_stages(self, executor):
+        """
+        Runs stages of content loading. Stages that only wait on I/O and whose
+        results are not needed right away (loading style template, getting network
+        summaries from NDEx) are submitted to executor and run while data is
+        downloaded and networks are built; their results are joined only where
+        they are consumed (styling and upload of the first network)
+        :param executor: executor to run I/O-bound stages in background
+        :return:
+        """
+        # checked before background stages start, since fetching --template creates <datadir>
         data_dir_existed = self._check_if_data_dir_exists()
 
+        template_future = executor.submit(self._load_style_template)
+        summaries_future = executor.submit(self._get_network_summaries)
+
         if self._skipdownload is False or data_dir_existed is False:
-            status_code = self._download_kinome_files()
+            with self._stage('download', NETWORK_STAGE):
+                status_code = self._download_kinome_files()
             if status_code != 0:
                 return ERROR
 
-            status_code = self._unzip_kinome()
+            with self._stage('unzip'):
+                status_code = self._unzip_kinome()
             if status_code != 0:
                 return ERROR
+        elif self._find_extracted_files() != SUCCESS:
+            return ERROR
 
-        self._build_gene_lookup()
+        with self._stage('gene lookup'):
+            self._build_gene_lookup()
 
+        with self._stage('read PTM relationships'):
+            ptm_relationships = self._read_ptm_relationships()
 
-        self._create_ndex_connection()
+        if self._by_organism:
+            return self._run_organism_stages(template_future, summaries_future, ptm_relationships)
 
 
-        summaries, ret_value = self._get_network_summaries_from_NDEx_server()
-        if ret_value != SUCCESS:
-            return ret_value
+        # Step 1 - create PPI file from GENES and INTERACTIONS files
+        with self._stage('build PTI network'):
+            if self._use_stream():
+                pti_CX_network = self._stream_network(self._get_streamed_members()[0],
+                                                      lambda header: self._get_ppi_header(),
+                                                      self._transform_ppi_row,
+                                                      self._pti_load_plan, self._ppi_network_1)
+            else:
+                self._create_ppi_file()
 
+                pti_CX_network, ret_value = self._generate_CX_file(self._pti_load_plan, self._ppi_network_1)
+                if ret_value != SUCCESS:
+                    return ret_value
 
-        # Step 1 - create PPI file from GENES and INTERACTIONS files
-        self._create_ppi_file()
+            self._collapse_edges(pti_CX_network)
+            if self._memory_report is not None:
+                self._write_memory_report(pti_CX_network, self._memory_report)
+            template_future.result()
+            self._finish_network(pti_CX_network, 'pti', self._cx_pti)
 
-        pti_CX_network, ret_value = self._generate_CX_file(self._pti_load_plan, self._ppi_network_1)
+        summaries, ret_value = summaries_future.result()
         if ret_value != SUCCESS:
             return ret_value
 
-        self._collapse_edges(pti_CX_network)
-        self._init_network_attributes(pti_CX_network, 'pti')
-        self._write_nice_cx_to_file(pti_CX_network, self._cx_pti)
-        network_UUID = self._network_exists_on_server(pti_CX_network, summaries)
-        self._upload_CX(self._cx_pti, network_UUID)
+        with self._stage('upload PTI network', NETWORK_STAGE):
+            self._upload_network(pti_CX_network, self._cx_pti, summaries)
 
 
         # Step 2 - create PTM network file
-        self._create_ptm_file()
+        with self._stage('build PTM network'):
+            if self._use_stream():
+                ptm_CX_network = self._stream_network(self._get_streamed_members()[1],
+                                                      self._get_ptm_header,
+                                                      self._transform_ptm_row,
+                                                      self._ptm_load_plan, self._ptm_network_2)
+            else:
+                self._create_ptm_file()
 
-        ptm_CX_network, ret_value = self._generate_CX_file(self._ptm_load_plan, self._ptm_network_2)
-        self._rename_ptm_network_nodes(ptm_CX_network)
-        if ret_value != SUCCESS:
-            return ret_value
+                ptm_CX_network, ret_value = self._generate_CX_file(self._ptm_load_plan, self._ptm_network_2)
+                if ret_value != SUCCESS:
+                    return ret_value
 
-        self._collapse_edges(ptm_CX_network)
-        self._add_BioGRID_PTM_IDs_to_ptm_nodes(ptm_CX_network)
-        self._init_network_attributes(ptm_CX_network, 'ptm')
-        self._write_nice_cx_to_file(ptm_CX_network, self._cx_ptm)
-        network_UUID = self._network_exists_on_server(ptm_CX_network, summaries)
-        self._upload_CX(self._cx_ptm, network_UUID)
+            self._complete_ptm_network(ptm_CX_network, ptm_relationships)
+
+        with self._stage('upload PTM network', NETWORK_STAGE):
+            self._upload_network(ptm_CX_network, self._cx_ptm, summaries)
 
 
         # Step 3 - merge PTM network with PTI network on protein/genes:
         # in essence, we add edges from PTM network to PTI based on node names
-        pti_CX_network = ndex2.create_nice_cx_from_file(self._cx_pti)
-        ptm_CX_network = ndex2.create_nice_cx_from_file(self._cx_ptm)
+        with self._stage('build merged network'):
+            merged_ptm_pti_network = self._build_merged_network(ptm_relationships)
+
+        with self._stage('upload merged network', NETWORK_STAGE):
+            self._upload_network(merged_ptm_pti_network, self._cx_merged, summaries)
+
+
+        return SUCCESS
+
+
+    def _finish_network(self, network, type, cx_file_path):
+        """
+        Sets network attributes, style and content hash of network and writes it to cx_file_path
+        :param network:
+        :param type: 'pti', 'ptm' or 'merged'
+        :param cx_file_path: path to CX file
+        :return:
+        """
+        self._init_network_attributes(network, type)
+        self._set_content_hash(network)
+        self._write_nice_cx_to_file(network, cx_file_path)
+
+
+    def _complete_ptm_network(self, ptm_CX_network, ptm_relationships):
+        """
+        Collapses edges of PTM network converted from PTM network file, renames its
+        PTM site nodes, adds PTM relationships and writes it to self._cx_ptm
+        :param ptm_CX_network:
+        :param ptm_relationships: rows of PTM-RELATIONSHIPS file
+        :return:
+        """
+        self._collapse_edges(ptm_CX_network)
+        self._postprocess_ptm_network(ptm_CX_network)
+        self._add_ptm_relationships(ptm_CX_network,
+                                    self._build_ptm_node_name_to_node_id_dictionary(ptm_CX_network),
+                                    ptm_relationships)
+        self._finish_network(ptm_CX_network, 'ptm', self._cx_ptm)
+
+
+    def _build_merged_network(self, ptm_relationships):
+        """
+        Reads PTI and PTM networks from self._cx_pti and self._cx_ptm, adds PTM site nodes
+        and PTM relationships to PTI network and writes it to self._cx_merged
+        :param ptm_relationships: rows of PTM-RELATIONSHIPS file
+        :return: merged network
+        """
+        pti_CX_network = self._json_backend.read_nice_cx(self._cx_pti)
+        ptm_CX_network = self._json_backend.read_nice_cx(self._cx_ptm)
+        self._intern_attributes(pti_CX_network)
+        self._intern_attributes(ptm_CX_network)
 
         # in this dictionary for pti network, key is protein node name, value is to node id:
         #   pti_node_name_dict: { 'CHD1': 0, 'CKA1': 1, 'CKA2': 2, ...}
@@ -957,9 +3737,6 @@ class NDExNdexkinomeloaderLoader(object):
         #   pti_node_name_dict: { 'ADK1': 0, 'ADR1': 2, 'AKL1': 40, ...}
         ptm_node_name_dict = self._build_ptm_node_name_to_node_id_dictionary(ptm_CX_network)
 
-        #print(f'protein nodes in pti={len(pti_node_name_dict)}   protein nodes in ptm={len(ptm_node_name_dict)}')
-
-
         # in this dictionary for ptm network, key is protein node id, value is list of ptm ids:
         #   pti_node_name_dict: {0: [1, 3108, 3521, 3522, 3523], 2: [3, 4, 5, 6, 7, 8, 9], 40: [41, 42, 43, 44, 45], ...}
         protein_id_to_ptm_ids_dict = self._build_protein_id_to_ptm_ids_dict(ptm_node_name_dict, ptm_CX_network)
@@ -971,14 +3748,418 @@ class NDExNdexkinomeloaderLoader(object):
 
         merged_ptm_pti_network = self._merge_ptm_onto_pti(pti_node_name_dict, ptm_node_name_dict,
                   pti_CX_network, ptm_CX_network, protein_id_to_ptm_ids_dict, src_target_edge_ptm_ids_dict)
+        self._add_ptm_relationships(merged_ptm_pti_network, pti_node_name_dict, ptm_relationships)
 
-        self._init_network_attributes(merged_ptm_pti_network, 'merged')
-        self._write_nice_cx_to_file(merged_ptm_pti_network, self._cx_merged)
-        network_UUID = self._network_exists_on_server(merged_ptm_pti_network, summaries)
-        self._upload_CX(self._cx_merged, network_UUID)
+        self._finish_network(merged_ptm_pti_network, 'merged', self._cx_merged)
 
+        return merged_ptm_pti_network
 
-        return SUCCESS
+
+    def _get_organism_dir(self, organism):
+        return os.path.join(self._datadir, 'organism-' + re.sub('[^A-Za-z0-9_.-]', '_', organism))
+
+
+    def _set_organism(self, organism):
+        """
+        Makes loader build networks of organism from network files in its
+        directory, see :py:meth:`_partition_network_file`
+        :param organism: taxon id, i.e., '559292'
+        :return:
+        """
+        organism_dir = self._get_organism_dir(organism)
+
+        self._organism = organism
+        self._ppi_network_1 = os.path.join(organism_dir, os.path.basename(self._ppi_network_1))
+        self._ptm_network_2 = os.path.join(organism_dir, os.path.basename(self._ptm_network_2))
+        self._cx_pti = os.path.join(organism_dir, os.path.basename(self._cx_pti))
+        self._cx_ptm = os.path.join(organism_dir, os.path.basename(self._cx_ptm))
+        self._cx_merged = os.path.join(organism_dir, os.path.basename(self._cx_merged))
+
+
+    def _partition_network_file(self, network_tsv, organism_columns):
+        """
+        Splits rows of network TSV file by organism in one pass, writing rows of each
+        organism (with header) to file of the same name in directory of the organism.
+        A row whose organism columns have different values, i.e., an interaction
+        between proteins of two organisms, is written to files of both organisms
+        :param network_tsv: path to network TSV file
+        :param organism_columns: names of columns with organism taxon id
+        :return: list of organisms found
+        """
+        if _is_parquet_file(network_tsv):
+            return self._partition_parquet_table(network_tsv, organism_columns)
+
+        organism_files = {}
+        # organism -> path to its file, written to temporary file renamed
+        # to it when all rows are written
+        organism_tsvs = {}
+
+        try:
+            with _open_file(network_tsv, 'r') as tsv:
+                header = tsv.readline()
+                columns = header.rstrip('\n').split('\t')
+                organism_indexes = [columns.index(column) for column in organism_columns]
+
+                for line in tsv:
+                    values = line.rstrip('\n').split('\t')
+                    organisms = []
+                    for index in organism_indexes:
+                        organism = values[index] if values[index] else 'unknown'
+                        if organism not in organisms:
+                            organisms.append(organism)
+
+                    for organism in organisms:
+                        organism_file = organism_files.get(organism)
+                        if organism_file is None:
+                            organism_dir = self._get_organism_dir(organism)
+                            os.makedirs(organism_dir, exist_ok=True)
+                            organism_tsv = os.path.join(organism_dir, os.path.basename(network_tsv))
+                            organism_tsvs[organism] = organism_tsv
+                            organism_file = _open_file(_get_temp_file_name(organism_tsv), 'w',
+                                                       self._compression.get(NETWORK_ARTIFACT))
+                            organism_file.write(header)
+                            organism_files[organism] = organism_file
+
+                        organism_file.write(line)
+
+            for organism, organism_file in organism_files.items():
+                organism_file.close()
+                os.replace(_get_temp_file_name(organism_tsvs[organism]), organism_tsvs[organism])
+        finally:
+            for organism, organism_file in organism_files.items():
+                organism_file.close()
+                temp_file = _get_temp_file_name(organism_tsvs[organism])
+                if os.path.exists(temp_file):
+                    os.remove(temp_file)
+
+        return list(organism_files.keys())
+
+
+    def _partition_parquet_table(self, network_table, organism_columns):
+        """
+        Splits rows of network table in Parquet format by organism, same as
+        :py:meth:`_partition_network_file` does for TSV file
+        :param network_table: path to network table
+        :param organism_columns: names of columns with organism taxon id
+        :return: list of organisms found
+        """
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(network_table, memory_map=True)
+
+        # organism -> indexes of its rows
+        organism_rows = {}
+        organism_values = zip(*[_get_text_column(table, column).to_pylist() for column in organism_columns])
+        for index, values in enumerate(organism_values):
+            for organism in values:
+                rows = organism_rows.setdefault(organism if organism else 'unknown', [])
+                if not rows or rows[-1] != index:
+                    rows.append(index)
+
+        for organism, rows in organism_rows.items():
+            organism_dir = self._get_organism_dir(organism)
+            os.makedirs(organism_dir, exist_ok=True)
+            with _atomic_write(os.path.join(organism_dir, os.path.basename(network_table)), 'wb') as f:
+                pq.write_table(table.take(rows), f, row_group_size=PARQUET_ROW_GROUP_SIZE)
+
+        return list(organism_rows.keys())
+
+
+    def _partition_network_files(self):
+        """
+        Splits PPI and PTM network files by organism, see :py:meth:`_partition_network_file`.
+        Organisms found in one file only get a network file with just the header for the other
+        :return: list of organisms
+        """
+        network_files = ((self._ppi_network_1, ['Organism Interactor A', 'Organism Interactor B']),
+                         (self._ptm_network_2, ['Organism ID']))
+
+        organisms = []
+        for network_tsv, organism_columns in network_files:
+            for organism in self._partition_network_file(network_tsv, organism_columns):
+                if organism not in organisms:
+                    organisms.append(organism)
+
+        for network_tsv, organism_columns in network_files:
+            for organism in organisms:
+                organism_tsv = os.path.join(self._get_organism_dir(organism), os.path.basename(network_tsv))
+                if not os.path.isfile(organism_tsv):
+                    self._write_empty_network_table(network_tsv, organism_tsv)
+
+        return organisms
+
+
+    def _write_empty_network_table(self, network_table, empty_table):
+        """
+        Writes network table with columns of network_table and no rows
+        :param network_table: path to network table
+        :param empty_table: path to network table to write
+        :return:
+        """
+        if _is_parquet_file(network_table):
+            import pyarrow.parquet as pq
+
+            with _atomic_write(empty_table, 'wb') as f:
+                pq.write_table(pq.read_schema(network_table).empty_table(), f)
+            return
+
+        with _open_file(network_table, 'r') as tsv:
+            header = tsv.readline()
+        with _atomic_write(empty_table, compression=self._compression.get(NETWORK_ARTIFACT)) as f:
+            f.write(header)
+
+
+    def _build_organism_networks(self, ptm_relationships):
+        """
+        Builds PTI, PTM and merged networks from network files of organism set by
+        :py:meth:`_set_organism`
+        :param ptm_relationships: rows of PTM-RELATIONSHIPS file of organism
+        :return: tuple of list of (network name, content hash, path to CX file, size
+                 of CX file before compression) tuples and SUCCESS or ERROR
+        """
+        pti_CX_network, ret_value = self._generate_CX_file(self._pti_load_plan, self._ppi_network_1)
+        if ret_value != SUCCESS:
+            return [], ret_value
+        self._collapse_edges(pti_CX_network)
+        self._finish_network(pti_CX_network, 'pti', self._cx_pti)
+
+        ptm_CX_network, ret_value = self._generate_CX_file(self._ptm_load_plan, self._ptm_network_2)
+        if ret_value != SUCCESS:
+            return [], ret_value
+        self._complete_ptm_network(ptm_CX_network, ptm_relationships)
+
+        merged_network = self._build_merged_network(ptm_relationships)
+
+        return [(network.get_name(), network.get_network_attribute(CONTENT_HASH)['v'], cx_file_path,
+                 self._cx_sizes[cx_file_path])
+                for network, cx_file_path in ((pti_CX_network, self._cx_pti),
+                                              (ptm_CX_network, self._cx_ptm),
+                                              (merged_network, self._cx_merged))], SUCCESS
+
+
+    def _run_organism_stages(self, template_future, summaries_future, ptm_relationships):
+        """
+        Runs network building stages of --byorganism mode: splits PPI and PTM network
+        files by organism, builds networks of each organism in a worker process and
+        uploads them. Organism whose networks fail to build is reported and skipped,
+        so networks of other organisms are still uploaded
+        :param template_future: future of loading style template
+        :param summaries_future: future of getting network summaries
+        :param ptm_relationships: rows of PTM-RELATIONSHIPS file
+        :return: SUCCESS, or ERROR if networks of any organism failed to build
+        """
+        with self._stage('partition networks by organism'):
+            if self._create_ppi_file() != SUCCESS:
+                logger.error('Unable to create ' + self._ppi_network_1 + ' from ' + self._interactions)
+                return ERROR
+            if self._create_ptm_file() != SUCCESS:
+                logger.error('Unable to create ' + self._ptm_network_2 + ' from ' + self._ptm)
+                return ERROR
+
+            organisms = self._partition_network_files()
+
+            organism_relationships = {organism: [] for organism in organisms}
+            organism_column = PTM_RELATIONSHIP_COLUMNS.index('Organism ID')
+            for row in ptm_relationships:
+                if row[organism_column] in organism_relationships:
+                    organism_relationships[row[organism_column]].append(row)
+
+        template_future.result()
+
+        with self._stage('build organism networks'):
+            with _create_process_pool(self._workers) as executor:
+                futures = [executor.submit(_build_organism_networks, self._args, organism,
+                                           self._style_aspect, organism_relationships[organism])
+                           for organism in organisms]
+
+                organism_networks = []
+                organisms_ret_value = SUCCESS
+                for organism, future in zip(organisms, futures):
+                    try:
+                        networks, ret_value = future.result()
+                    except Exception:
+                        logger.exception('Unable to build networks of organism ' + organism)
+                        organisms_ret_value = ERROR
+                        continue
+
+                    if ret_value != SUCCESS:
+                        logger.error('Unable to build networks of organism ' + organism)
+                        organisms_ret_value = ret_value
+                        continue
+
+                    organism_networks.append(networks)
+
+        summaries, ret_value = summaries_future.result()
+        if ret_value != SUCCESS:
+            return ret_value
+
+        for networks in organism_networks:
+            for network_name, content_hash, cx_file_path, cx_size in networks:
+                self._cx_sizes[cx_file_path] = cx_size
+                with self._stage('upload ' + network_name, NETWORK_STAGE):
+                    self._upload_network_file(network_name, content_hash, cx_file_path, summaries)
+
+        return organisms_ret_value
+
+
+# arguments that control how jobs are run, so they can not be set by a job
+RUNNER_ARGUMENTS = ('jobs', 'maxjobs', 'maxnetworkstages', 'maxcpustages', 'timingreport')
+
+
+def _expand_biogrid_versions(biogrid_version):
+    """
+    Expands comma separated list and ranges of BioGRID versions, i.e.,
+    '3.5.175-3.5.177,3.5.180' -> ['3.5.175', '3.5.176', '3.5.177', '3.5.180'].
+    A range can only vary in last component of version
+    :param biogrid_version: value of --biogridversion
+    :raises ValueError: if range is invalid
+    :return: list of versions
+    """
+    versions = []
+    for part in biogrid_version.split(','):
+        part = part.strip()
+        if '-' not in part:
+            versions.append(part)
+            continue
+
+        first, last = [v.strip() for v in part.split('-', 1)]
+        first_prefix, first_num = first.rsplit('.', 1)
+        last_prefix, last_num = last.rsplit('.', 1)
+        if first_prefix != last_prefix or int(first_num) > int(last_num):
+            raise ValueError('Invalid range of BioGRID versions: ' + part)
+
+        versions.extend(first_prefix + '.' + str(n) for n in range(int(first_num), int(last_num) + 1))
+
+    return versions
+
+
+def _has_many_biogrid_versions(biogrid_version):
+    """
+    Tells if biogrid_version is a list or range of BioGRID versions
+    :param biogrid_version: value of --biogridversion
+    :return: True if biogrid_version has to be expanded by
+             :py:func:`_expand_biogrid_versions`
+    """
+    return ',' in biogrid_version or '-' in biogrid_version
+
+
+def _get_version_jobs(theargs):
+    """
+    Creates one job per BioGRID version in theargs.biogridversion,
+    each in its own <datadir>/<version> directory
+    :param theargs: parsed command line arguments
+    :return: list of jobs
+    """
+    return [{'biogridversion': version, 'datadir': os.path.join(theargs.datadir, version)}
+            for version in _expand_biogrid_versions(theargs.biogridversion)]
+
+
+def _write_timing_report(job_args, results, timings, wall_time, report_file=None):
+    """
+    Prints time spent in each stage of each job and total time per stage;
+    writes the same data in JSON format to report_file if set
+    """
+    report = {'wall_time': wall_time, 'jobs': [], 'stage_totals': {}}
+
+    for args, result, job_timings in zip(job_args, results, timings):
+        report['jobs'].append({'datadir': args.datadir,
+                               'biogridversion': args.biogridversion,
+                               'status': 'SUCCESS' if result == SUCCESS else 'ERROR',
+                               'stages': [{'stage': name, 'seconds': seconds}
+                                          for name, seconds in job_timings]})
+        for name, seconds in job_timings:
+            report['stage_totals'][name] = report['stage_totals'].get(name, 0) + seconds
+
+    for job in report['jobs']:
+        print('{}\t{}\t{}'.format(job['datadir'], job['biogridversion'], job['status']))
+        for stage in job['stages']:
+            print('\t{:<25}{:10.2f}s'.format(stage['stage'], stage['seconds']))
+
+    print('Total time per stage:')
+    for name, seconds in report['stage_totals'].items():
+        print('\t{:<25}{:10.2f}s'.format(name, seconds))
+    print('Wall time: {:.2f}s'.format(wall_time))
+
+    if report_file is not None:
+        with open(report_file, 'w') as f:
+            json.dump(report, f, indent=4)
+
+
+def _get_job_arguments(theargs, job):
+    """
+    Creates arguments for a job from --jobs file by overriding command line arguments.
+    A job with a list or range of BioGRID versions becomes one job per version,
+    as with --biogridversion, see :py:func:`_get_version_jobs`
+    :param theargs: parsed command line arguments
+    :param job: dictionary of argument name -> value
+    :raises ValueError: if job sets an unknown argument, invalid range of BioGRID
+                        versions, both stream and byorganism, or no datadir is set
+                        by job or command line
+    :raises argparse.ArgumentTypeError: if job sets invalid compression
+    :return: list of arguments for jobs
+    """
+    job_args = copy.copy(theargs)
+    for name, value in job.items():
+        if name in RUNNER_ARGUMENTS or not hasattr(theargs, name):
+            raise ValueError('Unknown argument in job: ' + name)
+        if name == 'compression':
+            # values in job are not parsed by argparse
+            value = _parse_compression(value)
+        setattr(job_args, name, value)
+    job_args.jobs = None
+
+    if job_args.stream and job_args.byorganism:
+        raise ValueError('Job sets both stream and byorganism, which can not be used together: ' + str(job))
+
+    if job_args.datadir is None:
+        raise ValueError('Job sets no datadir and none is given on command line: ' + str(job))
+
+    if not _has_many_biogrid_versions(job_args.biogridversion):
+        return [job_args]
+    return [_get_job_arguments(job_args, version_job)[0]
+            for version_job in _get_version_jobs(job_args)]
+
+
+def _run_jobs(theargs, jobs):
+    """
+    Runs jobs in a shared pool of at most theargs.maxjobs threads, sharing one
+    LoaderCache that limits number of concurrent network-bound and CPU-bound stages
+    to theargs.maxnetworkstages and theargs.maxcpustages, and prints timing report
+    :param theargs: parsed command line arguments
+    :param jobs: list of dictionaries of argument name -> value
+    :return: SUCCESS if all jobs succeeded, ERROR otherwise
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    job_args = [args for job in jobs for args in _get_job_arguments(theargs, job)]
+    cache = LoaderCache(stage_limits={NETWORK_STAGE: max(1, theargs.maxnetworkstages),
+                                      CPU_STAGE: max(1, theargs.maxcpustages)})
+    timings = [[] for _ in job_args]
+
+    def run_job(index):
+        args = job_args[index]
+        loader = None
+        try:
+            loader = NDExNdexkinomeloaderLoader(args, cache=cache)
+            return loader.run()
+        except Exception:
+            logger.exception('Caught exception in job for ' + str(args.datadir))
+            return ERROR
+        finally:
+            if loader is not None:
+                timings[index] = loader.get_timings()
+
+    _import_ndex2()
+
+    start_time = time.time()
+    max_jobs = theargs.maxjobs or len(job_args)
+    with ThreadPoolExecutor(max_workers=max(1, max_jobs)) as executor:
+        results = list(executor.map(run_job, range(len(job_args))))
+
+    _write_timing_report(job_args, results, timings, time.time() - start_time,
+                         report_file=theargs.timingreport)
+
+    return SUCCESS if all(result == SUCCESS for result in results) else ERROR
 
 
 def main(args):
@@ -1016,6 +4197,11 @@ def main(args):
 
     try:
         _setup_logging(theargs)
+        if theargs.jobs is not None:
+            with open(theargs.jobs, 'r') as f:
+                return _run_jobs(theargs, json.load(f))
+        if _has_many_biogrid_versions(theargs.biogridversion):
+            return _run_jobs(theargs, _get_version_jobs(theargs))
         loader = NDExNdexkinomeloaderLoader(theargs)
         return loader.run()
     except Exception as e:
@@ -49,7 +49,8 @@ setup(
     package_dir={'ndexkinomeloader': 'ndexkinomeloader'},
     package_data={'ndexkinomeloader': ['loadplan.json',
                                        'style.cx']},
-    scripts=[ 'ndexkinomeloader/ndexloadkinome.py'],
+    scripts=[ 'ndexkinomeloader/ndexloadkinome.py',
+              'ndexkinomeloader/kinomequery.py'],
     setup_requires=setup_requirements,
     test_suite='tests',
     tests_require=test_requirements,
@@ -0,0 +1,441 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmarks of `ndexloadkinome` on generated inputs of the size of a full
+BioGRID Kinome release or larger. Every benchmark checks its result and
+prints what it measured to stderr. They take minutes and several gigabytes
+of memory, so they are only run when asked for:
+
+    NDEXKINOME_RUN_BENCHMARKS=1 python -m pytest -s tests/test_benchmarks.py
+
+or
+
+    make benchmark
+"""
+
+import os
+import re
+import sys
+import random
+import hashlib
+import tempfile
+import shutil
+import time
+import tracemalloc
+import importlib.util
+
+import unittest
+from ndex2.nice_cx_network import NiceCXNetwork
+from ndexkinomeloader import ndexloadkinome
+
+
+RUN_BENCHMARKS = os.environ.get('NDEXKINOME_RUN_BENCHMARKS') == '1'
+
+# numbers of PTM site nodes of PTM networks post-processed by benchmark;
+# network of 2 million sites takes about 4 GB of memory
+PTM_BENCHMARK_SITE_COUNTS = (1000000, 2000000)
+
+# size of generated Kinome release: genes, interactions and PTMs
+RELEASE_GENE_COUNT = 6000
+RELEASE_INTERACTION_COUNT = 200000
+RELEASE_PTM_COUNT = 100000
+
+# number of interactions of PTI network whose conversion to CX is traced by
+# memory benchmark; tracemalloc makes conversion about five times slower
+MEMORY_BENCHMARK_INTERACTION_COUNT = 50000
+
+# number of genes of GENES file gene lookup benchmark builds lookup from
+GENE_LOOKUP_BENCHMARK_GENE_COUNT = 100000
+
+# number of edges of generated CX file CX benchmarks write and read; json
+# module writes it indented in about 250 MB, and it takes about 1.5 GB of memory
+CX_BENCHMARK_EDGE_COUNT = 250000
+
+EXPERIMENTAL_SYSTEMS = (('Affinity Capture-MS', 'physical'), ('Biochemical Activity', 'physical'),
+                        ('Two-hybrid', 'physical'), ('Reconstituted Complex', 'physical'),
+                        ('PCA', 'physical'), ('Synthetic Lethality', 'genetic'),
+                        ('Dosage Rescue', 'genetic'), ('Negative Genetic', 'genetic'),
+                        ('Positive Genetic', 'genetic'), ('Phenotypic Enhancement', 'genetic'))
+
+
+def write_kinome_release(loader, gene_count=RELEASE_GENE_COUNT,
+                         interaction_count=RELEASE_INTERACTION_COUNT, ptm_count=RELEASE_PTM_COUNT):
+    """
+    Writes GENES, INTERACTIONS, PTM and PTM-RELATIONSHIPS files of a generated
+    Kinome release, with columns of the real ones and values drawn from pools
+    of genes, authors and publications, where loader reads them from
+    :param loader: :py:class:`ndexloadkinome.NDExNdexkinomeloaderLoader`
+    :param gene_count: number of genes
+    :param interaction_count: number of rows of INTERACTIONS file
+    :param ptm_count: number of rows of PTM file, and twice as many PTM relationships
+    :return:
+    """
+    rand = random.Random(0)
+    authors = ['Author{} {} ({})'.format(i, chr(65 + i % 26), 1990 + i % 30) for i in range(3000)]
+    pubmed_ids = [str(10000000 + i) for i in range(8000)]
+
+    def gene(i):
+        return [str(5000 + i), str(1000 + i), 'Y' + str(i), 'G' + str(i), 'aG{0}|bG{0}'.format(i)]
+
+    with open(loader._genes, 'w') as f:
+        f.write('#BIOGRID ID\tENTREZ GENE ID\tSYSTEMATIC NAME\tOFFICIAL SYMBOL\tSYNONYMS\t'
+                'ORGANISM ID\tORGANISM\tINTERACTION COUNT\tPTM COUNT\tCHEMICAL INTERACTION COUNT\t'
+                'SOURCE\tCATEGORY VALUES\tSUBCATEGORY VALUES\n')
+        for i in range(gene_count):
+            f.write('\t'.join(gene(i) + ['559292', 'Saccharomyces cerevisiae (S288c)',
+                                         str(rand.randint(1, 500)), str(rand.randint(0, 200)), '0',
+                                         'BIOGRID', rand.choice(('Kinase|Other', 'Phosphatase', '-')),
+                                         '-']) + '\n')
+
+    with open(loader._interactions, 'w') as f:
+        f.write('#BioGRID Interaction ID\tEntrez Gene Interactor A\tEntrez Gene Interactor B\t'
+                'BioGRID ID Interactor A\tBioGRID ID Interactor B\tSystematic Name Interactor A\t'
+                'Systematic Name Interactor B\tOfficial Symbol Interactor A\tOfficial Symbol Interactor B\t'
+                'Synonyms Interactor A\tSynonyms Interactor B\tExperimental System\t'
+                'Experimental System Type\tAuthor\tPubmed ID\tOrganism Interactor A\t'
+                'Organism Interactor B\tThroughput\tScore\tModification\tPhenotypes\t'
+                'Qualifications\tTags\tSource Database\n')
+        for i in range(interaction_count):
+            gene_a = gene(rand.randrange(gene_count))
+            gene_b = gene(rand.randrange(gene_count))
+            system, system_type = rand.choice(EXPERIMENTAL_SYSTEMS)
+            f.write('\t'.join([str(100000 + i), gene_a[1], gene_b[1], gene_a[0], gene_b[0],
+                               gene_a[2], gene_b[2], gene_a[3], gene_b[3], gene_a[4], gene_b[4],
+                               system, system_type, rand.choice(authors), rand.choice(pubmed_ids),
+                               '559292', '559292',
+                               rand.choice(('Low Throughput', 'High Throughput')),
+                               '-', '-', '-', '-', '-', 'BIOGRID']) + '\n')
+
+    with open(loader._ptm, 'w') as ptm_file, open(loader._relations, 'w') as relations_file:
+        ptm_file.write('#PTM ID\tEntrez Gene ID\tBioGRID ID\tSystematic Name\tOfficial Symbol\t'
+                       'Synonyms\tSequence\tRefseq ID\tPosition\tPost Translational Modification\t'
+                       'Residue\tAuthor\tPubmed ID\tOrganism ID\tOrganism Name\tHas Relationships\t'
+                       'Notes\tSource Database\n')
+        relations_file.write('#PTM ID\tEntrez Gene ID\tBioGRID ID\tSystematic Name\tOfficial Symbol\t'
+                             'Synonyms\tRelationship\tIdentity\tAuthor\tPubmed ID\tOrganism ID\t'
+                             'Organism Name\tSource Database\n')
+        for i in range(ptm_count):
+            target = gene(rand.randrange(gene_count))
+            ptm_file.write('\t'.join([str(200000 + i)] + target[1:2] + target[0:1] + target[2:5] +
+                                     ['MSEQ', 'NP_' + target[1], str(rand.randint(1, 1500)),
+                                      'Phosphorylation', rand.choice('STY'), rand.choice(authors),
+                                      rand.choice(pubmed_ids), '559292', 'Saccharomyces cerevisiae (S288c)',
+                                      'True', '-', 'BIOGRID']) + '\n')
+            for j in range(2):
+                kinase = gene(rand.randrange(gene_count))
+                relations_file.write('\t'.join([str(200000 + i)] + kinase[1:2] + kinase[0:1] + kinase[2:5] +
+                                               [rand.choice(('Kinase', 'Phosphatase')), 'Exact',
+                                                rand.choice(authors), rand.choice(pubmed_ids), '559292',
+                                                'Saccharomyces cerevisiae (S288c)', 'BIOGRID']) + '\n')
+
+
+def create_cx(edge_count):
+    """
+    Creates CX (list of aspect fragments) of PTI-like network with edge_count
+    edges between edge_count / 30 genes, each edge with citations,
+    experimental system, author and score
+    :param edge_count: number of edges
+    :return: list of aspect fragments
+    """
+    rand = random.Random(0)
+    node_count = max(100, edge_count // 30)
+
+    nodes = []
+    node_attributes = []
+    for i in range(node_count):
+        nodes.append({'@id': i, 'n': 'G' + str(i), 'r': 'ncbigene:' + str(1000 + i)})
+        node_attributes.append({'po': i, 'n': 'alias', 'v': ['ncbigene:' + str(1000 + i), 'Y' + str(i)],
+                                'd': 'list_of_string'})
+        node_attributes.append({'po': i, 'n': 'Interaction Count', 'v': float(rand.randint(1, 500)),
+                                'd': 'double'})
+
+    edges = []
+    edge_attributes = []
+    for i in range(edge_count):
+        edges.append({'@id': i, 's': rand.randrange(node_count), 't': rand.randrange(node_count),
+                      'i': 'interacts-with'})
+        edge_attributes.append({'po': i, 'n': 'citation', 'd': 'list_of_string',
+                                'v': ['pubmed:' + str(10000000 + rand.randrange(8000))
+                                      for j in range(rand.randint(1, 3))]})
+        edge_attributes.append({'po': i, 'n': 'Experimental System', 'd': 'list_of_string',
+                                'v': [rand.choice(EXPERIMENTAL_SYSTEMS)[0]]})
+        edge_attributes.append({'po': i, 'n': 'Author', 'd': 'list_of_string',
+                                'v': ['Author{} A ({})'.format(rand.randrange(3000), 1990 + rand.randrange(30))]})
+        edge_attributes.append({'po': i, 'n': 'Score', 'v': rand.random(), 'd': 'double'})
+
+    return [{'numberVerification': [{'longNumber': 281474976710655}]},
+            {'metaData': [{'name': name, 'version': '1.0'}
+                          for name in ('networkAttributes', 'nodes', 'nodeAttributes', 'edges', 'edgeAttributes')]},
+            {'networkAttributes': [{'n': 'name', 'v': 'benchmark'}]},
+            {'nodes': nodes}, {'nodeAttributes': node_attributes},
+            {'edges': edges}, {'edgeAttributes': edge_attributes},
+            {'status': [{'error': '', 'success': True}]}]
+
+
+def create_ptm_network(site_count):
+    """
+    Creates PTM network where a protein has site_count PTM site nodes named
+    <protein>-<residue>-<position>, each with BioGRID PTM ID attribute and
+    an incoming edge with BioGRID PTM IDs to copy onto the site node
+    :param site_count: number of PTM site nodes
+    :return: network
+    """
+    network = NiceCXNetwork()
+    network.nodes[0] = {'@id': 0, 'n': 'CDC28', 'r': 'biogrid:1'}
+    for i in range(1, site_count + 1):
+        network.nodes[i] = {'@id': i, 'n': 'CDC28-S-' + str(i), 'r': 'CDC28-S-' + str(i)}
+        network.nodeAttributes[i] = [
+            {'po': i, 'n': 'type', 'v': 'PTM site'},
+            {'po': i, 'n': 'BioGRID PTM ID', 'v': [str(i)], 'd': 'list_of_string'}]
+        network.edges[i] = {'@id': i, 's': 0, 't': i, 'i': 'has-ptm'}
+        network.edgeAttributes[i] = [
+            {'po': i, 'n': 'Author', 'v': ['A (2010)'], 'd': 'list_of_string'},
+            {'po': i, 'n': 'BioGRID PTM ID', 'v': [str(i), str(i + site_count)],
+             'd': 'list_of_string'}]
+    return network
+
+
+def postprocess_ptm_network_in_two_passes(network):
+    """
+    PTM post-processing as it was done before it was fused into
+    :py:meth:`ndexloadkinome.NDExNdexkinomeloaderLoader._postprocess_ptm_network`:
+    node names are matched and split again, then attributes of every edge and
+    of its target node are scanned for 'BioGRID PTM ID'
+    :param network:
+    :return:
+    """
+    pattern = re.compile("^([A-Za-z]+[0-9]*)-([A-Z]+)-([0-9]+|[A-Za-z]+)$")
+
+    for index, node in network.nodes.items():
+        if node['n'] and pattern.match(node['n']):
+            broken_name = node['n'].split('-')
+            if len(broken_name) == 3:
+                if broken_name[2].strip().lower() == 'undefined':
+                    node['n'] = broken_name[1] + '?'
+                else:
+                    node['n'] = broken_name[1] + broken_name[2]
+
+    for index, edge in network.edges.items():
+        biogrid_ptm_ids = None
+        for edge_attribute in network.edgeAttributes[edge['@id']]:
+            if edge_attribute['n'] and edge_attribute['n'].strip().lower() == 'biogrid ptm id':
+                if edge_attribute['v']:
+                    biogrid_ptm_ids = edge_attribute['v']
+                    break
+        if biogrid_ptm_ids:
+            for node_attribute in network.nodeAttributes[edge['t']]:
+                if node_attribute['n'] and node_attribute['n'].strip().lower() == 'biogrid ptm id':
+                    node_attribute['v'] = biogrid_ptm_ids
+                    break
+
+
+def get_ptm_network_digest(network):
+    """
+    Gets digest of names and attributes of nodes of network, in order of node ids
+    :param network:
+    :return: hex digest
+    """
+    sha256 = hashlib.sha256()
+    for node_id in sorted(network.nodes.keys()):
+        sha256.update(network.nodes[node_id]['n'].encode('utf-8'))
+        for attribute in network.nodeAttributes.get(node_id, []):
+            sha256.update(repr((attribute['n'], attribute['v'])).encode('utf-8'))
+    return sha256.hexdigest()
+
+
+@unittest.skipUnless(RUN_BENCHMARKS, 'set NDEXKINOME_RUN_BENCHMARKS=1 to run benchmarks')
+class TestBenchmarks(unittest.TestCase):
+    """Benchmarks of `ndexloadkinome` module."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        self._datadir = tempfile.mkdtemp()
+        args = ndexloadkinome._parse_arguments('hi', [self._datadir])
+        self._loader = ndexloadkinome.NDExNdexkinomeloaderLoader(args)
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+        shutil.rmtree(self._datadir)
+
+    def test_postprocess_ptm_network(self):
+        """Benchmarks fused renaming of PTM site nodes and copying of BioGRID PTM IDs
+        against the two passes it replaced: prints seconds each took and PTM sites
+        processed per second"""
+        for site_count in PTM_BENCHMARK_SITE_COUNTS:
+            seconds = {}
+            digests = {}
+            for name, postprocess in (('two passes', postprocess_ptm_network_in_two_passes),
+                                      ('fused', self._loader._postprocess_ptm_network)):
+                # one network at a time, so the largest one fits in memory
+                network = create_ptm_network(site_count)
+
+                start_time = time.time()
+                postprocess(network)
+                seconds[name] = time.time() - start_time
+
+                digests[name] = get_ptm_network_digest(network)
+                del network
+
+            self.assertEqual(digests['fused'], digests['two passes'])
+            self.assertLess(seconds['fused'], seconds['two passes'])
+            for name in ('two passes', 'fused'):
+                sys.stderr.write('{:>8} PTM sites {:<10} {:.3f}s {:>10.0f} sites/s\n'.format(
+                    site_count, name, seconds[name], site_count / seconds[name]))
+
+    def test_convert_dataframe_to_cx_peak_memory(self):
+        """Benchmarks peak memory traced by tracemalloc while PTI network is converted
+        to CX, with strings of attributes interned as rows are added against interned
+        once network is built, as it was done before: prints peak and retained
+        megabytes and seconds each took"""
+        import ndexutil.tsv.tsv2nicecx2 as t2n
+
+        def convert_then_intern(plan, dataframe):
+            network = t2n.convert_pandas_to_nice_cx_with_load_plan(dataframe, plan)
+            self._loader._intern_attributes(network)
+            return network
+
+        write_kinome_release(self._loader, interaction_count=MEMORY_BENCHMARK_INTERACTION_COUNT)
+        self._loader._build_gene_lookup()
+        self.assertEqual(self._loader._create_ppi_file(), ndexloadkinome.SUCCESS)
+        plan = self._loader._get_load_plan(self._loader._pti_load_plan)
+        dataframe = self._loader._read_network_table(self._loader._ppi_network_1, plan)
+
+        peaks = {}
+        networks = {}
+        for name, convert in (('intern after', convert_then_intern),
+                              ('intern during', self._loader._convert_dataframe_to_cx)):
+            self._loader._interner = ndexloadkinome.ValueInterner()
+
+            tracemalloc.start()
+            start_time = time.time()
+            networks[name] = convert(plan, dataframe)
+            seconds = time.time() - start_time
+            current, peaks[name] = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            sys.stderr.write('{:>8} interactions {:<14} peak {:>6.1f} MB retained {:>6.1f} MB {:.1f}s\n'.format(
+                len(dataframe), name, peaks[name] / 1e6, current / 1e6, seconds))
+
+        for aspect in ('nodes', 'edges', 'nodeAttributes', 'edgeAttributes'):
+            self.assertEqual(getattr(networks['intern during'], aspect),
+                             getattr(networks['intern after'], aspect))
+        self.assertLess(peaks['intern during'], peaks['intern after'])
+
+    def test_build_gene_lookup_cold_and_warm(self):
+        """Benchmarks building gene lookup from GENES file (cold, no saved index)
+        against opening the index saved by the cold build (warm), then looking
+        up every gene: prints seconds each took"""
+        write_kinome_release(self._loader, gene_count=GENE_LOOKUP_BENCHMARK_GENE_COUNT,
+                             interaction_count=0, ptm_count=0)
+
+        seconds = {}
+        lookups = {}
+        for name in ('cold', 'warm'):
+            args = ndexloadkinome._parse_arguments('hi', [self._datadir])
+            loader = ndexloadkinome.NDExNdexkinomeloaderLoader(args)
+
+            start_time = time.time()
+            self.assertEqual(loader._build_gene_lookup(), ndexloadkinome.SUCCESS)
+            seconds[name] = time.time() - start_time
+            lookups[name] = loader._gene_lookup
+
+            start_time = time.time()
+            for i in range(GENE_LOOKUP_BENCHMARK_GENE_COUNT):
+                lookups[name].get(str(1000 + i))
+            lookup_seconds = time.time() - start_time
+
+            sys.stderr.write('{:>8} genes {:<5} build {:.3f}s lookup of every gene {:.3f}s\n'.format(
+                GENE_LOOKUP_BENCHMARK_GENE_COUNT, name, seconds[name], lookup_seconds))
+
+        self.assertIsInstance(lookups['warm'], ndexloadkinome.GeneLookupIndex)
+        self.assertEqual(len(lookups['warm']), len(lookups['cold']))
+        for entrez_gene_id, gene_data in lookups['cold'].items():
+            self.assertEqual(lookups['warm'][entrez_gene_id], gene_data)
+        self.assertLess(seconds['warm'], seconds['cold'])
+
+    def test_compression(self):
+        """Benchmarks writing (with json module, indented) and reading CX file with
+        each codec of --compression against no compression: prints size of file,
+        seconds spent writing (and syncing to disk) and reading it, and seconds of
+        writing and reading saved or spent against no compression per megabyte
+        saved on disk"""
+        backend = ndexloadkinome.CXJsonBackend('json')
+        cx = create_cx(CX_BENCHMARK_EDGE_COUNT)
+        aspect_count = len(cx)
+
+        results = []
+        for compression in [None] + [(codec, level) for codec in sorted(ndexloadkinome.COMPRESSION_CODECS)
+                                     for level in (1, ndexloadkinome.COMPRESSION_CODECS[codec][1])]:
+            cx_file = ndexloadkinome._get_compressed_file_name(os.path.join(self._datadir, 'network.cx'),
+                                                               compression)
+            start_time = time.time()
+            backend.write_cx(cx, cx_file, compression)
+            with open(cx_file, 'rb') as f:
+                os.fsync(f.fileno())
+            write_seconds = time.time() - start_time
+
+            start_time = time.time()
+            self.assertEqual(len(backend.read_cx(cx_file)), aspect_count)
+            read_seconds = time.time() - start_time
+
+            results.append((compression, os.path.getsize(cx_file), write_seconds, read_seconds))
+            os.remove(cx_file)
+
+        uncompressed_size, uncompressed_seconds = results[0][1], results[0][2] + results[0][3]
+        for compression, size, write_seconds, read_seconds in results:
+            line = '{:<10} {:>10} bytes {:>6.1%} write {:>7.3f}s read {:>7.3f}s'.format(
+                'none' if compression is None else '{}:{}'.format(*compression),
+                size, size / uncompressed_size, write_seconds, read_seconds)
+            if compression is not None:
+                self.assertLess(size, uncompressed_size)
+                line += ' {:+.3f}s per MB saved'.format(
+                    (write_seconds + read_seconds - uncompressed_seconds) / ((uncompressed_size - size) / 1e6))
+            sys.stderr.write(line + '\n')
+
+    def test_json_backends(self):
+        """Benchmarks writing CX file with each installed JSON backend and
+        reading network from it: prints size of file and seconds spent writing
+        and reading. Then reads network from file json module wrote with json
+        module and with ijson under tracemalloc, and prints peak memory of each"""
+        cx = create_cx(CX_BENCHMARK_EDGE_COUNT)
+        cx_file = os.path.join(self._datadir, 'network.cx')
+
+        for name in ndexloadkinome.JSON_BACKENDS:
+            backend = ndexloadkinome.CXJsonBackend(name)
+            if backend.get_name() != name:
+                sys.stderr.write('{:<6} not installed\n'.format(name))
+                continue
+            start_time = time.time()
+            backend.write_cx(cx, cx_file)
+            write_seconds = time.time() - start_time
+
+            start_time = time.time()
+            network = backend.read_nice_cx(cx_file)
+            read_seconds = time.time() - start_time
+            self.assertEqual(len(network.edges), CX_BENCHMARK_EDGE_COUNT)
+            del network
+
+            sys.stderr.write('{:<6} {:>10} bytes write {:>7.3f}s read {:>7.3f}s\n'.format(
+                name, os.path.getsize(cx_file), write_seconds, read_seconds))
+
+        ndexloadkinome.CXJsonBackend('json').write_cx(cx, cx_file)
+        del cx
+        peaks = {}
+        for name in ('json', ndexloadkinome.INCREMENTAL_JSON_BACKEND):
+            backend = ndexloadkinome.CXJsonBackend(name)
+            tracemalloc.start()
+            try:
+                start_time = time.time()
+                network = backend.read_nice_cx(cx_file)
+                seconds = time.time() - start_time
+                peaks[name] = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            self.assertEqual(len(network.edges), CX_BENCHMARK_EDGE_COUNT)
+            del network
+            sys.stderr.write('{:<6} read of {} bytes peak {:>6.0f} MB (traced {:.3f}s)\n'.format(
+                name, os.path.getsize(cx_file), peaks[name] / 1e6, seconds))
+
+        if importlib.util.find_spec(ndexloadkinome.INCREMENTAL_JSON_BACKEND) is not None:
+            self.assertLess(peaks[ndexloadkinome.INCREMENTAL_JSON_BACKEND], peaks['json'])
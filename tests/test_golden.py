@@ -0,0 +1,302 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Regression tests running `ndexloadkinome` offline on fixed synthetic Kinome files
+in tests/data/golden/input and checking that:
+
+* PTI, PTM and merged networks are equal to canonical golden copies
+  in tests/data/golden/expected, ignoring node and edge ids and their order
+* every stage stays within time and peak memory budgets in
+  tests/data/golden/budgets.json
+
+When a change is meant to alter the networks, rewrite golden copies with
+
+    NDEXKINOME_UPDATE_GOLDEN=1 python -m pytest tests/test_golden.py
+
+and review their diff. Budgets are edited by hand. Time budgets depend on
+the machine, so by default stages only have to stay within TIME_BUDGET_MARGIN
+times their budget, which catches a stage becoming an order of magnitude
+slower on any machine. On a known machine, check the budgets themselves with
+
+    NDEXKINOME_CHECK_TIME_BUDGETS=1 python -m pytest tests/test_golden.py
+"""
+
+import os
+import sys
+import json
+import tempfile
+import shutil
+import subprocess
+import importlib.util
+import tracemalloc
+from contextlib import contextmanager
+
+import unittest
+from ndexkinomeloader import ndexloadkinome
+
+
+GOLDEN_DIR = os.path.join(os.path.dirname(__file__), 'data', 'golden')
+INPUT_DIR = os.path.join(GOLDEN_DIR, 'input')
+EXPECTED_DIR = os.path.join(GOLDEN_DIR, 'expected')
+BUDGETS_FILE = os.path.join(GOLDEN_DIR, 'budgets.json')
+
+NETWORK_NAMES = ('pti_1', 'ptm_2', 'merged_3')
+
+# network attributes that change with version of the loader or with its run
+IGNORED_NETWORK_ATTRIBUTES = ('prov:wasGeneratedBy', ndexloadkinome.CONTENT_HASH)
+
+UPDATE_GOLDEN = os.environ.get('NDEXKINOME_UPDATE_GOLDEN') == '1'
+CHECK_TIME_BUDGETS = os.environ.get('NDEXKINOME_CHECK_TIME_BUDGETS') == '1'
+
+# factor time budgets are multiplied by unless NDEXKINOME_CHECK_TIME_BUDGETS=1,
+# so slow or busy machines pass
+TIME_BUDGET_MARGIN = 1 if CHECK_TIME_BUDGETS else 10
+
+
+def canonicalize_network(network):
+    """
+    Gets form of network that does not depend on node and edge ids or order:
+    nodes are identified by name and represents, and nodes, edges and
+    attributes are sorted
+    :param network:
+    :type network: :py:class:`ndex2.nice_cx_network.NiceCXNetwork`
+    :return: dictionary that can be written as JSON
+    """
+    def get_attributes(attribute_list):
+        return sorted([attribute['n'], attribute['v'], attribute.get('d', 'string')]
+                      for attribute in attribute_list)
+
+    node_keys = {node_id: [node['n'], node.get('r')] for node_id, node in network.nodes.items()}
+
+    nodes = sorted([node_keys[node_id], get_attributes(network.nodeAttributes.get(node_id, []))]
+                   for node_id in network.nodes)
+
+    edges = sorted([node_keys[edge['s']], edge.get('i'), node_keys[edge['t']],
+                    get_attributes(network.edgeAttributes.get(edge_id, []))]
+                   for edge_id, edge in network.edges.items())
+
+    network_attributes = sorted([attribute['n'], attribute['v']]
+                                for attribute in network.networkAttributes
+                                if attribute['n'] not in IGNORED_NETWORK_ATTRIBUTES)
+
+    return {'networkAttributes': network_attributes,
+            'nodes': nodes,
+            'edges': edges,
+            'opaqueAspects': sorted(network.opaqueAspects.keys())}
+
+
+def write_canonical_network(canonical_network, file_path):
+    """
+    Writes canonical network as JSON with one node, edge or network
+    attribute per line, so changes to golden copies are easy to review
+    :param canonical_network: see :py:func:`canonicalize_network`
+    :param file_path: path to file
+    :return:
+    """
+    with open(file_path, 'w') as f:
+        f.write('{\n')
+        for index, (key, values) in enumerate(sorted(canonical_network.items())):
+            f.write(json.dumps(key) + ': [\n')
+            f.write(',\n'.join(json.dumps(value) for value in values))
+            f.write('\n]' + (',' if index < len(canonical_network) - 1 else '') + '\n')
+        f.write('}\n')
+
+
+class OfflineLoader(ndexloadkinome.NDExNdexkinomeloaderLoader):
+    """
+    Loader that runs without NDEx server: style comes from the packaged
+    style file, there are no networks on the server, and uploads are skipped
+    (paths of CX files that would be uploaded are recorded in uploaded_files).
+    Records peak memory allocated by every stage while tracemalloc is tracing
+    """
+    def __init__(self, args):
+        super(OfflineLoader, self).__init__(args)
+        self.peak_memory = {}
+        self.uploaded_files = []
+
+    def _parse_config(self):
+        pass
+
+    def _create_ndex_connection(self):
+        pass
+
+    def _get_network_summaries_from_NDEx_server(self):
+        return [], ndexloadkinome.SUCCESS
+
+    def _upload_CX(self, path_to_network_in_CX, network_UUID=None):
+        self.uploaded_files.append(path_to_network_in_CX)
+        return ndexloadkinome.SUCCESS
+
+    @contextmanager
+    def _stage(self, name, kind=ndexloadkinome.CPU_STAGE):
+        with super(OfflineLoader, self)._stage(name, kind):
+            if not tracemalloc.is_tracing():
+                yield
+                return
+
+            tracemalloc.reset_peak()
+            start_memory = tracemalloc.get_traced_memory()[0]
+            try:
+                yield
+            finally:
+                self.peak_memory[name] = tracemalloc.get_traced_memory()[1] - start_memory
+
+
+class TestGolden(unittest.TestCase):
+    """Golden output and budget tests for `ndexloadkinome` module."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        self._datadir = tempfile.mkdtemp()
+        for file_name in os.listdir(INPUT_DIR):
+            shutil.copy(os.path.join(INPUT_DIR, file_name), self._datadir)
+
+        with open(BUDGETS_FILE, 'r') as f:
+            self._budgets = json.load(f)
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+        shutil.rmtree(self._datadir)
+
+    def _run_loader(self, trace_memory=False, extra_args=()):
+        args = ndexloadkinome._parse_arguments('hi', [self._datadir, '--skipdownload'] + list(extra_args))
+        loader = OfflineLoader(args)
+
+        if trace_memory:
+            # tracemalloc counts allocations of all threads, so stages the loader runs
+            # in background threads are run before tracing starts; otherwise they
+            # would count towards stages running in the main thread at the same time
+            loader._load_style_template()
+            summaries = loader._get_network_summaries()
+            loader._load_style_template = lambda: None
+            loader._get_network_summaries = lambda: summaries
+            tracemalloc.start()
+        try:
+            self.assertEqual(loader.run(), ndexloadkinome.SUCCESS)
+        finally:
+            if trace_memory:
+                tracemalloc.stop()
+
+        return loader
+
+    def _check_networks_match_golden(self, extra_args=(), update_golden=False):
+        import ndex2
+
+        loader = self._run_loader(extra_args=extra_args)
+
+        for file_name, cx_file in zip(NETWORK_NAMES, (loader._cx_pti, loader._cx_ptm, loader._cx_merged)):
+            network = ndex2.create_nice_cx_from_file(cx_file)
+            # round trip through JSON so tuples and lists compare equal
+            actual = json.loads(json.dumps(canonicalize_network(network)))
+            golden_file = os.path.join(EXPECTED_DIR, file_name + '.json')
+
+            if update_golden:
+                write_canonical_network(actual, golden_file)
+                continue
+
+            with open(golden_file, 'r') as f:
+                expected = json.load(f)
+
+            self.assertEqual(actual['networkAttributes'], expected['networkAttributes'], file_name)
+            self.assertEqual(actual['opaqueAspects'], expected['opaqueAspects'], file_name)
+            self.assertEqual(len(actual['nodes']), len(expected['nodes']), file_name)
+            self.assertEqual(len(actual['edges']), len(expected['edges']), file_name)
+            for actual_node, expected_node in zip(actual['nodes'], expected['nodes']):
+                self.assertEqual(actual_node, expected_node, file_name)
+            for actual_edge, expected_edge in zip(actual['edges'], expected['edges']):
+                self.assertEqual(actual_edge, expected_edge, file_name)
+
+    def test_networks_match_golden(self):
+        """Tests that networks built from fixtures are equal to golden copies"""
+        self._check_networks_match_golden(update_golden=UPDATE_GOLDEN)
+
+    def test_parquet_networks_match_golden(self):
+        """Tests that networks built from network tables in Parquet format
+        are equal to golden copies"""
+        if importlib.util.find_spec('pyarrow') is None:
+            self.skipTest('pyarrow is not installed')
+
+        self._check_networks_match_golden(extra_args=['--tableformat', 'parquet'])
+
+    def test_compression_of_files_extracted_uncompressed(self):
+        """Tests that with --skipdownload files extracted without compression are
+        read when --compression asks for compressed ones"""
+        self._check_networks_match_golden(extra_args=['--compression', 'extracted=gzip'])
+
+    def test_skipdownload_without_extracted_file(self):
+        """Tests that with --skipdownload missing GENES file fails the run"""
+        os.remove(os.path.join(self._datadir, 'BIOGRID-PROJECT-kinome_project_sc-GENES-3.5.177.projectindex.txt'))
+
+        args = ndexloadkinome._parse_arguments('hi', [self._datadir, '--skipdownload',
+                                                      '--compression', 'extracted=gzip'])
+        loader = OfflineLoader(args)
+        self.assertEqual(loader.run(), ndexloadkinome.ERROR)
+        self.assertEqual(loader.uploaded_files, [])
+
+    def test_run_in_new_interpreter(self):
+        """Tests that loader runs in interpreter that has not imported ndex2,
+        where its threads import ndex2 for the first time"""
+        code = ('import sys\n'
+                'from tests.test_golden import OfflineLoader\n'
+                'from ndexkinomeloader import ndexloadkinome\n'
+                'args = ndexloadkinome._parse_arguments("hi", [sys.argv[1], "--skipdownload"])\n'
+                'sys.exit(OfflineLoader(args).run())\n')
+        result = subprocess.run([sys.executable, '-c', code, self._datadir],
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.assertEqual(result.returncode, ndexloadkinome.SUCCESS, result.stderr.decode())
+
+    def test_organism_without_interactions(self):
+        """Tests that in --byorganism mode organism with PTMs but no interactions
+        gets its networks built and uploaded with networks of other organisms"""
+        ptm_file = os.path.join(self._datadir, 'BIOGRID-PROJECT-kinome_project_sc-PTM-3.5.177.ptmtab.txt')
+        with open(ptm_file, 'a') as f:
+            f.write('\t'.join(['79999', '1012', '5012', 'YG12', 'G12', '-', 'MSEQ', 'NP_0', '-',
+                               'Phosphorylation', 'S', 'Smith J (2010)', '104', '10090', 'Org',
+                               'False', '-', 'BIOGRID']) + '\n')
+
+        loader = self._run_loader(extra_args=['--byorganism'])
+
+        merged_file = os.path.join(self._datadir, 'organism-10090', os.path.basename(loader._cx_merged))
+        self.assertIn(merged_file, loader.uploaded_files)
+        self.assertEqual(len(loader.uploaded_files), 3 * len([name for name in os.listdir(self._datadir)
+                                                              if name.startswith('organism-')]))
+
+    def test_organism_stages_without_ptm_file(self):
+        """Tests that in --byorganism mode missing PTM file fails the run
+        instead of raising when network files are partitioned"""
+        os.remove(os.path.join(self._datadir, 'BIOGRID-PROJECT-kinome_project_sc-PTM-3.5.177.ptmtab.txt'))
+
+        args = ndexloadkinome._parse_arguments('hi', [self._datadir, '--skipdownload', '--byorganism'])
+        loader = OfflineLoader(args)
+        self.assertEqual(loader.run(), ndexloadkinome.ERROR)
+        self.assertEqual(loader.uploaded_files, [])
+
+    def test_stage_time_budgets(self):
+        """Tests that every stage takes less time than its budget times
+        TIME_BUDGET_MARGIN"""
+        # best of several runs, so a busy machine does not fail the test
+        best_timings = {}
+        for i in range(3):
+            for name, seconds in self._run_loader().get_timings():
+                best_timings[name] = min(seconds, best_timings.get(name, seconds))
+
+        budgets = self._budgets['seconds']
+        self.assertEqual(sorted(best_timings.keys()), sorted(budgets.keys()))
+        for name, seconds in best_timings.items():
+            self.assertLessEqual(seconds, budgets[name] * TIME_BUDGET_MARGIN,
+                                 'stage {} took {:.3f} seconds'.format(name, seconds))
+
+    def test_stage_memory_budgets(self):
+        """Tests that every stage run in the main thread allocates less memory
+        at its peak than its budget"""
+        # first run imports modules stages import lazily, which is not counted
+        self._run_loader()
+        loader = self._run_loader(trace_memory=True)
+
+        budgets = self._budgets['peak_memory_bytes']
+        self.assertEqual(sorted(loader.peak_memory.keys()), sorted(budgets.keys()))
+        for name, peak_memory in loader.peak_memory.items():
+            self.assertLessEqual(peak_memory, budgets[name],
+                                 'stage {} allocated {} bytes at its peak'.format(name, peak_memory))
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `kinomequery` module."""
+
+import os
+import json
+import tempfile
+import shutil
+
+import unittest
+from ndex2.nice_cx_network import NiceCXNetwork
+from ndexkinomeloader import kinomequery
+from ndexkinomeloader import ndexloadkinome
+
+
+class TestKinomequery(unittest.TestCase):
+    """Tests for `kinomequery` module."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        network = NiceCXNetwork()
+        network.set_name('merged')
+
+        self._cdc28 = network.create_node('CDC28', 'biogrid:31')
+        self._sic1 = network.create_node('SIC1', 'biogrid:32')
+        self._cln2 = network.create_node('CLN2', 'biogrid:33')
+        for node_id in (self._cdc28, self._sic1, self._cln2):
+            network.set_node_attribute(node_id, 'type', 'protein')
+        network.set_node_attribute(self._cdc28, 'alias', ['ncbigene:852457', 'YBR160W'],
+                                   type='list_of_string')
+
+        self._site = network.create_node('S19', 'SIC1-S-19')
+        network.set_node_attribute(self._site, 'type', 'ptm')
+        network.set_node_attribute(self._site, 'BioGRID PTM ID', ['70000', '70001'],
+                                   type='list_of_string')
+
+        network.create_edge(self._cdc28, self._sic1, 'interacts-with')
+        network.create_edge(self._cln2, self._cdc28, 'interacts-with')
+        self._ptm_edge = network.create_edge(self._sic1, self._site,
+                                             'has-post-translational-modification-on')
+        network.set_edge_attribute(self._ptm_edge, 'BioGRID PTM ID', ['70000'],
+                                   type='list_of_string')
+        network.create_edge(self._cdc28, self._site, ndexloadkinome.PTM_RELATIONSHIP_PREDICATE)
+
+        self._network = network
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+
+    def test_find_nodes(self):
+        query_index = kinomequery.KinomeQueryIndex(self._network)
+        self.assertEqual(query_index.find_nodes('cdc28'), [self._cdc28])
+        self.assertEqual(query_index.find_nodes('YBR160W'), [self._cdc28])
+        self.assertEqual(query_index.find_nodes('70001'), [self._site])
+        self.assertEqual(query_index.find_nodes('70001', node_type='protein'), [])
+        self.assertEqual(query_index.find_nodes('unknown'), [])
+
+    def test_get_neighborhood(self):
+        query_index = kinomequery.KinomeQueryIndex(self._network)
+        self.assertEqual(query_index.get_neighborhood('SIC1', hops=0), [self._sic1])
+        self.assertEqual(sorted(query_index.get_neighborhood('SIC1')),
+                         [self._cdc28, self._sic1, self._site])
+        self.assertEqual(sorted(query_index.get_neighborhood('SIC1', hops=2)),
+                         [self._cdc28, self._sic1, self._cln2, self._site])
+
+    def test_get_ptm_sites(self):
+        query_index = kinomequery.KinomeQueryIndex(self._network)
+        self.assertEqual(query_index.get_ptm_sites('SIC1'), [self._site])
+        # CDC28 only has a relationship with the site
+        self.assertEqual(query_index.get_ptm_sites('CDC28'), [])
+
+    def test_write_subnetwork(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            query_index = kinomequery.KinomeQueryIndex(self._network)
+            cx_file = os.path.join(temp_dir, 'sub.cx')
+            query_index.write_subnetwork([self._sic1, self._site], cx_file, name='SIC1 sites')
+
+            subnetwork = kinomequery.load_query_index(cx_file).get_network()
+            self.assertEqual(subnetwork.get_name(), 'SIC1 sites')
+            self.assertEqual(sorted(subnetwork.nodes.keys()), [self._sic1, self._site])
+            self.assertEqual(list(subnetwork.edges.keys()), [self._ptm_edge])
+            self.assertEqual(subnetwork.get_edge_attribute(self._ptm_edge, 'BioGRID PTM ID')['v'],
+                             ['70000'])
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_main(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            cx_file = os.path.join(temp_dir, 'merged_3.cx')
+            with open(cx_file, 'w') as f:
+                json.dump(self._network.to_cx(), f)
+            out_file = os.path.join(temp_dir, 'out.cx')
+
+            res = kinomequery.main(['kinomequery.py', cx_file, 'CLN2',
+                                    '--hops', '2', '--output', out_file])
+            self.assertEqual(res, kinomequery.SUCCESS)
+            self.assertTrue(os.path.isfile(out_file))
+
+            for json_backend in ndexloadkinome.JSON_BACKENDS + (ndexloadkinome.INCREMENTAL_JSON_BACKEND,):
+                os.remove(out_file)
+                res = kinomequery.main(['kinomequery.py', cx_file, 'CLN2', '--output', out_file,
+                                        '--jsonbackend', json_backend])
+                self.assertEqual(res, kinomequery.SUCCESS)
+                subnetwork = kinomequery.load_query_index(out_file).get_network()
+                self.assertEqual(subnetwork.get_name(), 'CLN2 subnetwork')
+                self.assertTrue(self._cln2 in subnetwork.nodes)
+
+            res = kinomequery.main(['kinomequery.py', os.path.join(temp_dir, 'none.cx'), 'CLN2'])
+            self.assertEqual(res, kinomequery.ERROR)
+        finally:
+            shutil.rmtree(temp_dir)
@@ -4,14 +4,34 @@
 """Tests for `ndexkinomeloader` package."""
 
 import os
+import sys
+import argparse
+import json
 import tempfile
 import shutil
+import subprocess
+import threading
+import time
+import zipfile
+import importlib.util
+from contextlib import contextmanager
 
 import unittest
+import ndex2
 from ndexutil.config import NDExUtilConfig
+from ndex2.nice_cx_network import NiceCXNetwork
 from ndexkinomeloader import ndexloadkinome
 
 
+# upper bound, in microseconds, on cumulative time to import ndexloadkinome
+# module as reported by python -X importtime; heavy dependencies take longer
+IMPORT_TIME_BUDGET = 300000
+
+# allowed growth of number of lines of loader code PTM relationship
+# join runs when input grows 8 times; a quadratic join grows 64 times
+PTM_RELATIONSHIPS_SCALING_BUDGET = 9
+
+
 class TestNdexkinomeloader(unittest.TestCase):
     """Tests for `ndexkinomeloader` package."""
 
@@ -107,3 +127,1297 @@ format=%(asctime)s %(name)-12s %(levelname)-8s %(message)s""")
             self.assertEqual(res, 0)
         finally:
             shutil.rmtree(temp_dir)
+
+    def test_intern_attributes(self):
+        """Tests that repeated attribute names and values are shared"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            args = ndexloadkinome._parse_arguments('hi', [temp_dir])
+            loader = ndexloadkinome.NDExNdexkinomeloaderLoader(args)
+
+            network = NiceCXNetwork()
+            for i in range(2):
+                edge_id = network.create_edge(edge_source=0, edge_target=1,
+                                              edge_interaction=''.join(['interacts', '-with']))
+                network.set_edge_attribute(edge_id, ''.join(['cit', 'ation']),
+                                           [''.join(['pubmed:', '123'])],
+                                           type='list_of_string')
+
+            loader._intern_attributes(network)
+
+            attr_0 = network.get_edge_attributes(0)[0]
+            attr_1 = network.get_edge_attributes(1)[0]
+            self.assertIs(attr_0['n'], attr_1['n'])
+            self.assertIs(attr_0['v'][0], attr_1['v'][0])
+            self.assertIs(network.edges[0]['i'], network.edges[1]['i'])
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_convert_dataframe_to_cx(self):
+        """Tests that converting dataframe to CX while interning attributes of
+        batches of rows gives the same network as t2n, with strings shared
+        across batches"""
+        import pandas as pd
+        import ndexutil.tsv.tsv2nicecx2 as t2n
+
+        temp_dir = tempfile.mkdtemp()
+        intern_batch_size = ndexloadkinome.INTERN_BATCH_SIZE
+        try:
+            args = ndexloadkinome._parse_arguments('hi', [temp_dir])
+            loader = ndexloadkinome.NDExNdexkinomeloaderLoader(args)
+
+            plan = {'source_plan': {'node_name_column': 'A',
+                                    'property_columns': [
+                                        {'column_name': 'Alias', 'data_type': 'list_of_string',
+                                         'delimiter': '|'}]},
+                    'target_plan': {'node_name_column': 'B'},
+                    'edge_plan': {'default_predicate': 'interacts-with',
+                                  'property_columns': ['C']}}
+            dataframe = pd.DataFrame([['x', 'y', 'alpha|beta', '1'], ['y', 'z', 'beta', '1'],
+                                      ['x', 'z', 'alpha|beta', '2'], ['z', 'w', 'gamma', '1'],
+                                      ['w', 'x', 'alpha|gamma', '2']],
+                                     columns=['A', 'B', 'Alias', 'C'])
+
+            ndexloadkinome.INTERN_BATCH_SIZE = 2
+            network = loader._convert_dataframe_to_cx(plan, dataframe)
+            expected = t2n.convert_pandas_to_nice_cx_with_load_plan(dataframe, plan)
+
+            self.assertEqual(network.nodes, expected.nodes)
+            self.assertEqual(network.edges, expected.edges)
+            self.assertEqual(network.nodeAttributes, expected.nodeAttributes)
+            self.assertEqual(network.edgeAttributes, expected.edgeAttributes)
+
+            # aliases split from rows of the first and the last batch
+            aliases = {}
+            for node_id, attributes in network.nodeAttributes.items():
+                aliases[network.nodes[node_id]['n']] = attributes[0]['v']
+            self.assertEqual(aliases['x'], ['alpha', 'beta'])
+            self.assertEqual(aliases['w'], ['alpha', 'gamma'])
+            self.assertIs(aliases['x'][0], aliases['w'][0])
+        finally:
+            ndexloadkinome.INTERN_BATCH_SIZE = intern_batch_size
+            shutil.rmtree(temp_dir)
+
+    def test_merge_attribute_lists(self):
+        """Tests that merging attributes of a group of edges at once gives the
+        same result as merging them one by one"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            args = ndexloadkinome._parse_arguments('hi', [temp_dir, '--memoryreport',
+                                                          os.path.join(temp_dir, 'memory.json')])
+            loader = ndexloadkinome.NDExNdexkinomeloaderLoader(args)
+
+            def create_attribute_lists():
+                lists = []
+                for i in range(4):
+                    lists.append([
+                        {'po': i, 'n': 'citation', 'v': [''.join(['pubmed:', str(i % 2)]), 'pubmed:9'],
+                         'd': 'list_of_string'},
+                        {'po': i, 'n': 'Author', 'v': 'A' if i != 2 else '', 'd': 'string'},
+                        {'po': i, 'n': 'Score', 'v': float(i % 2)},
+                        {'po': i, 'n': 'Has Relationships', 'v': [i == 3], 'd': 'list_of_boolean'}])
+                lists[0].append({'po': 0, 'n': 'Notes', 'v': ['', 'x'], 'd': 'list_of_string'})
+                return lists
+
+            expected = create_attribute_lists()
+            for attribute_list in expected[1:]:
+                loader._merge_attributes(expected[0], attribute_list)
+
+            merged = create_attribute_lists()
+            loader._merge_attribute_lists(merged[0], merged[1:])
+
+            self.assertEqual(merged[0], expected[0])
+            self.assertEqual(merged[0][0]['v'], ['pubmed:0', 'pubmed:9', 'pubmed:1'])
+            self.assertEqual(merged[0][1], {'po': 0, 'n': 'Author', 'v': ['A'], 'd': 'list_of_string'})
+            self.assertEqual(merged[0][2]['v'], [1.0])
+            self.assertEqual(merged[0][3]['v'], [False])
+            self.assertEqual(merged[0][4]['v'], ['', 'x'])
+
+            network = NiceCXNetwork()
+            network.create_edge(0, 1, 'interacts-with')
+            network.edgeAttributes[0] = merged[0]
+            loader._write_memory_report(network, args.memoryreport)
+            with open(args.memoryreport, 'r') as f:
+                report = json.load(f)
+            self.assertEqual(report['edges'], 1)
+            self.assertEqual(report['attributes'], 5)
+            self.assertEqual(report['string values'], 6)
+            self.assertLessEqual(report['string bytes'], report['string bytes without interning'])
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_generate_cx_file_in_chunks_and_shards(self):
+        """Tests that chunked and sharded CX generation match reading whole file"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            plan_file = os.path.join(temp_dir, 'plan.json')
+            with open(plan_file, 'w') as f:
+                json.dump({'source_plan': {'node_name_column': 'A',
+                                           'property_columns': [
+                                               {'column_name': 'D', 'data_type': 'list_of_string',
+                                                'delimiter': '|'}]},
+                           'target_plan': {'node_name_column': 'B',
+                                           'property_columns': [
+                                               {'column_name': 'E', 'data_type': 'double'}]},
+                           'edge_plan': {'default_predicate': 'interacts-with',
+                                         'property_columns': ['C']}}, f)
+
+            tsv_file = os.path.join(temp_dir, 'network.txt')
+            with open(tsv_file, 'w') as f:
+                f.write('A\tB\tC\tD\tE\n')
+                for row in [('x', 'y', '1', 'x1|x2', '0.5'), ('y', 'z', '2', 'y1', '1.5'),
+                            ('x', 'z', '3', 'x1|x2', '1.5'), ('z', 'w', '4', 'z1', '2.5'),
+                            ('w', 'x', '5', 'w1|w2', '3.5')]:
+                    f.write('\t'.join(row) + '\n')
+
+            args = ndexloadkinome._parse_arguments('hi', [temp_dir])
+            loader = ndexloadkinome.NDExNdexkinomeloaderLoader(args)
+            network, status = loader._generate_CX_file(plan_file, tsv_file)
+            self.assertEqual(status, ndexloadkinome.SUCCESS)
+            self.assertEqual(sum(len(attributes) for attributes in network.nodeAttributes.values()), 8)
+
+            for extra_args in (['--chunksize', '2'], ['--workers', '2'],
+                               ['--workers', '2', '--chunksize', '2']):
+                args = ndexloadkinome._parse_arguments('hi', [temp_dir] + extra_args)
+                loader = ndexloadkinome.NDExNdexkinomeloaderLoader(args)
+                other_network, status = loader._generate_CX_file(plan_file, tsv_file)
+                self.assertEqual(status, ndexloadkinome.SUCCESS)
+
+                self.assertEqual(network.nodes, other_network.nodes)
+                self.assertEqual(network.edges, other_network.edges)
+                self.assertEqual(network.edgeAttributes, other_network.edgeAttributes)
+                self.assertEqual(network.nodeAttributes, other_network.nodeAttributes)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_parquet_network_tables(self):
+        """Tests that network table in Parquet format has typed columns and gives
+        the same network as its TSV file"""
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            self.skipTest('pyarrow is not installed')
+
+        temp_dir = tempfile.mkdtemp()
+        try:
+            plan = {'source_plan': {'node_name_column': 'A',
+                                    'property_columns': [
+                                        {'column_name': 'Count', 'data_type': 'double'},
+                                        {'column_name': 'Score', 'data_type': 'double'},
+                                        {'column_name': 'Alias', 'data_type': 'list_of_string',
+                                         'delimiter': '|'}]},
+                    'target_plan': {'node_name_column': 'B',
+                                    'property_columns': [
+                                        {'column_name': 'Other', 'data_type': 'integer'}]},
+                    'edge_plan': {'default_predicate': 'interacts-with',
+                                  'property_columns': ['Alias', 'Count']}}
+            plan_file = os.path.join(temp_dir, 'plan.json')
+            with open(plan_file, 'w') as f:
+                json.dump(plan, f)
+
+            # Count is also read as string by edge plan, so it is not typed
+            self.assertEqual(ndexloadkinome._get_table_column_types(plan),
+                             {'Score': ('double', None), 'Alias': ('list', '|'),
+                              'Other': ('integer', None)})
+            self.assertEqual(ndexloadkinome._get_plan_columns(plan),
+                             {'A', 'B', 'Count', 'Score', 'Alias', 'Other'})
+
+            header = ['A', 'B', 'Count', 'Score', 'Alias', 'Other', 'Unused']
+            rows = [['x', 'y', '1', '1.5', 'a|b', '7', 'u'],
+                    ['y', 'z', '', '', '', 'n/a', 'u'],
+                    ['x', 'z', '3', '2', 'c', '', 'u']]
+
+            args = ndexloadkinome._parse_arguments('hi', [temp_dir, '--tableformat', 'parquet'])
+            loader = ndexloadkinome.NDExNdexkinomeloaderLoader(args)
+            self.assertTrue(loader._ppi_network_1.endswith('ppi_network_1-3.5.177-ndexkinomeloader.parquet'))
+
+            tsv_file = os.path.join(temp_dir, 'network.txt')
+            parquet_file = os.path.join(temp_dir, 'network.parquet')
+            for network_table in (tsv_file, parquet_file):
+                with loader._open_network_table(network_table, plan_file) as write_row:
+                    write_row(header)
+                    for row in rows:
+                        write_row(list(row))
+
+            schema = pq.read_schema(parquet_file)
+            self.assertEqual([str(schema.field(name).type) for name in header],
+                             ['string', 'string', 'string', 'double', 'list<element: string>',
+                              'string', 'string'])
+            self.assertEqual(pq.read_table(parquet_file).column('Alias').to_pylist(),
+                             [['a', 'b'], [], ['c']])
+
+            # read back as strings that parse to the same values, plan columns only
+            dataframe = loader._read_network_table(parquet_file, plan)
+            self.assertEqual(list(dataframe.columns), header[:-1])
+            self.assertEqual(dataframe['Alias'].tolist(), ['a|b', '', 'c'])
+            self.assertEqual([float(v) if v else None for v in dataframe['Score']], [1.5, None, 2.0])
+
+            for extra_args in ([], ['--chunksize', '2'], ['--workers', '2']):
+                args = ndexloadkinome._parse_arguments('hi', [temp_dir] + extra_args)
+                loader = ndexloadkinome.NDExNdexkinomeloaderLoader(args)
+                network, status = loader._generate_CX_file(plan_file, tsv_file)
+                parquet_network, status = loader._generate_CX_file(plan_file, parquet_file)
+                self.assertEqual(status, ndexloadkinome.SUCCESS)
+
+                self.assertEqual(parquet_network.nodes, network.nodes)
+                self.assertEqual(parquet_network.nodeAttributes, network.nodeAttributes)
+                self.assertEqual(parquet_network.edges, network.edges)
+                self.assertEqual(parquet_network.edgeAttributes, network.edgeAttributes)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_parquet_table_row_groups(self):
+        """Tests that network table in Parquet format is written a row group at a
+        time, widening columns later row groups do not convert to, and read back
+        in chunks"""
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            self.skipTest('pyarrow is not installed')
+
+        temp_dir = tempfile.mkdtemp()
+        try:
+            header = ['A', 'Score', 'Other', 'Alias']
+            rows = [['x', '1', '7', 'a|b'], ['y', '', '8', ''],
+                    ['z', '2.5', '9', 'c'], ['w', '3', '10', 'd|e'],
+                    ['v', 'n/a', 'n/a', 'f']]
+            column_types = {'Score': ('double', None), 'Other': ('integer', None),
+                            'Alias': ('list', '|')}
+
+            parquet_file = os.path.join(temp_dir, 'network.parquet')
+            with open(parquet_file, 'wb') as f:
+                writer = ndexloadkinome.ParquetTableWriter(f, column_types, row_group_size=2)
+                writer.write_row(header)
+                for index, row in enumerate(rows):
+                    # first row group is written as soon as it is full
+                    self.assertEqual(f.tell() > 0, index >= 2)
+                    writer.write_row(row)
+                writer.close()
+
+            parquet = pq.ParquetFile(parquet_file)
+            self.assertEqual(parquet.metadata.num_row_groups, 3)
+            self.assertEqual([str(parquet.schema_arrow.field(name).type) for name in header],
+                             ['string', 'string', 'string', 'list<element: string>'])
+
+            dataframe = ndexloadkinome._read_parquet_table(parquet_file)
+            self.assertEqual(dataframe.values.tolist(), [['x', '1', '7', 'a|b'], ['y', '', '8', ''],
+                                                         ['z', '2.5', '9', 'c'], ['w', '3', '10', 'd|e'],
+                                                         ['v', 'n/a', 'n/a', 'f']])
+
+            chunks = list(ndexloadkinome._read_parquet_table(parquet_file, columns={'A', 'Alias'},
+                                                             chunksize=2))
+            self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+            self.assertEqual([chunk.values.tolist() for chunk in chunks],
+                             [[['x', 'a|b'], ['y', '']], [['z', 'c'], ['w', 'd|e']], [['v', 'f']]])
+
+            # widened to double only
+            with open(parquet_file, 'wb') as f:
+                writer = ndexloadkinome.ParquetTableWriter(f, column_types, row_group_size=2)
+                writer.write_row(header)
+                for row in rows[:4]:
+                    writer.write_row(row)
+                writer.close()
+            self.assertEqual(str(pq.read_schema(parquet_file).field('Score').type), 'double')
+            self.assertEqual(str(pq.read_schema(parquet_file).field('Other').type), 'int64')
+            self.assertEqual(ndexloadkinome._read_parquet_table(parquet_file)['Score'].tolist(),
+                             ['1', '', '2.5', '3'])
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_postprocess_ptm_network(self):
+        """Tests renaming of PTM site nodes and copying of BioGRID PTM IDs"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            args = ndexloadkinome._parse_arguments('hi', [temp_dir])
+            loader = ndexloadkinome.NDExNdexkinomeloaderLoader(args)
+
+            network = NiceCXNetwork()
+            protein = network.create_node('CDC28', 'biogrid:1')
+            site_1 = network.create_node('CDC28-S-19', 'CDC28-S-19')
+            site_2 = network.create_node('CDC28-T-undefined', 'CDC28-T-undefined')
+            for site in (site_1, site_2):
+                network.set_node_attribute(site, 'BioGRID PTM ID', ['1'],
+                                           type='list_of_string')
+                edge_id = network.create_edge(protein, site, 'has-ptm')
+                network.set_edge_attribute(edge_id, 'BioGRID PTM ID',
+                                           ['1', str(site + 10)],
+                                           type='list_of_string')
+
+            loader._postprocess_ptm_network(network)
+
+            self.assertEqual(network.nodes[protein]['n'], 'CDC28')
+            self.assertEqual(network.nodes[site_1]['n'], 'S19')
+            self.assertEqual(network.nodes[site_2]['n'], 'T?')
+            self.assertEqual(network.get_node_attribute(site_1, 'BioGRID PTM ID')['v'],
+                             ['1', str(site_1 + 10)])
+            self.assertEqual(network.get_node_attribute(site_2, 'BioGRID PTM ID')['v'],
+                             ['1', str(site_2 + 10)])
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_merge_ptm_onto_pti(self):
+        """Tests bulk insertion of PTM site nodes and edges into PTI network"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            args = ndexloadkinome._parse_arguments('hi', [temp_dir])
+            loader = ndexloadkinome.NDExNdexkinomeloaderLoader(args)
+
+            pti = NiceCXNetwork()
+            kinase = pti.create_node('CDC28', 'uniprot:P00546')
+            target = pti.create_node('SIC1', 'uniprot:P38634')
+            pti.create_edge(kinase, target, 'controls-phosphorylation-of')
+
+            ptm = NiceCXNetwork()
+            protein = ptm.create_node('SIC1', 'uniprot:P38634')
+            site = ptm.create_node('S19', 'SIC1-S-19')
+            ptm.set_node_attribute(site, 'BioGRID PTM ID', ['1'], type='list_of_string')
+            ptm_edge = ptm.create_edge(protein, site, 'has-ptm')
+            ptm.set_edge_attribute(ptm_edge, 'BioGRID PTM ID', ['1'], type='list_of_string')
+
+            merged = loader._merge_ptm_onto_pti({'CDC28': kinase, 'SIC1': target},
+                                                {'SIC1': protein}, pti, ptm,
+                                                {protein: [site]},
+                                                {(protein, site): ptm_edge})
+
+            self.assertEqual(len(merged.nodes), 3)
+            self.assertEqual(merged.nodes[2], {'@id': 2, 'n': 'S19', 'r': 'SIC1-S-19'})
+            self.assertEqual(merged.edges[1], {'@id': 1, 's': target, 't': 2, 'i': 'has-ptm'})
+            self.assertEqual(merged.get_node_attribute(2, 'BioGRID PTM ID')['v'], ['1'])
+            self.assertEqual(merged.get_edge_attribute(1, 'BioGRID PTM ID')['v'], ['1'])
+            self.assertEqual(merged.create_node('next'), 3)
+            self.assertEqual(merged.create_edge(3, 2), 2)
+
+            self.assertRaises(Exception, loader._merge_ptm_onto_pti,
+                              {'SIC1': target}, {'SIC1': protein}, pti, ptm,
+                              {protein: [site]}, {})
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def _create_ptm_relationships_network(self, site_count):
+        network = NiceCXNetwork()
+        protein = network.create_node('CDC28', 'biogrid:1')
+        network.set_node_attribute(protein, 'type', 'protein')
+        for i in range(site_count):
+            site = network.create_node('S' + str(i), 'CDC28-S-' + str(i))
+            network.set_node_attribute(site, 'BioGRID PTM ID', [str(2 * i), str(2 * i + 1)],
+                                       type='list_of_string')
+            network.create_edge(protein, site, 'has-post-translational-modification-on')
+        return network
+
+    def test_add_ptm_relationships(self):
+        """Tests join of PTM-RELATIONSHIPS rows to PTM site nodes"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            args = ndexloadkinome._parse_arguments('hi', [temp_dir])
+            loader = ndexloadkinome.NDExNdexkinomeloaderLoader(args)
+            self.assertEqual(loader._read_ptm_relationships(), [])
+
+            with open(loader._relations, 'w') as f:
+                f.write('#PTM ID\tEntrez Gene ID\tBioGRID ID\tSystematic Name\tOfficial Symbol\t'
+                        'Synonyms\tRelationship\tIdentity\tAuthor\tPubmed ID\tOrganism ID\t'
+                        'Organism Name\tSource Database\n')
+                f.write('0\t856\t31\tYBR160W\tCDC28\t-\tKinase\tExact\tA (2010)\t1\t559292\tS\tBIOGRID\n')
+                f.write('1\t856\t31\tYBR160W\tCDC28\t-\tKinase\tExact\tB (2011)\t2\t559292\tS\tBIOGRID\n')
+                f.write('2\t851\t32\tYDL017W\tPHO85\tLDB15\tKinase\tExact\tA (2010)\t1\t559292\tS\tBIOGRID\n')
+                f.write('3\t851\t32\tYDL017W\tPHO85\tLDB15\tPhosphatase\t\tA (2010)\t\t559292\tS\tBIOGRID\n')
+                f.write('99\t856\t31\tYBR160W\tCDC28\t-\tKinase\tExact\tA (2010)\t1\t559292\tS\tBIOGRID\n')
+            loader._ptm_relationships = None
+            relationships = loader._read_ptm_relationships()
+            self.assertEqual(len(relationships), 5)
+            self.assertEqual(relationships[0][5], '')
+
+            network = self._create_ptm_relationships_network(2)
+            self.assertEqual(loader._build_ptm_id_index(network), {'0': 1, '1': 1, '2': 2, '3': 2})
+
+            added = loader._add_ptm_relationships(network, {'CDC28': 0}, relationships)
+            self.assertEqual(added, 3)
+            self.assertEqual(len(network.nodes), 4)
+            self.assertEqual(network.nodes[3], {'@id': 3, 'n': 'PHO85', 'r': 'biogrid:32'})
+            self.assertEqual(network.get_node_attribute(3, 'alias')['v'],
+                             ['LDB15', 'ncbigene:851', 'YDL017W'])
+            self.assertEqual(network.get_node_attribute(3, 'type')['v'], 'protein')
+
+            self.assertEqual(network.edges[2], {'@id': 2, 's': 0, 't': 1,
+                                                'i': ndexloadkinome.PTM_RELATIONSHIP_PREDICATE})
+            self.assertEqual(network.get_edge_attribute(2, 'BioGRID PTM ID')['v'], ['0', '1'])
+            self.assertEqual(network.get_edge_attribute(2, 'Author')['v'], ['A (2010)', 'B (2011)'])
+            self.assertEqual(network.get_edge_attribute(2, 'citation')['v'], ['pubmed:1', 'pubmed:2'])
+            self.assertEqual(network.edges[3]['s'], 3)
+            self.assertEqual(network.edges[3]['t'], 2)
+
+            # attributes without values are skipped
+            self.assertEqual([a['n'] for a in network.edgeAttributes[4]],
+                             ['BioGRID PTM ID', 'Relationship', 'Author'])
+
+            # relationship edges are not copied as protein -> PTM site edges on merge
+            self.assertEqual(loader._build_protein_id_to_ptm_ids_dict({'CDC28': 0}, network),
+                             {0: [1, 2]})
+            self.assertEqual(network.create_edge(0, 2), 5)
+
+            # '-' values of rows passed as they are in the file are skipped
+            network = self._create_ptm_relationships_network(1)
+            loader._add_ptm_relationships(network, {}, [['0', '856', '31', 'YBR160W', 'CDC28', '-', 'Kinase',
+                                                         '-', 'A (2010)', '-', '559292', 'S', 'BIOGRID']])
+            self.assertEqual(network.get_node_attribute(2, 'alias')['v'], ['ncbigene:856', 'YBR160W'])
+            self.assertEqual([a['n'] for a in network.edgeAttributes[1]],
+                             ['BioGRID PTM ID', 'Relationship', 'Author'])
+
+            # columns are found by name in header
+            with open(loader._relations, 'w') as f:
+                f.write('Organism ID\tPubmed ID\tAuthor\tIdentity\tRelationship\tSynonyms\t'
+                        'Official Symbol\tSystematic Name\tBioGRID ID\tEntrez Gene ID\t#PTM ID\n')
+                f.write('559292\t-\tA (2010)\tExact\tKinase\tLDB15\tPHO85\tYDL017W\t32\t851\t2\n')
+            loader._ptm_relationships = None
+            self.assertEqual(loader._read_ptm_relationships(),
+                             [['2', '851', '32', 'YDL017W', 'PHO85', 'LDB15', 'Kinase', 'Exact',
+                               'A (2010)', '', '559292']])
+
+            # file without a column loader reads has no relationships
+            with open(loader._relations, 'w') as f:
+                f.write('#PTM ID\tOfficial Symbol\n')
+                f.write('2\tPHO85\n')
+            loader._ptm_relationships = None
+            self.assertEqual(loader._read_ptm_relationships(), [])
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_add_ptm_relationships_scales_linearly(self):
+        """Tests that PTM relationship join runs a number of lines of loader code
+        linear in its input, on inputs growing 8 times"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            args = ndexloadkinome._parse_arguments('hi', [temp_dir])
+            loader = ndexloadkinome.NDExNdexkinomeloaderLoader(args)
+
+            line_counts = []
+            for site_count in (500, 4000):
+                relationships = [[str(i), '856', '31', 'YBR160W', 'CDC28', '', 'Kinase', 'Exact',
+                                  'A (2010)', '1', '559292', 'S', 'BIOGRID']
+                                 for i in range(2 * site_count)]
+                network = self._create_ptm_relationships_network(site_count)
+                line_count = [0]
+
+                # counts lines, unlike time, do not depend on the machine
+                def count_lines(frame, event, arg):
+                    if frame.f_code.co_filename != ndexloadkinome.__file__:
+                        return None
+                    if event == 'line':
+                        line_count[0] += 1
+                    return count_lines
+
+                trace = sys.gettrace()
+                sys.settrace(count_lines)
+                try:
+                    added = loader._add_ptm_relationships(network, {'CDC28': 0}, relationships)
+                finally:
+                    sys.settrace(trace)
+                self.assertEqual(added, site_count)
+                line_counts.append(line_count[0])
+
+            self.assertLess(line_counts[1] / line_counts[0], PTM_RELATIONSHIPS_SCALING_BUDGET)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_partition_network_files(self):
+        """Tests splitting of network files by organism for --byorganism"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            args = ndexloadkinome._parse_arguments('hi', [temp_dir, '--byorganism'])
+            loader = ndexloadkinome.NDExNdexkinomeloaderLoader(args)
+
+            with open(loader._ppi_network_1, 'w') as f:
+                f.write('#BioGRID Interaction ID\tOrganism Interactor A\tOrganism Interactor B\n')
+                f.write('1\t559292\t559292\n')
+                f.write('2\t559292\t9606\n')
+                f.write('3\t\t559292\n')
+            with open(loader._ptm_network_2, 'w') as f:
+                f.write('#PTM ID\tOrganism ID\n')
+                f.write('70000\t559292\n')
+                f.write('70001\t10090\n')
+
+            organisms = loader._partition_network_files()
+            self.assertEqual(organisms, ['559292', '9606', 'unknown', '10090'])
+
+            def read(organism, network_tsv):
+                with open(os.path.join(temp_dir, 'organism-' + organism,
+                                       os.path.basename(network_tsv)), 'r') as f:
+                    return [line.split('\t')[0] for line in f.read().splitlines()]
+
+            self.assertEqual(read('559292', loader._ppi_network_1),
+                             ['#BioGRID Interaction ID', '1', '2', '3'])
+            self.assertEqual(read('9606', loader._ppi_network_1), ['#BioGRID Interaction ID', '2'])
+            self.assertEqual(read('10090', loader._ppi_network_1), ['#BioGRID Interaction ID'])
+            self.assertEqual(read('559292', loader._ptm_network_2), ['#PTM ID', '70000'])
+            self.assertEqual(read('9606', loader._ptm_network_2), ['#PTM ID'])
+
+            loader._set_organism('9606')
+            self.assertEqual(loader._cx_merged, os.path.join(temp_dir, 'organism-9606',
+                                                             'merged_3-3.5.177-ndexkinomeloader.cx'))
+            loader._style_aspect = []
+            network = NiceCXNetwork()
+            loader._init_network_attributes(network, 'pti')
+            self.assertEqual(network.get_name(), 'PTI - Step 1 (Organism 9606)')
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def _create_json_benchmark_network(self, edge_count):
+        network = NiceCXNetwork()
+        network.set_name('benchmark')
+        for i in range(edge_count):
+            edge_id = network.create_edge(i % 100, (i * 7) % 100, 'interacts-with')
+            network.set_edge_attribute(edge_id, 'citation', ['pubmed:' + str(i), 'pubmed:1'],
+                                       type='list_of_string')
+            network.set_edge_attribute(edge_id, 'Score', i / 3.0, type='double')
+        for i in range(100):
+            network.nodes[i] = {'@id': i, 'n': 'G' + str(i), 'r': 'biogrid:' + str(i)}
+        return network
+
+    def test_json_backends(self):
+        """Tests that CX files written and read with every installed JSON backend
+        give the same network"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            network = self._create_json_benchmark_network(50)
+            cx_file = os.path.join(temp_dir, 'network.cx')
+
+            for name in ndexloadkinome.JSON_BACKENDS + (ndexloadkinome.INCREMENTAL_JSON_BACKEND, None):
+                backend = ndexloadkinome.CXJsonBackend(name)
+                self.assertTrue(backend.get_name() in ndexloadkinome.JSON_BACKENDS)
+                backend.write_nice_cx(network, cx_file)
+
+                for reader in ndexloadkinome.JSON_BACKENDS + (ndexloadkinome.INCREMENTAL_JSON_BACKEND,):
+                    network_read = ndexloadkinome.CXJsonBackend(reader).read_nice_cx(cx_file)
+                    self.assertEqual(network_read.nodes, network.nodes)
+                    self.assertEqual(network_read.edges, network.edges)
+                    self.assertEqual(network_read.edgeAttributes, network.edgeAttributes)
+                    self.assertEqual(network_read.get_name(), 'benchmark')
+
+            self.assertEqual(ndexloadkinome.CXJsonBackend().get_name(), 'json')
+            self.assertEqual(ndexloadkinome.CXJsonBackend('ijson').get_name(), 'json')
+            self.assertRaises(Exception, ndexloadkinome.CXJsonBackend().read_nice_cx,
+                              os.path.join(temp_dir, 'none.cx'))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_read_nice_cx_incrementally(self):
+        """Tests that network read with ijson one element at a time is the one
+        ndex2 builds from whole CX, with metaData after aspects it names"""
+        if importlib.util.find_spec('ijson') is None:
+            self.skipTest('ijson is not installed')
+
+        temp_dir = tempfile.mkdtemp()
+        try:
+            cx = [{'numberVerification': [{'longNumber': 281474976710655}]},
+                  {'nodes': [{'@id': 0, 'n': 'A'}]},
+                  {'metaData': [{'name': name} for name in ('nodes', 'edges', 'nodeAttributes',
+                                                            'cartesianLayout', '@context')]},
+                  {'@context': {'pubmed': 'https://www.ncbi.nlm.nih.gov/pubmed/'}},
+                  {'nodes': [{'@id': 1, 'n': 'B'}]},
+                  {'edges': [{'@id': 0, 's': 0, 't': 1, 'i': 'phosphorylates'}]},
+                  {'nodeAttributes': [{'po': 0, 'n': 'alias', 'v': ['a', 'b'], 'd': 'list_of_string'},
+                                      {'po': 1, 'n': 'score', 'v': 1.5, 'd': 'double'}]},
+                  {'edgeAttributes': [{'po': 0, 'n': 'not in metaData', 'v': 'x'}]},
+                  {'cartesianLayout': [{'node': 0, 'x': 1.0, 'y': 2.0}]},
+                  {'cartesianLayout': [{'node': 1, 'x': 3.0, 'y': 4.0}]},
+                  {'status': [{'error': '', 'success': True}]}]
+            cx_file = os.path.join(temp_dir, 'network.cx')
+            ndexloadkinome.CXJsonBackend('json').write_cx(cx, cx_file)
+
+            expected = ndex2.create_nice_cx_from_raw_cx(cx)
+            network = ndexloadkinome.CXJsonBackend('ijson').read_nice_cx(cx_file)
+            self.assertEqual(network.nodes, expected.nodes)
+            self.assertEqual(network.edges, expected.edges)
+            self.assertEqual(network.nodeAttributes, expected.nodeAttributes)
+            self.assertEqual(network.edgeAttributes, {})
+            self.assertEqual(network.get_context(), expected.get_context())
+            self.assertEqual(network.get_opaque_aspect('cartesianLayout'),
+                             expected.get_opaque_aspect('cartesianLayout'))
+            self.assertEqual(len(network.get_opaque_aspect('cartesianLayout')), 2)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_compression(self):
+        """Tests that --compression writes artifacts compressed and they are read back transparently"""
+        from requests_toolbelt import MultipartEncoder
+
+        self.assertEqual(ndexloadkinome._parse_compression(None), {})
+        self.assertEqual(ndexloadkinome._parse_compression('gzip:1,cx=lzma,extracted=none'),
+                         {'network': ('gzip', 1), 'cx': ('lzma', 6)})
+        self.assertRaises(argparse.ArgumentTypeError, ndexloadkinome._parse_compression, 'zip')
+        self.assertRaises(argparse.ArgumentTypeError, ndexloadkinome._parse_compression, 'tsv=gzip')
+        self.assertRaises(argparse.ArgumentTypeError, ndexloadkinome._parse_compression, 'gzip:x')
+
+        # invalid value is a usage error
+        stderr = sys.stderr
+        sys.stderr = open(os.devnull, 'w')
+        try:
+            self.assertRaises(SystemExit, ndexloadkinome._parse_arguments, 'hi',
+                              ['datadir', '--compression', 'gzip:x'])
+        finally:
+            sys.stderr.close()
+            sys.stderr = stderr
+        self.assertEqual(ndexloadkinome._parse_arguments('hi', ['datadir']).compression, {})
+
+        temp_dir = tempfile.mkdtemp()
+        try:
+            args = ndexloadkinome._parse_arguments('hi', [temp_dir, '--compression', 'gzip:1,cx=bz2'])
+            loader = ndexloadkinome.NDExNdexkinomeloaderLoader(args)
+            self.assertTrue(loader._genes.endswith('.projectindex.txt.gz'))
+            self.assertTrue(loader._ppi_network_1.endswith('ppi_network_1-3.5.177-ndexkinomeloader.txt.gz'))
+            self.assertTrue(loader._cx_merged.endswith('merged_3-3.5.177-ndexkinomeloader.cx.bz2'))
+            self.assertEqual(loader._get_streamed_members()[0],
+                             os.path.basename(loader._get_interactions_file_name()))
+
+            with ndexloadkinome._atomic_write(loader._ppi_network_1) as f:
+                f.write('a\tb\n1\t2\n')
+            # no time in gzip header, so equal content gives equal files
+            with open(loader._ppi_network_1, 'rb') as f:
+                self.assertEqual(f.read(8)[4:], b'\0\0\0\0')
+            with ndexloadkinome._open_file(loader._ppi_network_1) as f:
+                self.assertEqual(f.read(), 'a\tb\n1\t2\n')
+
+            network = self._create_json_benchmark_network(20)
+            loader._write_nice_cx_to_file(network, loader._cx_merged)
+            self.assertEqual(ndexloadkinome._get_file_compression(loader._cx_merged), ('bz2', 9))
+            network_read = ndexloadkinome.CXJsonBackend().read_nice_cx(loader._cx_merged)
+            self.assertEqual(network_read.edgeAttributes, network.edgeAttributes)
+
+            # compressed CX file is uploaded decompressed, as a stream of known length
+            with ndexloadkinome._open_file(loader._cx_merged, 'rb') as f:
+                cx = f.read()
+            with ndexloadkinome.DecompressingReader(loader._cx_merged) as reader:
+                self.assertEqual(reader.len, len(cx))
+                encoder = MultipartEncoder(fields={'CXNetworkStream': ('filename', reader,
+                                                                       'application/octet-stream')})
+                body = encoder.read()
+                self.assertEqual(len(body), encoder.len)
+                self.assertTrue(cx in body)
+
+            # size of upload is recorded when file is written, whichever library writes it
+            for backend in ('json', None):
+                loader._json_backend = ndexloadkinome.CXJsonBackend(backend)
+                loader._write_nice_cx_to_file(network, loader._cx_merged)
+                with ndexloadkinome._open_file(loader._cx_merged, 'rb') as f:
+                    self.assertEqual(loader._cx_sizes[loader._cx_merged], len(f.read()))
+
+            uploads = []
+
+            class FakeNdex(object):
+                def save_cx_stream_as_new_network(self, stream):
+                    uploads.append((stream.len, stream.read()))
+
+            loader._ndex = FakeNdex()
+            loader._upload_CX(loader._cx_merged, None)
+            self.assertEqual(uploads[0][0], loader._cx_sizes[loader._cx_merged])
+            self.assertEqual(len(uploads[0][1]), uploads[0][0])
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_profile_stages(self):
+        """Tests that --profilestages writes pstats and collapsed stacks of chosen stages"""
+        import pstats
+
+        temp_dir = tempfile.mkdtemp()
+        try:
+            profile_dir = os.path.join(temp_dir, 'profiles')
+            args = ndexloadkinome._parse_arguments('hi', [temp_dir, '--profilestages', profile_dir,
+                                                          '--profileonly', 'build PTI network'])
+            loader = ndexloadkinome.NDExNdexkinomeloaderLoader(args)
+
+            def busy_wait(seconds):
+                end_time = time.time() + seconds
+                while time.time() < end_time:
+                    pass
+
+            with loader._stage('build PTI network'):
+                busy_wait(0.1)
+            with loader._stage('upload PTI network', ndexloadkinome.NETWORK_STAGE):
+                busy_wait(0.01)
+
+            # files of each job are in its own directory
+            job_dir = os.path.dirname(loader._get_profile_file_name('build PTI network', '.pstats'))
+            self.assertEqual(os.listdir(profile_dir), [os.path.basename(job_dir)])
+            self.assertEqual(sorted(os.listdir(job_dir)),
+                             ['build-PTI-network-3.5.177-ndexkinomeloader.collapsed',
+                              'build-PTI-network-3.5.177-ndexkinomeloader.pstats'])
+            self.assertEqual([name for name, seconds in loader.get_timings()],
+                             ['build PTI network', 'upload PTI network'])
+
+            other_args = ndexloadkinome._parse_arguments('hi', [os.path.join(temp_dir, 'other'),
+                                                                '--profilestages', profile_dir])
+            other_loader = ndexloadkinome.NDExNdexkinomeloaderLoader(other_args)
+            self.assertNotEqual(os.path.dirname(other_loader._get_profile_file_name('build PTI network',
+                                                                                   '.pstats')), job_dir)
+
+            stats = pstats.Stats(os.path.join(job_dir, 'build-PTI-network-3.5.177-ndexkinomeloader.pstats'))
+            self.assertTrue(any(func[2] == 'busy_wait' for func in stats.stats))
+
+            with open(os.path.join(job_dir, 'build-PTI-network-3.5.177-ndexkinomeloader.collapsed'), 'r') as f:
+                lines = f.read().splitlines()
+            self.assertTrue(len(lines) > 0)
+            stack, count = lines[0].rsplit(' ', 1)
+            self.assertTrue(int(count) > 0)
+            self.assertTrue('busy_wait (test_ndexloadkinome.py:' in stack)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_shared_datadir(self):
+        """Tests that loaders sharing datadir download and extract Kinome zip file once"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            args = ndexloadkinome._parse_arguments('hi', [temp_dir])
+            loaders = [ndexloadkinome.NDExNdexkinomeloaderLoader(args) for i in range(4)]
+            downloads = []
+
+            def download_file(loader):
+                def _download_file(url):
+                    downloads.append(url)
+                    # other loaders wait for the lock meanwhile
+                    time.sleep(0.2)
+                    with ndexloadkinome._atomic_write(loader._kinome_zip, 'wb') as f:
+                        with zipfile.ZipFile(f, 'w') as zip_ref:
+                            zip_ref.writestr(os.path.basename(loader._interactions), 'interactions')
+                            zip_ref.writestr(os.path.basename(loader._ptm), 'ptm')
+                    return ndexloadkinome.SUCCESS
+                return _download_file
+
+            results = []
+
+            def run_loader(loader):
+                loader._download_file = download_file(loader)
+                results.append((loader._download_kinome_files(), loader._unzip_kinome()))
+
+            threads = [threading.Thread(target=run_loader, args=(loader,)) for loader in loaders]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            self.assertEqual(len(downloads), 1)
+            self.assertEqual(results, [(ndexloadkinome.SUCCESS, ndexloadkinome.SUCCESS)] * 4)
+            with open(loaders[0]._interactions, 'r') as f:
+                self.assertEqual(f.read(), 'interactions')
+            self.assertEqual([name for name in os.listdir(temp_dir) if name.endswith('.tmp')], [])
+
+            # zip file downloaded before this loader started is downloaded again
+            os.utime(loaders[0]._kinome_zip, (0, 0))
+            loader = ndexloadkinome.NDExNdexkinomeloaderLoader(args)
+            loader._download_file = download_file(loader)
+            self.assertEqual(loader._download_kinome_files(), ndexloadkinome.SUCCESS)
+            self.assertEqual(len(downloads), 2)
+
+            # failed write leaves file in place
+            try:
+                with ndexloadkinome._atomic_write(loader._interactions) as f:
+                    f.write('partial')
+                    raise ValueError('failed')
+            except ValueError:
+                pass
+            with open(loader._interactions, 'r') as f:
+                self.assertEqual(f.read(), 'interactions')
+            self.assertEqual([name for name in os.listdir(temp_dir) if name.endswith('.tmp')], [])
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_build_node_name_to_node_id_dictionary(self):
+        """Tests name dictionaries built from typed node index"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            args = ndexloadkinome._parse_arguments('hi', [temp_dir])
+            loader = ndexloadkinome.NDExNdexkinomeloaderLoader(args)
+
+            network = NiceCXNetwork()
+            protein = network.create_node('CDC28', 'biogrid:1')
+            network.set_node_attribute(protein, 'type', ' Protein ')
+            site = network.create_node('S19', 'CDC28-S-19')
+            network.set_node_attribute(site, 'type', 'ptm')
+            other_site = network.create_node('S19', 'CLB2-S-19')
+            network.set_node_attribute(other_site, 'type', 'ptm')
+
+            self.assertEqual(loader._build_ptm_node_name_to_node_id_dictionary(network),
+                             {'CDC28': protein})
+            try:
+                loader._build_pti_node_name_to_node_id_dictionary(network)
+                self.fail('Expected Exception')
+            except Exception as e:
+                self.assertTrue('duplicate node name in PTI network: S19' in str(e))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_group_edges(self):
+        """Tests grouping of edges for collapse"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            args = ndexloadkinome._parse_arguments('hi', [temp_dir])
+            loader = ndexloadkinome.NDExNdexkinomeloaderLoader(args)
+
+            network = NiceCXNetwork()
+            self.assertEqual(loader._group_edges(network), [])
+
+            for source, target, interaction in [(1, 2, 'a'), (3, 1, 'a'), (2, 1, 'a'),
+                                                (1, 2, 'b'), (1, 3, 'a'), (2, 2, 'a'),
+                                                (1, 2, 'a')]:
+                network.create_edge(source, target, interaction)
+
+            self.assertEqual(loader._group_edges(network),
+                             [[0, 2, 6], [1, 4], [3], [5]])
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_import_time(self):
+        """Tests that importing the script does not import heavy dependencies
+        and takes less time than its budget"""
+        package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ)
+        env['PYTHONPATH'] = package_dir + os.pathsep + env.get('PYTHONPATH', '')
+
+        # best of several runs, so a busy machine does not fail the test
+        best_import_time = None
+        for run in range(3):
+            proc = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                                   'import json, sys\n'
+                                   'import ndexkinomeloader.ndexloadkinome\n'
+                                   'print(json.dumps(sorted(sys.modules)))'],
+                                  env=env, stdout=subprocess.PIPE,
+                                  stderr=subprocess.PIPE, universal_newlines=True)
+            self.assertEqual(proc.returncode, 0, proc.stderr)
+
+            imported = json.loads(proc.stdout)
+            for module in ('pandas', 'numpy', 'ndex2', 'requests',
+                           'ndexutil.tsv.tsv2nicecx2'):
+                self.assertFalse(module in imported, module + ' imported at startup')
+
+            import_times = {}
+            for line in proc.stderr.splitlines():
+                if not line.startswith('import time:') or 'cumulative' in line:
+                    continue
+                self_time, cumulative, module = line[len('import time:'):].split('|')
+                import_times[module.strip()] = int(cumulative)
+
+            import_time = import_times['ndexkinomeloader.ndexloadkinome']
+            best_import_time = import_time if best_import_time is None else min(best_import_time, import_time)
+
+        self.assertLess(best_import_time, IMPORT_TIME_BUDGET)
+
+    def test_get_job_arguments(self):
+        """Tests creation of arguments for jobs from --jobs file"""
+        theargs = ndexloadkinome._parse_arguments('hi', ['datadir', '--jobs', 'jobs.json'])
+
+        job_args = ndexloadkinome._get_job_arguments(theargs, {'datadir': 'other',
+                                                               'biogridversion': '3.5.176'})
+        self.assertEqual(len(job_args), 1)
+        self.assertEqual(job_args[0].datadir, 'other')
+        self.assertEqual(job_args[0].biogridversion, '3.5.176')
+        self.assertEqual(job_args[0].jobs, None)
+        self.assertEqual(theargs.datadir, 'datadir')
+
+        job_args = ndexloadkinome._get_job_arguments(theargs, {'compression': 'cx=gzip'})
+        self.assertEqual(job_args[0].compression, {'cx': ('gzip', 6)})
+
+        # list or range of versions in job is expanded as on command line
+        job_args = ndexloadkinome._get_job_arguments(theargs, {'datadir': 'other',
+                                                               'biogridversion': '3.5.175-3.5.176,3.5.180',
+                                                               'compression': 'cx=gzip'})
+        self.assertEqual([(a.datadir, a.biogridversion) for a in job_args],
+                         [(os.path.join('other', '3.5.175'), '3.5.175'),
+                          (os.path.join('other', '3.5.176'), '3.5.176'),
+                          (os.path.join('other', '3.5.180'), '3.5.180')])
+        for args in job_args:
+            self.assertEqual(args.compression, {'cx': ('gzip', 6)})
+            self.assertEqual(args.jobs, None)
+
+        # datadir can be omitted on command line if jobs set it
+        theargs = ndexloadkinome._parse_arguments('hi', ['--jobs', 'jobs.json'])
+        self.assertEqual(theargs.datadir, None)
+        job_args = ndexloadkinome._get_job_arguments(theargs, {'datadir': 'other'})
+        self.assertEqual(job_args[0].datadir, 'other')
+
+        # without jobs, missing datadir is a usage error
+        stderr = sys.stderr
+        sys.stderr = open(os.devnull, 'w')
+        try:
+            self.assertRaises(SystemExit, ndexloadkinome._parse_arguments, 'hi', [])
+            self.assertRaises(SystemExit, ndexloadkinome._parse_arguments, 'hi',
+                              ['datadir', '--stream', '--byorganism'])
+        finally:
+            sys.stderr.close()
+            sys.stderr = stderr
+
+        for job in ({'foo': 1}, {'jobs': 'other.json'}, {'biogridversion': '3.5.176'},
+                    {'datadir': 'other', 'stream': True, 'byorganism': True},
+                    {'datadir': 'other', 'biogridversion': '3.5.177-3.5.176'}):
+            try:
+                ndexloadkinome._get_job_arguments(theargs, job)
+                self.fail('Expected ValueError')
+            except ValueError:
+                pass
+
+    def test_loader_cache(self):
+        """Tests that LoaderCache builds each value once"""
+        cache = ndexloadkinome.LoaderCache()
+        calls = []
+
+        def create():
+            calls.append(1)
+            return {'x': 1}
+
+        first = cache.get_load_plan('plan.json', create)
+        self.assertIs(cache.get_load_plan('plan.json', create), first)
+        self.assertEqual(len(calls), 1)
+        cache.get_gene_lookup('somehash', create)
+        self.assertEqual(len(calls), 2)
+
+    def test_create_ndex_connection_once(self):
+        """Tests that threads fetching template and network summaries share one connection"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            args = ndexloadkinome._parse_arguments('hi', [temp_dir])
+            cache = ndexloadkinome.LoaderCache()
+            loader = ndexloadkinome.NDExNdexkinomeloaderLoader(args, cache=cache)
+            calls = []
+
+            def get_connection(server, user, create):
+                calls.append(1)
+                time.sleep(0.1)
+                return object()
+
+            cache.get_connection = get_connection
+
+            connections = []
+            threads = [threading.Thread(target=lambda: connections.append(loader._create_ndex_connection()))
+                       for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            self.assertEqual(len(calls), 1)
+            self.assertIs(connections[0], connections[1])
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_expand_biogrid_versions(self):
+        """Tests expansion of lists and ranges of BioGRID versions"""
+        self.assertEqual(ndexloadkinome._expand_biogrid_versions('3.5.177'), ['3.5.177'])
+        self.assertEqual(ndexloadkinome._expand_biogrid_versions('3.5.175-3.5.177, 3.5.180'),
+                         ['3.5.175', '3.5.176', '3.5.177', '3.5.180'])
+
+        for versions in ('3.5.177-3.5.175', '3.4.170-3.5.177'):
+            try:
+                ndexloadkinome._expand_biogrid_versions(versions)
+                self.fail('Expected ValueError')
+            except ValueError:
+                pass
+
+        theargs = ndexloadkinome._parse_arguments('hi', ['datadir', '--biogridversion',
+                                                         '3.5.176,3.5.177'])
+        self.assertEqual(ndexloadkinome._get_version_jobs(theargs),
+                         [{'biogridversion': '3.5.176',
+                           'datadir': os.path.join('datadir', '3.5.176')},
+                          {'biogridversion': '3.5.177',
+                           'datadir': os.path.join('datadir', '3.5.177')}])
+
+    def test_run_overlaps_summaries_with_network_build(self):
+        """Tests that network summaries are fetched while PTI network is built"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            args = ndexloadkinome._parse_arguments('hi', [temp_dir, '--skipdownload'])
+            loader = ndexloadkinome.NDExNdexkinomeloaderLoader(args)
+            building = threading.Event()
+
+            def get_summaries():
+                # fails unless PTI network is being built at the same time
+                if not building.wait(10):
+                    return None, ndexloadkinome.ERROR
+                return [], ndexloadkinome.ERROR
+
+            def create_ppi_file():
+                building.set()
+                return ndexloadkinome.SUCCESS
+
+            loader._parse_config = lambda: None
+            loader._load_style_template = lambda: None
+            loader._create_ndex_connection = lambda: None
+            loader._get_network_summaries_from_NDEx_server = get_summaries
+            loader._find_extracted_files = lambda: ndexloadkinome.SUCCESS
+            loader._build_gene_lookup = lambda: ndexloadkinome.SUCCESS
+            loader._create_ppi_file = create_ppi_file
+            loader._generate_CX_file = lambda plan, tsv: (NiceCXNetwork(), ndexloadkinome.SUCCESS)
+            loader._init_network_attributes = lambda network, type: None
+            loader._write_nice_cx_to_file = lambda network, path: None
+
+            self.assertEqual(loader.run(), ndexloadkinome.ERROR)
+            self.assertEqual(sorted(name for name, seconds in loader.get_timings()),
+                             ['build PTI network', 'gene lookup', 'get network summaries',
+                              'read PTM relationships'])
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_skip_upload_of_unchanged_network(self):
+        """Tests that network with the same content hash on server is not uploaded"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            args = ndexloadkinome._parse_arguments('hi', [temp_dir])
+            loader = ndexloadkinome.NDExNdexkinomeloaderLoader(args)
+            uploads = []
+            loader._upload_CX = lambda path, uuid: uploads.append(uuid)
+
+            network = NiceCXNetwork()
+            network.set_name('PTI - Step 1')
+            network.create_edge(network.create_node('A'), network.create_node('B'), 'x')
+            content_hash = loader._set_content_hash(network)
+            self.assertEqual(loader._set_content_hash(network), content_hash)
+
+            summaries = [{'name': 'PTI - Step 1', 'externalId': 'uuid-1',
+                          'properties': [{'predicateString': ndexloadkinome.CONTENT_HASH,
+                                          'value': content_hash}]}]
+            loader._upload_network(network, 'pti_1.cx', summaries)
+            self.assertEqual(uploads, [])
+
+            summaries[0]['properties'][0]['value'] = 'oldhash'
+            loader._upload_network(network, 'pti_1.cx', summaries)
+            self.assertEqual(uploads, ['uuid-1'])
+
+            loader._upload_network(network, 'pti_1.cx', [])
+            self.assertEqual(uploads, ['uuid-1', None])
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_fetch_template(self):
+        """Tests that --template network is reused from datadir until it expires"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            args = ndexloadkinome._parse_arguments('hi', [temp_dir, '--template', 'someuuid',
+                                                          '--templatettl', '100'])
+            loader = ndexloadkinome.NDExNdexkinomeloaderLoader(args)
+
+            with open(ndexloadkinome.get_style(), 'rb') as f:
+                style_cx = f.read()
+
+            fetched = []
+
+            class FakeResponse(object):
+                content = style_cx
+
+                def raise_for_status(self):
+                    pass
+
+            class FakeNdex(object):
+                def get_network_as_cx_stream(self, uuid):
+                    fetched.append(uuid)
+                    return FakeResponse()
+
+            loader._ndex = FakeNdex()
+            loader._load_style_template()
+            self.assertEqual(fetched, ['someuuid'])
+            self.assertTrue(len(loader._style_aspect) > 0)
+
+            # copy in datadir is reused while it is younger than --templatettl
+            loader._load_style_template()
+            self.assertEqual(fetched, ['someuuid'])
+
+            template_file = loader._get_template_cache_file_name()
+            os.utime(template_file, (0, 0))
+            loader._load_style_template()
+            self.assertEqual(fetched, ['someuuid', 'someuuid'])
+
+            network = NiceCXNetwork()
+            loader._apply_style(network)
+            self.assertIs(network.get_opaque_aspect('cyVisualProperties'), loader._style_aspect)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_fetch_template_does_not_skip_download(self):
+        """Tests that --skipdownload downloads data into new datadir when
+        --template, fetched in background, creates datadir first"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            datadir = os.path.join(temp_dir, 'datadir')
+            args = ndexloadkinome._parse_arguments('hi', [datadir, '--skipdownload',
+                                                          '--template', 'someuuid'])
+            loader = ndexloadkinome.NDExNdexkinomeloaderLoader(args)
+            downloads = []
+
+            def fetch_template():
+                os.makedirs(datadir, exist_ok=True)
+                raise Exception('no template')
+
+            def download_kinome_files():
+                downloads.append(os.path.isdir(datadir))
+                return 1
+
+            loader._parse_config = lambda: None
+            loader._fetch_template = fetch_template
+            loader._get_network_summaries = lambda: ([], ndexloadkinome.SUCCESS)
+            loader._download_kinome_files = download_kinome_files
+
+            self.assertEqual(loader.run(), ndexloadkinome.ERROR)
+            self.assertEqual(downloads, [True])
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_build_gene_lookup_cache(self):
+        """Tests that gene lookup is saved and rebuilt only when GENES file changes"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            args = ndexloadkinome._parse_arguments('hi', [temp_dir])
+            loader = ndexloadkinome.NDExNdexkinomeloaderLoader(args)
+
+            def write_genes_file(interaction_count):
+                with open(loader._genes, 'w') as f:
+                    f.write('\t'.join(['ENTREZ GENE ID', 'INTERACTION COUNT', 'PTM COUNT',
+                                       'CHEMICAL INTERACTION COUNT', 'SOURCE',
+                                       'CATEGORY VALUES', 'SUBCATEGORY VALUES']) + '\n')
+                    f.write('\t'.join(['852457', str(interaction_count), '2', '0',
+                                       'BIOGRID', 'Kinase', '-']) + '\n')
+                    f.write('\t'.join(['1000', '1', '0', '0', 'BIOGRID', '-', '-']) + '\n')
+
+            # lookup pickled by older loader for the same GENES file is replaced
+            write_genes_file(5)
+            legacy_cache_file = os.path.join(temp_dir, loader._get_gene_lookup_cache_prefix() + '0123.pickle')
+            with open(legacy_cache_file, 'wb') as f:
+                f.write(b'')
+
+            self.assertEqual(loader._build_gene_lookup(), ndexloadkinome.SUCCESS)
+            self.assertEqual(loader._gene_lookup['852457']['INTERACTION COUNT'], 5)
+            self.assertEqual(loader._gene_lookup['852457']['SOURCE'], 'BIOGRID')
+
+            # second build loads saved lookup without reading GENES file
+            read_gene_lookup = loader._read_gene_lookup
+            loader._read_gene_lookup = lambda: self.fail('GENES file read again')
+            self.assertEqual(loader._build_gene_lookup(), ndexloadkinome.SUCCESS)
+            self.assertIsInstance(loader._gene_lookup, ndexloadkinome.GeneLookupIndex)
+            self.assertEqual(len(loader._gene_lookup), 2)
+            self.assertEqual(loader._gene_lookup['852457'],
+                             {'INTERACTION COUNT': 5, 'PTM COUNT': 2, 'CHEMICAL INTERACTION COUNT': 0,
+                              'SOURCE': 'BIOGRID', 'CATEGORY VALUES': 'Kinase', 'SUBCATEGORY VALUES': '-'})
+            self.assertEqual(loader._gene_lookup.get('1000')['INTERACTION COUNT'], 1)
+            self.assertIs(loader._gene_lookup.get('999', ndexloadkinome.DEFAULT_GENE_DATA),
+                          ndexloadkinome.DEFAULT_GENE_DATA)
+            self.assertNotIn('999', loader._gene_lookup)
+            self.assertFalse(os.path.isfile(legacy_cache_file))
+
+            # lookup saved for GENES file of another version is kept
+            other_cache_file = os.path.join(temp_dir, ndexloadkinome.GENE_LOOKUP_CACHE_PREFIX +
+                                            'BIOGRID-PROJECT-kinome_project_sc-GENES-3.5.176.'
+                                            'projectindex.txt-0123.pickle')
+            with open(other_cache_file, 'wb') as f:
+                f.write(b'')
+
+            # changed GENES file invalidates saved lookup
+            loader._read_gene_lookup = read_gene_lookup
+            write_genes_file(7)
+            self.assertEqual(loader._build_gene_lookup(), ndexloadkinome.SUCCESS)
+            self.assertEqual(loader._gene_lookup['852457']['INTERACTION COUNT'], 7)
+            self.assertEqual(len([f for f in os.listdir(temp_dir)
+                                  if f.startswith(loader._get_gene_lookup_cache_prefix())]), 1)
+            self.assertTrue(os.path.isfile(other_cache_file))
+
+            # corrupt saved lookup is rebuilt
+            cache_file = [os.path.join(temp_dir, f) for f in os.listdir(temp_dir)
+                          if f.startswith(loader._get_gene_lookup_cache_prefix())][0]
+            with open(cache_file, 'wb') as f:
+                f.write(b'garbage')
+            self.assertEqual(loader._build_gene_lookup(), ndexloadkinome.SUCCESS)
+            self.assertEqual(loader._gene_lookup['852457']['INTERACTION COUNT'], 7)
+            self.assertIsInstance(ndexloadkinome.GeneLookupIndex(cache_file), ndexloadkinome.GeneLookupIndex)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_stream_network(self):
+        """Tests that --stream pipeline builds the same PTM network as separate steps"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            args = ndexloadkinome._parse_arguments('hi', [temp_dir, '--stream', '--queuesize', '1'])
+            loader = ndexloadkinome.NDExNdexkinomeloaderLoader(args)
+
+            header = ['#PTM ID', 'Entrez Gene ID', 'BioGRID ID', 'Systematic Name', 'Official Symbol',
+                      'Synonyms', 'Sequence', 'Refseq ID', 'Position', 'Post Translational Modification',
+                      'Residue', 'Author', 'Pubmed ID', 'Organism ID', 'Organism Name',
+                      'Has Relationships', 'Notes', 'Source Database']
+            rows = [['1', '852457', '32', 'YBR160W', 'CDC28', 'CDK1', 'MSG', 'NP_1', '19',
+                     'Phosphorylation', 'Y', 'Smith J (2010)', '101', '559292', 'yeast',
+                     'True', '-', 'BIOGRID'],
+                    ['2', '852457', '32', 'YBR160W', 'CDC28', 'CDK1', 'MSG', 'NP_1', '-',
+                     'Phosphorylation', 'S', 'Doe A (2012)', '102', '559292', 'yeast',
+                     'False', '-', 'BIOGRID']]
+            ptm_file_content = '\n'.join('\t'.join(row) for row in [header] + rows) + '\n'
+
+            with zipfile.ZipFile(loader._kinome_zip, 'w') as zip_ref:
+                zip_ref.writestr(os.path.basename(loader._ptm), ptm_file_content)
+            with open(loader._ptm, 'w') as f:
+                f.write(ptm_file_content)
+
+            network = loader._stream_network(os.path.basename(loader._ptm),
+                                             loader._get_ptm_header,
+                                             loader._transform_ptm_row,
+                                             loader._ptm_load_plan,
+                                             loader._ptm_network_2)
+            with open(loader._ptm_network_2, 'r') as f:
+                streamed_ptm_file_content = f.read()
+
+            self.assertEqual(loader._create_ptm_file(), ndexloadkinome.SUCCESS)
+            with open(loader._ptm_network_2, 'r') as f:
+                self.assertEqual(f.read(), streamed_ptm_file_content)
+
+            expected_network, status = loader._generate_CX_file(loader._ptm_load_plan,
+                                                                loader._ptm_network_2)
+            self.assertEqual(network.nodes, expected_network.nodes)
+            self.assertEqual(network.edges, expected_network.edges)
+            self.assertEqual(network.nodeAttributes, expected_network.nodeAttributes)
+            self.assertEqual(network.edgeAttributes, expected_network.edgeAttributes)
+
+            # member without rows still gets network file with header
+            with zipfile.ZipFile(loader._kinome_zip, 'w') as zip_ref:
+                zip_ref.writestr(os.path.basename(loader._ptm), '\t'.join(header) + '\n')
+            network = loader._stream_network(os.path.basename(loader._ptm),
+                                             loader._get_ptm_header,
+                                             loader._transform_ptm_row,
+                                             loader._ptm_load_plan,
+                                             loader._ptm_network_2)
+            with open(loader._ptm_network_2, 'r') as f:
+                self.assertEqual(f.read(), '\t'.join(loader._get_ptm_header(header)) + '\n')
+            self.assertEqual(network.edges, {})
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_stream_network_consumer_failure(self):
+        """Tests that --stream pipeline stops its threads and raises when writing rows fails"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            args = ndexloadkinome._parse_arguments('hi', [temp_dir, '--stream', '--queuesize', '1'])
+            loader = ndexloadkinome.NDExNdexkinomeloaderLoader(args)
+
+            # enough rows that decompressing thread is blocked on full queue when writing fails
+            rows = ['\t'.join([str(i)] + ['x'] * 17) for i in range(4 * ndexloadkinome.STREAM_BATCH_SIZE)]
+            with zipfile.ZipFile(loader._kinome_zip, 'w') as zip_ref:
+                zip_ref.writestr('ptm.txt', '\n'.join(['\t'.join(['h'] * 18)] + rows) + '\n')
+
+            @contextmanager
+            def open_network_table(network_table, plan_path):
+                def write_row(row):
+                    raise ValueError('unable to write row')
+                yield write_row
+
+            loader._open_network_table = open_network_table
+
+            threads_before = threading.active_count()
+            errors = []
+
+            def stream_network():
+                try:
+                    loader._stream_network('ptm.txt', lambda header: header, lambda row: row,
+                                           loader._ptm_load_plan, loader._ptm_network_2)
+                except Exception as e:
+                    errors.append(e)
+
+            # pipeline runs in its own thread, so a hang fails the test instead of blocking it
+            thread = threading.Thread(target=stream_network, daemon=True)
+            thread.start()
+            thread.join(30)
+            self.assertFalse(thread.is_alive())
+
+            self.assertEqual([str(e) for e in errors], ['unable to write row'])
+            self.assertEqual(threading.active_count(), threads_before)
+        finally:
+            shutil.rmtree(temp_dir)